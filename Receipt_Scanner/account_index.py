@@ -0,0 +1,319 @@
+import re
+import time
+import heapq
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text: str) -> list:
+    """Lowercase alphanumeric tokens, e.g. '53 / NRT - 61062' -> 53, nrt, 61062."""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def trigrams(token: str) -> set:
+    """Trigrams of a token padded like pg_trgm: 'nrt' -> '  n', ' nr', ..."""
+    padded = f"  {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class AccountIndex:
+    """In-memory search index over the Account SKKO names of ACCOUNTLIST.
+
+    Every name is split into tokens. A prefix trie maps each typed prefix to
+    the names having a token that starts with it, so a query matches the
+    names where every query token prefixes some token of the name. A trigram
+    index over the distinct tokens finds fuzzy matches (typos, digits from
+    the middle of an account number) when nothing matches by prefix.
+
+    update() applies only the difference to the previous list of names, so
+    refreshing after a sheet edit touches the changed names alone. Reads and
+    updates are serialized by a lock; lookups are a few set operations.
+    """
+
+    def __init__(self, fuzzy_threshold: float = 0.5):
+        self.fuzzy_threshold = fuzzy_threshold
+
+        self._names = []  # Sheet order, duplicates and blanks removed
+        self._ids = {}  # name -> id
+        self._free_ids = []
+        self._by_id = {}  # id -> (name, normalized text, tokens)
+        self._position = {}  # id -> index in self._names
+        self._trie = [{}, set()]  # node: [children by char, ids below]
+        self._lead_trie = [{}, set()]  # Same, for the first token only
+        self._postings = {}  # token -> ids of names containing it
+        self._trigrams = {}  # trigram -> tokens containing it
+        self._next_id = 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    # ------------------------ Updates ------------------------ #
+
+    @staticmethod
+    def _trie_add(node: list, token: str, name_id: int):
+        for char in token:
+            node = node[0].setdefault(char, [{}, set()])
+            node[1].add(name_id)
+
+    @staticmethod
+    def _trie_remove(node: list, token: str, name_id: int):
+        path = []
+        for char in token:
+            child = node[0][char]
+            child[1].discard(name_id)
+            path.append((node, char, child))
+            node = child
+        for parent, char, child in reversed(path):
+            if child[1] or child[0]:
+                break
+            del parent[0][char]  # Prune branches no name uses anymore
+
+    def _add(self, name: str):
+        name_id = self._free_ids.pop() if self._free_ids else self._next_id
+        if name_id == self._next_id:
+            self._next_id += 1
+        ordered = tokenize(name)
+        tokens = set(ordered)
+        self._ids[name] = name_id
+        self._by_id[name_id] = (name, " ".join(ordered), tokens)
+        if ordered:
+            self._trie_add(self._lead_trie, ordered[0], name_id)
+        for token in tokens:
+            self._trie_add(self._trie, token, name_id)
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                for trigram in trigrams(token):
+                    self._trigrams.setdefault(trigram, set()).add(token)
+            postings.add(name_id)
+
+    def _remove(self, name: str):
+        name_id = self._ids.pop(name)
+        _, text, tokens = self._by_id.pop(name_id)
+        if text:
+            self._trie_remove(self._lead_trie, text.split(" ")[0], name_id)
+        for token in tokens:
+            self._trie_remove(self._trie, token, name_id)
+            postings = self._postings[token]
+            postings.discard(name_id)
+            if not postings:
+                del self._postings[token]
+                for trigram in trigrams(token):
+                    holders = self._trigrams[trigram]
+                    holders.discard(token)
+                    if not holders:
+                        del self._trigrams[trigram]
+        self._free_ids.append(name_id)
+
+    def update(self, names: list) -> dict:
+        """Make the index hold `names`; return how many were added/removed."""
+        ordered = [str(name).strip() for name in names]
+        ordered = list(dict.fromkeys(name for name in ordered if name))
+        with self._lock:
+            current = set(self._ids)
+            wanted = set(ordered)
+            removed = current - wanted
+            added = [name for name in ordered if name not in current]
+            for name in removed:
+                self._remove(name)
+            for name in added:
+                self._add(name)
+            if added or removed or ordered != self._names:
+                self._names = ordered
+                self._position = {self._ids[n]: i for i, n in enumerate(ordered)}
+                self.version += 1
+        return {"added": len(added), "removed": len(removed)}
+
+    # ------------------------ Lookups ------------------------ #
+
+    def names(self) -> list:
+        """Every indexed name, in sheet order."""
+        with self._lock:
+            return list(self._names)
+
+    def _prefix_ids(self, token: str, node: list = None) -> set:
+        node = node or self._trie
+        for char in token:
+            node = node[0].get(char)
+            if node is None:
+                return set()
+        return node[1]
+
+    def _fuzzy_scores(self, tokens: list) -> dict:
+        """Score = mean over query tokens of the best token similarity.
+
+        A query token matches a name token with the share of its trigrams the
+        name token contains (1.0 for a prefix), so '0202402' still finds
+        '6106200200202402' and 'biya' finds 'biaya'.
+        """
+        totals = Counter()
+        for token in tokens:
+            best = dict.fromkeys(self._prefix_ids(token), 1.0)
+            query_trigrams = trigrams(token)
+            shared = Counter()
+            for trigram in query_trigrams:
+                shared.update(self._trigrams.get(trigram, ()))
+            for candidate, count in shared.items():
+                similarity = count / len(query_trigrams)
+                if similarity < self.fuzzy_threshold:
+                    continue
+                for name_id in self._postings[candidate]:
+                    if best.get(name_id, 0.0) < similarity:
+                        best[name_id] = similarity
+            totals.update(best)
+        return {
+            name_id: total / len(tokens)
+            for name_id, total in totals.items()
+            if total / len(tokens) >= self.fuzzy_threshold
+        }
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> tuple:
+        """Return (names, has_more) for one page of matches.
+
+        Prefix matches are ranked by whether the name starts with the query,
+        then by sheet order. Only when there are none, fuzzy matches are
+        returned by score. An empty query pages through every name in sheet
+        order.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        wanted = offset + limit + 1
+        with self._lock:
+            if not tokens:
+                page = self._names[offset : offset + limit + 1]
+                return page[:limit], len(page) > limit
+
+            sets = sorted((self._prefix_ids(t) for t in tokens), key=len)
+            matches = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+            by_id = self._by_id
+            position = self._position
+
+            # Names starting with the query first: only those whose first
+            # token matches the first query token need the string check
+            phrase = " ".join(tokenize(query))
+            leading = [
+                i
+                for i in self._prefix_ids(tokens[0], self._lead_trie) & matches
+                if by_id[i][1].startswith(phrase)
+            ]
+            ranked = heapq.nsmallest(wanted, leading, key=position.__getitem__)
+            if len(ranked) < wanted:
+                leading = set(leading)
+                rest = (i for i in matches if i not in leading)
+                ranked += heapq.nsmallest(
+                    wanted - len(ranked), rest, key=position.__getitem__
+                )
+            if not matches:
+                scores = self._fuzzy_scores(tokens)
+                ranked = heapq.nsmallest(
+                    wanted, scores, key=lambda i: (-scores[i], position[i])
+                )
+            page = [by_id[i][0] for i in ranked[offset : offset + limit + 1]]
+        return page[:limit], len(page) > limit
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "names": len(self._names),
+                "tokens": len(self._postings),
+                "trigrams": len(self._trigrams),
+                "version": self.version,
+            }
+
+
+class AccountIndexCache:
+    """AccountIndex kept in step with the ACCOUNTLIST sheet.
+
+    Like RencanaCache, the first search loads the sheet synchronously and,
+    once the TTL has passed, searches keep using the current index while one
+    background thread downloads the column again. Each download is applied
+    to the index as a difference, so unchanged names are not re-indexed.
+    """
+
+    def __init__(self, loader, ttl: float = 300.0, fuzzy_threshold: float = 0.5):
+        self.loader = loader
+        self.ttl = ttl
+        self.index = AccountIndex(fuzzy_threshold)
+
+        self._loaded_at = None
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+        self._state_lock = threading.Lock()
+        self._stats = {"loads": 0, "load_errors": 0, "added": 0, "removed": 0}
+        self._last_load_seconds = None
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            names = self.loader()
+        except Exception:
+            with self._state_lock:
+                self._stats["load_errors"] += 1
+            raise
+        changes = self.index.update(names)
+        with self._state_lock:
+            self._loaded_at = time.monotonic()
+            self._stats["loads"] += 1
+            self._stats["added"] += changes["added"]
+            self._stats["removed"] += changes["removed"]
+            self._last_load_seconds = time.perf_counter() - start
+        logger.info(
+            f"ACCOUNTLIST index refreshed: {changes['added']} added, "
+            f"{changes['removed']} removed."
+        )
+
+    def _refresh_in_background(self):
+        try:
+            with self._load_lock:
+                self._load()
+        except Exception as e:
+            logger.error(f"Background ACCOUNTLIST refresh failed: {str(e)}")
+        finally:
+            with self._state_lock:
+                self._refreshing = False
+
+    def ready(self) -> AccountIndex:
+        """Return the index, loading or refreshing it as needed."""
+        if self._loaded_at is None:
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self._load()
+            return self.index
+
+        if time.monotonic() - self._loaded_at > self.ttl:
+            self.refresh()
+        return self.index
+
+    def refresh(self):
+        """Download the sheet in the background unless that already runs."""
+        with self._state_lock:
+            start_refresh = not self._refreshing
+            self._refreshing = True
+        if start_refresh:
+            threading.Thread(
+                target=self._refresh_in_background,
+                name="account-index-refresh",
+                daemon=True,
+            ).start()
+
+    def names(self) -> list:
+        return self.ready().names()
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> tuple:
+        return self.ready().search(query, limit, offset)
+
+    def get_stats(self) -> dict:
+        with self._state_lock:
+            stats = dict(self._stats)
+            stats["refreshing"] = self._refreshing
+            loaded_at = self._loaded_at
+            last_load = self._last_load_seconds
+        stats["ttl"] = self.ttl
+        stats.update(self.index.get_stats())
+        if loaded_at is not None:
+            stats["age"] = round(time.monotonic() - loaded_at, 3)
+            stats["last_load_seconds"] = round(last_load, 4)
+        return stats
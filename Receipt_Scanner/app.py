@@ -1,28 +1,64 @@
 import os
-import cv2
-import uuid
-import gspread
+import hmac
+import json
+import time
 import logging
-import requests
-import numpy as np
-import imghdr
+import threading
 import pytz
-from ultralytics import YOLO
+import atexit
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from google.cloud import vision
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import FileStorage
 from flask import (
     Flask,
     request,
     jsonify,
     render_template,
     session,
-    make_response,
+    Response,
+    stream_with_context,
+    g,
 )
 from markupsafe import escape
-from oauth2client.service_account import ServiceAccountCredentials
+
+from sheets_client import SheetsClientPool
+from rencana_cache import RencanaCache
+from account_index import AccountIndexCache
+from bootstrap_cache import ENCODINGS, BootstrapCache
+from append_queue import SheetAppendQueue
+from inference_client import LocalInference, RemoteInference
+from image_headers import probe_image, validate_image
+from inference_errors import (
+    InvalidImageError,
+    ImageTooLargeError,
+    ModelNotReadyError,
+    ModelPathError,
+    InferenceUnavailableError,
+)
+from upload_client import UploadClient, UploadAPIError, UploadTimeoutError
+from blob_store import ReceiptBlobStore
+from chunked_upload import ChunkedUploadStore, ChunkedUploadError
+from upload_state import create_upload_state_store
+from batch_upload import (
+    BatchTooLargeError,
+    count_batch_items,
+    detach_uploads,
+    iter_batch_items,
+    process_batch,
+)
+from job_pool import (
+    FINISHED_STATUSES,
+    JobPool,
+    JobStore,
+    JobError,
+    QueueFullError,
+    StageTimer,
+)
+from metrics import MetricsRegistry
+from profiling import StackSampler
 
 # ------------------------ Configuration ------------------------ #
 
@@ -35,8 +71,38 @@ RECEIPT_API_ENDPOINT = os.getenv("RECEIPT_API_ENDPOINT")
 # Evidence API configuration
 EVIDENCE_API_ENDPOINT = os.getenv("EVIDENCE_API_ENDPOINT")
 
-# YOLO Model Path
-YOLO_MODEL_PATH = os.getenv("YOLO_MODEL_PATH")
+# How the model is loaded at startup: "sync" (before serving; pair with
+# gunicorn --preload to share it copy-on-write), "background" or "off";
+# with INFERENCE_SOCKET the inference worker loads it instead
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "sync")
+
+# Receipts whose headers declare more pixels than this are rejected before
+# any decode (decompression bombs); also read by inference_pipeline.py
+MAX_IMAGE_PIXELS = int(float(os.getenv("MAX_IMAGE_MEGAPIXELS", "64")) * 1_000_000)
+
+# Detection and OCR settings (YOLO_MODEL_PATH, DETECTOR_*, OCR_*,
+# RESULT_CACHE_*, INFERENCE_MAX_*) are read by inference_pipeline.py
+
+# Unix socket(s) of inference_worker.py processes, comma separated; when
+# empty, detection and OCR run inside each web worker
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "")
+INFERENCE_AUTHKEY = os.getenv("INFERENCE_AUTHKEY")
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "120"))
+# Where uploads are written for the inference worker to read (tmpfs)
+INFERENCE_HANDOFF_DIR = os.getenv(
+    "INFERENCE_HANDOFF_DIR",
+    "/dev/shm/receipt_inference" if os.path.isdir("/dev/shm") else "./tmp/handoff",
+)
+
+# Asynchronous uploads: /upload_file answers 202 with a job id when
+# UPLOAD_ASYNC=1 (or ?async=1); results are polled from /jobs/<id>
+UPLOAD_ASYNC = os.getenv("UPLOAD_ASYNC", "0") == "1"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "./tmp/jobs.sqlite3")
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+# Longest an SSE stream on /jobs/<id>/events stays open
+JOB_EVENTS_TIMEOUT = float(os.getenv("JOB_EVENTS_TIMEOUT", "120"))
 
 # Google Credentials Path
 GOOGLE_CREDENTIALS_PATH = os.getenv("GOOGLE_CREDENTIALS_PATH")
@@ -50,11 +116,91 @@ SCOPES = [
 # Google Sheets configuration
 GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
 
+# Seconds before the shared Google Sheets client is re-authorized
+SHEETS_TOKEN_TTL = float(os.getenv("SHEETS_TOKEN_TTL", "3000"))
+
+# Seconds a cached RENCANA snapshot is served before a background refresh
+RENCANA_CACHE_TTL = float(os.getenv("RENCANA_CACHE_TTL", "300"))
+
+# Seconds before the ACCOUNTLIST search index is re-synced with the sheet,
+# the largest page /search_account_skkos returns, and the minimum trigram
+# similarity (0-1) of a fuzzy match
+ACCOUNT_INDEX_TTL = float(os.getenv("ACCOUNT_INDEX_TTL", "300"))
+ACCOUNT_SEARCH_MAX_LIMIT = int(os.getenv("ACCOUNT_SEARCH_MAX_LIMIT", "100"))
+ACCOUNT_FUZZY_THRESHOLD = float(os.getenv("ACCOUNT_FUZZY_THRESHOLD", "0.5"))
+
+# Write-behind queue for REKAPREALISASI rows
+APPEND_QUEUE_PATH = os.getenv("APPEND_QUEUE_PATH", "./tmp/append_queue.sqlite3")
+APPEND_BATCH_SIZE = int(os.getenv("APPEND_BATCH_SIZE", "50"))
+APPEND_MAX_DELAY = float(os.getenv("APPEND_MAX_DELAY", "2"))
+
+# Receipt/Evidence API uploads: connect timeout, read timeout per upload,
+# retries with exponential backoff, and pooled keep-alive connections
+UPLOAD_CONNECT_TIMEOUT = float(os.getenv("UPLOAD_CONNECT_TIMEOUT", "10"))
+RECEIPT_UPLOAD_TIMEOUT = float(os.getenv("RECEIPT_UPLOAD_TIMEOUT", "500"))
+EVIDENCE_UPLOAD_TIMEOUT = float(os.getenv("EVIDENCE_UPLOAD_TIMEOUT", "500"))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))
+UPLOAD_RETRY_BACKOFF = float(os.getenv("UPLOAD_RETRY_BACKOFF", "0.5"))
+UPLOAD_POOL_SIZE = int(os.getenv("UPLOAD_POOL_SIZE", "10"))
+# Largest request body accepted, in MB; evidence is streamed to the API
+# from Werkzeug's spooled temp files, so this does not bound worker memory
+MAX_REQUEST_MB = int(os.getenv("MAX_REQUEST_MB", "100"))
+# Evidence files per request; with a value > 0 the groups go out in parallel
+EVIDENCE_CHUNK_FILES = int(os.getenv("EVIDENCE_CHUNK_FILES", "0"))
+
+# Stored receipts: blobs up to RECEIPT_BLOB_MEMORY_MAX_KB go to a tmpfs
+# directory shared by the workers (empty to disable), larger ones to disk;
+# unsubmitted receipts are swept after RECEIPT_BLOB_TTL seconds
+RECEIPT_BLOB_MEMORY_DIR = os.getenv(
+    "RECEIPT_BLOB_MEMORY_DIR", "/dev/shm/receipt_scanner"
+)
+RECEIPT_BLOB_MEMORY_MAX_KB = int(os.getenv("RECEIPT_BLOB_MEMORY_MAX_KB", "2048"))
+RECEIPT_BLOB_MEMORY_BUDGET_MB = int(os.getenv("RECEIPT_BLOB_MEMORY_BUDGET_MB", "64"))
+RECEIPT_BLOB_TTL = float(os.getenv("RECEIPT_BLOB_TTL", "21600"))
+# Directory for receipts on disk; use a shared volume when running several nodes
+RECEIPT_BLOB_DIR = os.getenv("RECEIPT_BLOB_DIR", "./tmp/uploads")
+
+# Resumable uploads (/uploads): partial files, the chunk size offered to
+# clients, and seconds an unfinished upload is kept after its last chunk
+CHUNKED_UPLOAD_DIR = os.getenv("CHUNKED_UPLOAD_DIR", "./tmp/chunked_uploads")
+UPLOAD_CHUNK_KB = int(os.getenv("UPLOAD_CHUNK_KB", "512"))
+CHUNKED_UPLOAD_TTL = float(os.getenv("CHUNKED_UPLOAD_TTL", "86400"))
+
+# The page downscales receipts so the longest side is at most this many
+# pixels (0 keeps the original) and re-encodes them as JPEG at this quality
+CLIENT_IMAGE_MAX_SIDE = int(os.getenv("CLIENT_IMAGE_MAX_SIDE", "2048"))
+CLIENT_IMAGE_QUALITY = float(os.getenv("CLIENT_IMAGE_QUALITY", "0.85"))
+
+# Server-side upload state keyed by an opaque upload token:
+# sqlite:///path (default, shared by the workers of one host) or redis://...
+UPLOAD_STATE_URL = os.getenv(
+    "UPLOAD_STATE_URL", "sqlite:///./tmp/upload_state.sqlite3"
+)
+# Seconds a claim by /submit is honoured before another submit may retry
+UPLOAD_CLAIM_LEASE = float(os.getenv("UPLOAD_CLAIM_LEASE", "900"))
+
+# /batch_upload: images per batch (loose files or ZIP members) and how
+# many of them are processed at once
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Token required by the /admin endpoints, /metrics and the X-Profile profiler
+# (X-Admin-Token header, or "Authorization: Bearer <token>" for Prometheus);
+# without it those endpoints answer 403
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Opt-in sampling profiler: admin requests sent with "X-Profile: 1" (request
+# thread) or "X-Profile: all" (every thread) dump collapsed stacks to PROFILE_DIR
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./tmp/profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
 # Set up Flask app
 app = Flask(__name__)
 UPLOAD_FOLDER = "./tmp/uploads"
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
-app.config["MAX_CONTENT_LENGTH"] = 100 * 1024 * 1024  # Limit file uploads to 100MB
+# Limit whole requests (receipt or all evidence files) to MAX_REQUEST_MB
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_MB * 1024 * 1024
 
 # Set secret key from environment variable
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "your_default_secret_key")
@@ -74,134 +220,260 @@ if not os.path.exists(UPLOAD_FOLDER):
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# ------------------------ Helper Functions ------------------------ #
-
-
-def init_gspread_client():
-    scope = SCOPES
-    creds = ServiceAccountCredentials.from_json_keyfile_name(
-        GOOGLE_CREDENTIALS_PATH, scope
-    )
-    client = gspread.authorize(creds)
-    return client
-
-
-def get_rencana_details_from_sheet(rencana_id: str) -> dict:
-    client = init_gspread_client()
-    sheet = client.open_by_key(GOOGLE_SHEET_ID).worksheet("RENCANA")
-
-    # Get all records
-    records = sheet.get_all_records()
-
-    if not records:
-        raise Exception("No records found in the RENCANA sheet.")
-
-    for record in records:
-        id_value = record.get("id rencana", "")
-        if id_value != "":
-            try:
-                id_int = int(id_value)
-                record_id = f"{id_int:05d}"
-            except ValueError:
-                record_id = str(id_value).strip()
-            if record_id == str(rencana_id).strip():
-                return {
-                    "start_date_ar": record.get("start date A/R", ""),
-                    "end_date_ar": record.get("end date A/R", ""),
-                    "requestor": record.get("Requestor", ""),
-                    "unit": record.get("Unit", ""),
-                    "nominal": record.get("Nominal", ""),
-                    "id_rencana": record_id,
-                }
-    raise Exception("ID Rencana not found")
+# ------------------------ Metrics ------------------------ #
 
+metrics = MetricsRegistry()
+http_request_seconds = metrics.histogram(
+    "receipt_http_request_duration_seconds",
+    "Time to produce a response (streamed bodies excluded).",
+    ("endpoint", "method", "status"),
+)
+http_in_flight = metrics.gauge(
+    "receipt_http_requests_in_flight", "Requests being handled.", ("endpoint",)
+)
+stage_seconds = metrics.histogram(
+    "receipt_stage_duration_seconds",
+    "Time spent in each stage of upload and submit processing.",
+    ("stage",),
+)
+external_call_seconds = metrics.histogram(
+    "receipt_external_call_duration_seconds",
+    "Duration of calls to external services.",
+    ("service",),
+)
+external_in_flight = metrics.gauge(
+    "receipt_external_calls_in_flight",
+    "Calls to external services in progress.",
+    ("service",),
+)
+queue_depth = metrics.gauge(
+    "receipt_queue_depth",
+    "Items waiting in internal queues (sampled on scrape).",
+    ("queue",),
+)
+external_errors = metrics.counter(
+    "receipt_external_call_errors_total",
+    "Failed calls to external services, by exception type.",
+    ("service", "error"),
+)
 
-# Function to generate a unique temporary filename
-def generate_temp_filename(extension=".jpg") -> str:
-    return f"temp_{uuid.uuid4().hex}{extension}"
 
+def observe_stage(name: str, seconds: float):
+    """StageTimer hook feeding the per-stage histogram."""
+    stage_seconds.observe(seconds, stage=name)
 
-def set_google_credentials(json_path: str):
-    """Set the environment variable for Google Cloud credentials."""
-    if not os.path.exists(json_path):
-        raise FileNotFoundError(f"Google credentials file not found at {json_path}")
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = json_path
 
+def stage_timer() -> StageTimer:
+    return StageTimer(observe=observe_stage)
 
-# Initialize the Google Sheets API client
-def get_google_sheet():
-    client = init_gspread_client()
-    return client.open_by_key(GOOGLE_SHEET_ID).worksheet("REKAPREALISASI")
 
+@contextmanager
+def external_call(service: str):
+    """Time a call to an external service and count its failures."""
+    external_in_flight.inc(service=service)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        external_errors.inc(service=service, error=type(e).__name__)
+        raise
+    finally:
+        external_in_flight.dec(service=service)
+        external_call_seconds.observe(time.perf_counter() - start, service=service)
+
+
+def sheets_call(sheet_name: str, method: str, *args):
+    """Call a worksheet method through the shared pool, with metrics."""
+    with external_call("sheets"):
+        return sheets_pool.call(sheet_name, method, *args)
+
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_start = time.perf_counter()
+    http_in_flight.inc(endpoint=g.metrics_endpoint)
+
+    mode = request.headers.get("X-Profile")
+    if PROFILE_REQUESTS and mode and is_admin_request():
+        thread_ids = None if mode == "all" else {threading.get_ident()}
+        g.profiler = StackSampler(thread_ids, PROFILE_INTERVAL_MS / 1000)
+        g.profiler.start()
+
+
+@app.after_request
+def record_request_metrics(response):
+    g.metrics_status = response.status_code
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.stop()
+        name = secure_filename(g.metrics_endpoint.strip("/")) or "index"
+        response.headers["X-Profile-Dump"] = profiler.dump(PROFILE_DIR, name)
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    # A streamed response tears the request down again when the stream ends
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return
+    http_in_flight.dec(endpoint=g.metrics_endpoint)
+    http_request_seconds.observe(
+        time.perf_counter() - start,
+        endpoint=g.metrics_endpoint,
+        method=request.method,
+        status=g.pop("metrics_status", 500),
+    )
 
-def load_model(model_path: str):
-    """Load the YOLOv8 model."""
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"YOLO model file not found at {model_path}")
-    model = YOLO(model_path)
-    return model
+# Shared Google Sheets client, reused by every request in this process
+sheets_pool = SheetsClientPool(
+    GOOGLE_CREDENTIALS_PATH, GOOGLE_SHEET_ID, SCOPES, token_ttl=SHEETS_TOKEN_TTL
+)
 
+# Indexed RENCANA snapshot shared by /fetch_id_rencana and /get_rencana_details
+rencana_cache = RencanaCache(
+    lambda: sheets_call("RENCANA", "get_all_records"), ttl=RENCANA_CACHE_TTL
+)
 
-def get_class_names(model) -> dict:
-    """Retrieve class names from the YOLO model."""
-    if hasattr(model, "names"):
-        return model.names
-    elif hasattr(model, "model") and hasattr(model.model, "names"):
-        return model.model.names
-    else:
-        raise AttributeError("Cannot find class names in the YOLO model.")
-
-
-def visualize_and_extract_total_value(
-    image, model, class_names: dict, target_label: str
-):
-    """Detect the target label, crop the image, and prepare for OCR."""
-    img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    results = model(img_rgb)
-
-    highest_conf = 0
-    best_box = None
-
-    for result in results:
-        boxes = result.boxes.xyxy
-        scores = result.boxes.conf
-        class_ids = result.boxes.cls
-
-        for box, score, class_id in zip(boxes, scores, class_ids):
-            label = class_names.get(int(class_id), None)
-            if label == target_label and score > highest_conf:
-                highest_conf = score
-                best_box = box
-
-    if best_box is not None:
-        x1, y1, x2, y2 = map(int, best_box)
-        cropped_img = img_rgb[y1:y2, x1:x2]
-        return cropped_img
-    else:
-        return None
+# Searchable index of column A of ACCOUNTLIST ('Account SKKO')
+account_index = AccountIndexCache(
+    lambda: query_from_sheet("ACCOUNTLIST", 1),
+    ttl=ACCOUNT_INDEX_TTL,
+    fuzzy_threshold=ACCOUNT_FUZZY_THRESHOLD,
+)
 
+# Reference data for /bootstrap, serialized and compressed once per change
+bootstrap_cache = BootstrapCache(
+    {
+        "id_rencana": (
+            lambda: rencana_cache.snapshot().loaded_at,
+            lambda: rencana_cache.ids(),
+        ),
+        "account_skkos": (
+            lambda: account_index.ready().version,
+            lambda: account_index.names(),
+        ),
+        "rencana_details": (
+            lambda: rencana_cache.snapshot().loaded_at,
+            lambda: rencana_cache.snapshot().by_id,
+        ),
+    }
+)
 
-def extract_text_from_image(cropped_image) -> str:
-    """Use Google Cloud Vision to extract text from the cropped image."""
-    client = vision.ImageAnnotatorClient()
+# Submitted rows are journaled locally and appended to the sheet in batches
+append_queue = SheetAppendQueue(
+    APPEND_QUEUE_PATH,
+    lambda sheet_name, rows: sheets_call(sheet_name, "append_rows", rows),
+    batch_size=APPEND_BATCH_SIZE,
+    max_delay=APPEND_MAX_DELAY,
+)
+append_queue.start()
+atexit.register(append_queue.stop)
 
-    _, encoded_image = cv2.imencode(".png", cropped_image)
-    content = encoded_image.tobytes()
+# ------------------------ Helper Functions ------------------------ #
 
-    image = vision.Image(content=content)
-    response = client.text_detection(image=image)
 
-    texts = response.text_annotations
+def is_admin_request() -> bool:
+    """Check the admin token header; always False when ADMIN_TOKEN is unset."""
+    if not ADMIN_TOKEN:
+        return False
+    # Compared as bytes: compare_digest rejects non-ASCII str with TypeError
+    expected = ADMIN_TOKEN.encode()
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer ") and hmac.compare_digest(
+        authorization[len("Bearer ") :].encode(), expected
+    ):
+        return True
+    return hmac.compare_digest(
+        request.headers.get("X-Admin-Token", "").encode(), expected
+    )
 
-    if response.error.message:
-        raise Exception(f"{response.error.message}")
 
-    if texts:
-        return texts[0].description
-    return ""
+def get_rencana_details_from_sheet(rencana_id: str) -> dict:
+    details = rencana_cache.get(rencana_id)
+    if details is None:
+        if not rencana_cache.snapshot().record_count:
+            raise Exception("No records found in the RENCANA sheet.")
+        raise Exception("ID Rencana not found")
+    return details
+
+
+def process_upload_job(payload: dict, timer: StageTimer) -> dict:
+    """Job handler for asynchronous uploads; mirrors /upload_file's errors."""
+    # The stored receipt is read by whoever runs inference, by path
+    path = receipt_store.path(payload["blob_id"])
+    try:
+        result = inference.extract(None, timer, path=path)
+    except InvalidImageError:
+        raise JobError("Invalid image file.", 400)
+    except ModelNotReadyError:
+        raise JobError("Model is still loading, try again.", 503)
+    except InferenceUnavailableError:
+        raise JobError("Inference is unavailable, try again.", 503)
+    if result["box"] is None:
+        raise JobError("No total_value detected in the receipt.", 404)
+    logger.info(f"Extracted Text: {result['extracted_text']}")
+    upload_states.update(payload["token"], extracted_text=result["extracted_text"])
+    return {"extracted_text": result["extracted_text"], "fields": result["fields"]}
+
+
+def discard_upload(payload: dict):
+    """Remove the stored receipt and upload state of a failed job."""
+    receipt_store.delete(payload["blob_id"])
+    upload_states.delete(payload["token"])
+
+
+def process_batch_item(item) -> dict:
+    """Detect and OCR one image of a batch and keep it for /batch_submit."""
+    try:
+        info = validate_image(item.data, MAX_IMAGE_PIXELS)
+    except InvalidImageError as e:
+        return {"status": "error", "error": str(e), "status_code": 400}
+    try:
+        result = inference.extract(item.data, stage_timer())
+    except InvalidImageError:
+        return {"status": "error", "error": "Invalid image file.", "status_code": 400}
+    except ModelNotReadyError:
+        error = "Model is still loading, try again."
+        return {"status": "error", "error": error, "status_code": 503}
+    except InferenceUnavailableError:
+        error = "Inference is unavailable, try again."
+        return {"status": "error", "error": error, "status_code": 503}
+    if result["box"] is None:
+        error = "No total_value detected in the receipt."
+        return {"status": "error", "error": error, "status_code": 404}
+
+    filename = secure_filename(os.path.basename(item.filename)) or "receipt.jpg"
+    extension = os.path.splitext(filename)[1] or ".jpg"
+    token = upload_states.create(
+        {
+            "blob_id": receipt_store.put(item.data, extension),
+            "filename": filename,
+            "content_type": f"image/{info.format}",
+            "extracted_text": result["extracted_text"],
+        }
+    )
+    return {
+        "status": "ok",
+        "upload_token": token,
+        "extracted_text": result["extracted_text"],
+        "confidence": result["confidence"],
+        "fields": result["fields"],
+    }
+
+
+def upload_stored_receipt(
+    blob_id: str, filename: str, content_type: str, data: dict
+) -> str:
+    """Forward a stored receipt to the Receipt API straight from its mmap."""
+    with receipt_store.open(blob_id) as receipt, external_call("receipt_api"):
+        return upload_client.upload_receipt(
+            RECEIPT_API_ENDPOINT, receipt, filename, content_type, data
+        )
 
 
-def append_to_sheet(
+def build_sheet_row(
     amount: str,
     rencana_id: str,
     account_skkos_id: str,
@@ -209,16 +481,8 @@ def append_to_sheet(
     judulLaporan: str,
     receipt_link: str,
     evidence_links: str,
-):
-    """Append data to the Google Sheet."""
-    scope = SCOPES
-    creds = ServiceAccountCredentials.from_json_keyfile_name(
-        GOOGLE_CREDENTIALS_PATH, scope
-    )
-    client = gspread.authorize(creds)
-
-    # Open the Google Sheet and access the REKAPREALISASI worksheet
-    sheet = client.open_by_key(GOOGLE_SHEET_ID).worksheet("REKAPREALISASI")
+) -> list:
+    """Build one REKAPREALISASI row (columns A to I) as strings."""
     # Set timezone to GMT+8
     gmt8 = pytz.timezone('Asia/Singapore')  # or 'Asia/Shanghai' for China GMT+8
 
@@ -236,31 +500,118 @@ def append_to_sheet(
         uraian,  # Column H: Uraian
         judulLaporan,  # Column I: Judul Laporan
     ]
+    return [str(value) for value in data_to_append]
+
 
-    # Find the first blank row and append the data
-    next_row = len(sheet.col_values(1)) + 1
-    sheet.insert_row(data_to_append, next_row)
+def append_to_sheet(*args):
+    """Queue a row for the REKAPREALISASI sheet; it is appended in a batch."""
+    # Durably journal the row; the background flusher appends it after the
+    # last filled row, so concurrent submits no longer race for a row number
+    append_queue.enqueue("REKAPREALISASI", build_sheet_row(*args))
 
 
 def query_from_sheet(sheet_name: str, column_idx: int) -> list:
     """Retrieve data from a specific column in the sheet."""
-    scope = SCOPES
-    creds = ServiceAccountCredentials.from_json_keyfile_name(
-        GOOGLE_CREDENTIALS_PATH, scope
+    return sheets_call(sheet_name, "col_values", column_idx)
+
+
+# ------------------------ Startup ------------------------ #
+
+
+def create_inference():
+    """Detection and OCR in this process, or in the INFERENCE_SOCKET workers."""
+    if not INFERENCE_SOCKET:
+        return LocalInference()
+    return RemoteInference(
+        [address.strip() for address in INFERENCE_SOCKET.split(",")],
+        authkey=INFERENCE_AUTHKEY.encode() if INFERENCE_AUTHKEY else None,
+        timeout=INFERENCE_TIMEOUT,
+        handoff_dir=INFERENCE_HANDOFF_DIR,
     )
-    client = gspread.authorize(creds)
 
-    sheet = client.open_by_key(GOOGLE_SHEET_ID).worksheet(sheet_name)
-    return sheet.col_values(column_idx)
 
+# Detection and OCR; the heavy imports happen in inference_pipeline.py,
+# loaded on first use here or only in the inference worker
+inference = create_inference()
+
+# Uploaded receipts, kept as the original bytes until /submit
+receipt_store = ReceiptBlobStore(
+    RECEIPT_BLOB_DIR,
+    memory_dir=RECEIPT_BLOB_MEMORY_DIR or None,
+    memory_max_bytes=RECEIPT_BLOB_MEMORY_MAX_KB * 1024,
+    memory_budget_bytes=RECEIPT_BLOB_MEMORY_BUDGET_MB * 1024 * 1024,
+    ttl=RECEIPT_BLOB_TTL,
+)
+
+# Chunks of resumable uploads, assembled on finalize
+chunked_uploads = ChunkedUploadStore(
+    CHUNKED_UPLOAD_DIR,
+    chunk_size=UPLOAD_CHUNK_KB * 1024,
+    max_size=100 * 1024 * 1024,
+    ttl=CHUNKED_UPLOAD_TTL,
+)
+
+# What /submit needs to know about each upload, shared by workers and nodes
+upload_states = create_upload_state_store(
+    UPLOAD_STATE_URL, ttl=RECEIPT_BLOB_TTL, claim_lease=UPLOAD_CLAIM_LEASE
+)
+
+# Keep-alive session for the Receipt and Evidence APIs; receipt uploads run
+# on the client's threads so they overlap with the evidence upload
+upload_client = UploadClient(
+    connect_timeout=UPLOAD_CONNECT_TIMEOUT,
+    receipt_timeout=RECEIPT_UPLOAD_TIMEOUT,
+    evidence_timeout=EVIDENCE_UPLOAD_TIMEOUT,
+    retries=UPLOAD_RETRIES,
+    backoff=UPLOAD_RETRY_BACKOFF,
+    pool_size=UPLOAD_POOL_SIZE,
+    evidence_chunk_files=EVIDENCE_CHUNK_FILES,
+)
+
+# Bounded pool for asynchronous uploads; job status is shared via SQLite
+job_pool = JobPool(
+    process_upload_job,
+    JobStore(JOB_STORE_PATH),
+    workers=JOB_WORKERS,
+    max_queue=JOB_QUEUE_SIZE,
+    result_ttl=JOB_RESULT_TTL,
+    on_discard=discard_upload,
+    observe_stage=observe_stage,
+)
+
+
+def warm_up_worker():
+    """Load the YOLO model before serving (or check the inference worker)."""
+    inference.start(MODEL_PRELOAD)
+
+
+warm_up_worker()
 
 # ------------------------ Routes ------------------------ #
 
 
+@app.errorhandler(InferenceUnavailableError)
+def inference_unavailable(e):
+    logger.error(f"Inference unavailable: {str(e)}")
+    return jsonify({"error": "Inference is unavailable, try again."}), 503
+
+
+@app.errorhandler(ChunkedUploadError)
+def chunked_upload_error(e):
+    body = {"error": str(e)}
+    if e.offset is not None:
+        body["offset"] = e.offset  # Where the client should resume
+    return jsonify(body), e.status_code
+
+
 @app.route("/")
 def index():
     """Render the main index page."""
-    return render_template("index.html")
+    return render_template(
+        "index.html",
+        client_image_max_side=CLIENT_IMAGE_MAX_SIDE,
+        client_image_quality=CLIENT_IMAGE_QUALITY,
+    )
 
 
 @app.route("/get_rencana_details")
@@ -276,6 +627,8 @@ def get_rencana_details():
 
 @app.route("/submit", methods=["POST"])
 def submit_data():
+    claimed_token = None
+    timer = stage_timer()
     try:
         # Access form data
         rencana_id = escape(request.form.get("rencana_id"))
@@ -289,65 +642,53 @@ def submit_data():
         if not account_skkos_id:
             return jsonify({"error": "No account_skkos_id provided"}), 400
 
-        # Retrieve necessary data from session
-        file_path = session.get("receipt_file_path")
-        filename = session.get("receipt_filename")
-        content_type = session.get("receipt_content_type")
-        extracted_text = session.get("extracted_text")
+        # Claim the upload (token from the form, or the session cookie) so
+        # concurrent submits of one receipt cannot both forward it
+        token = request.form.get("upload_token") or session.get("upload_token")
+        with timer("claim"):
+            upload = upload_states.claim(token) if token else None
+        if upload is None:
+            if token and upload_states.get(token) is not None:
+                return jsonify({"error": "Receipt is already being submitted."}), 409
+            return jsonify({"error": "No receipt file found to upload."}), 400
+        claimed_token = token
+
+        blob_id = upload["blob_id"]
+        filename = upload["filename"]
+        content_type = upload["content_type"]
+        extracted_text = upload.get("extracted_text")
 
-        if not file_path or not filename or not content_type:
+        # The stored receipt may have expired and been swept
+        if not receipt_store.exists(blob_id) or not filename or not content_type:
+            upload_states.delete(token)
             return jsonify({"error": "No receipt file found to upload."}), 400
 
+        # Asynchronous uploads: the job fills in the text once it is done
+        job_id = upload.get("job_id")
+        if job_id and extracted_text is None:
+            job = job_pool.store.get(job_id)
+            if job is None or job["status"] == "failed":
+                upload_states.delete(token)
+                return jsonify({"error": "No receipt file found to upload."}), 400
+            if job["status"] != "done":
+                upload_states.release(token)
+                return jsonify({"error": "Receipt is still being processed."}), 409
+            extracted_text = job["result"]["extracted_text"]
+
         # Prepare additional data to send to Receipt API
         receipt_payload = {
             "accountSKKO": account_skkos_id,
             "extracted_text": extracted_text,
         }
 
-        # Upload the receipt to the external Receipt API
-        with open(file_path, "rb") as receipt_file:
-            receipt_files = {
-                "file": (
-                    secure_filename(filename),
-                    receipt_file,
-                    content_type,
-                )
-            }
-            try:
-                receipt_api_response = requests.post(
-                    RECEIPT_API_ENDPOINT,
-                    data=receipt_payload,
-                    files=receipt_files,
-                    timeout=500,  # Set timeout for the request
-                )
-            except requests.Timeout:
-                return jsonify({"error": "Receipt API request timed out."}), 504
-
-        if receipt_api_response.status_code == 200:
-            receipt_api_data = receipt_api_response.json()
-            if receipt_api_data.get("status") == "success":
-                receipt_link = receipt_api_data["data"]["fileLink"]
-                # Remove the temporary file after upload
-                os.remove(file_path)
-                # Remove file info from session
-                session.pop("receipt_file_path", None)
-                session.pop("receipt_filename", None)
-                session.pop("receipt_content_type", None)
-                session.pop("extracted_text", None)
-            else:
-                logger.error(f"Receipt API failed: {receipt_api_data.get('message')}")
-                return (
-                    jsonify({"error": "Failed to upload receipt to Receipt API."}),
-                    500,
-                )
-        else:
-            logger.error(
-                f"Receipt API responded with status code {receipt_api_response.status_code}"
-            )
-            return (
-                jsonify({"error": "Receipt API responded with an error."}),
-                500,
-            )
+        # Start the receipt upload; evidence files are sent at the same time
+        receipt_future = upload_client.submit(
+            upload_stored_receipt,
+            blob_id,
+            secure_filename(filename),
+            content_type,
+            receipt_payload,
+        )
 
         # Handle evidence files upload
         evidence_links = []
@@ -361,12 +702,12 @@ def submit_data():
                     logger.warning("Skipped a file with no filename.")
                     continue  # Skip files with no name
 
-                # Validate file type using imghdr
+                # Validate file type from the container headers; evidence is
+                # only forwarded, never decoded, so HEIC is accepted too
                 file.seek(0)
                 header = file.read(512)
                 file.seek(0)
-                file_type = imghdr.what(None, header)
-                if not file_type:
+                if probe_image(header) is None:
                     logger.warning(f"Skipped invalid image file: {file.filename}")
                     continue  # Skip invalid image files
 
@@ -380,13 +721,14 @@ def submit_data():
                     continue  # Skip files exceeding size limit
                 file.seek(0)
 
-                # Append to the files_payload with the correct field name "files"
+                # Append to the files_payload with the correct field name "files";
+                # the file is streamed from Werkzeug's spooled upload, not read
                 files_payload.append(
                     (
                         "files",
                         (
                             secure_filename(file.filename),
-                            file.read(),
+                            file.stream,
                             file.content_type,
                         ),
                     )
@@ -399,33 +741,9 @@ def submit_data():
                 }
 
                 try:
-                    evidence_api_response = requests.post(
-                        EVIDENCE_API_ENDPOINT,
-                        data=data_payload,
-                        files=files_payload,
-                        timeout=500,  # Set timeout for the request
-                    )
-
-                    if evidence_api_response.status_code == 200:
-                        evidence_api_data = evidence_api_response.json()
-                        if evidence_api_data.get("status") == "success":
-                            data = evidence_api_data.get("data", {})
-                            if isinstance(data, list):
-                                for item in data:
-                                    file_link = item.get("fileLink")
-                                    if file_link:
-                                        evidence_links.append(file_link)
-                            elif isinstance(data, dict):
-                                file_link = data.get("fileLink")
-                                if file_link:
-                                    evidence_links.append(file_link)
-                        else:
-                            logger.error(
-                                f"Evidence API failed: {evidence_api_data.get('message')}"
-                            )
-                    else:
-                        logger.error(
-                            f"Evidence API responded with status code {evidence_api_response.status_code}"
+                    with timer("evidence_upload"), external_call("evidence_api"):
+                        evidence_links = upload_client.upload_evidence(
+                            EVIDENCE_API_ENDPOINT, files_payload, data_payload
                         )
                 except Exception as e:
                     logger.error(
@@ -433,16 +751,42 @@ def submit_data():
                         exc_info=True,
                     )
 
+        try:
+            with timer("receipt_wait"):
+                receipt_link = receipt_future.result()
+        except UploadTimeoutError:
+            upload_states.release(token)
+            return jsonify({"error": "Receipt API request timed out."}), 504
+        except UploadAPIError as e:
+            upload_states.release(token)
+            logger.error(f"Receipt API failed: {str(e)}")
+            if e.status_code is not None:
+                return (
+                    jsonify({"error": "Receipt API responded with an error."}),
+                    500,
+                )
+            return (
+                jsonify({"error": "Failed to upload receipt to Receipt API."}),
+                500,
+            )
+
+        # Remove the stored receipt and its upload state after upload
+        receipt_store.delete(blob_id)
+        upload_states.delete(token)
+        claimed_token = None
+        session.pop("upload_token", None)
+
         # Append data to Google Sheet
-        append_to_sheet(
-            amount,
-            rencana_id,
-            account_skkos_id,
-            uraian,
-            judulLaporan,
-            receipt_link,
-            ", ".join(evidence_links),
-        )
+        with timer("sheet_enqueue"):
+            append_to_sheet(
+                amount,
+                rencana_id,
+                account_skkos_id,
+                uraian,
+                judulLaporan,
+                receipt_link,
+                ", ".join(evidence_links),
+            )
 
         return jsonify(
             success=True,
@@ -450,6 +794,8 @@ def submit_data():
         )
     except Exception as e:
         logger.error(f"Error in submit_data: {str(e)}", exc_info=True)
+        if claimed_token:
+            upload_states.release(claimed_token)
         return jsonify(success=False, message=str(e)), 500
 
 
@@ -458,24 +804,7 @@ def submit_data():
 def fetch_id_rencana():
     """Fetch 'Id Rencana' from the Google Sheet."""
     try:
-        client = init_gspread_client()
-        sheet = client.open_by_key(GOOGLE_SHEET_ID).worksheet("RENCANA")
-        records = sheet.get_all_records()
-
-        id_rencana_data = []
-        for record in records:
-            id_value = record.get("id rencana", "")
-            if id_value != "":
-                # Convert to integer if possible
-                try:
-                    id_int = int(id_value)
-                    # Format with leading zeros (e.g., 00001)
-                    id_str = f"{id_int:05d}"
-                except ValueError:
-                    # If conversion fails, use the string as is
-                    id_str = str(id_value).strip()
-                id_rencana_data.append(id_str)
-
+        id_rencana_data = rencana_cache.ids()
         return jsonify(id_rencana_data), 200
     except Exception as e:
         logger.error(f"Error fetching Id Rencana: {str(e)}", exc_info=True)
@@ -487,18 +816,80 @@ def fetch_id_rencana():
 def fetch_account_skkos():
     """Fetch 'Account SKKO' from the Google Sheet."""
     try:
-        account_skkos_data = query_from_sheet(
-            "ACCOUNTLIST", 1
-        )  # Column A of 'ACCOUNTLIST'
+        account_skkos_data = account_index.names()  # Column A of 'ACCOUNTLIST'
         return jsonify(account_skkos_data), 200
     except Exception as e:
         logger.error(f"Error fetching Account SKKOs: {str(e)}", exc_info=True)
         return jsonify({"error": "Error fetching Account SKKOs"}), 500
 
 
+@app.route("/bootstrap", methods=["GET"])
+def bootstrap():
+    """Return the reference data the page needs in one revalidatable payload.
+
+    `include` picks the sections (default id_rencana,account_skkos; add
+    rencana_details for every RENCANA record by id). The response carries a
+    content-derived ETag, so a repeat request with If-None-Match gets a 304
+    without a body, and is compressed with brotli or gzip when accepted.
+    """
+    names = request.args.get("include", "id_rencana,account_skkos").split(",")
+    names = {name.strip() for name in names if name.strip()}
+    unknown = names - set(bootstrap_cache.sections)
+    if unknown or not names:
+        return jsonify({"error": f"Unknown sections: {sorted(unknown)}"}), 400
+    include = tuple(name for name in bootstrap_cache.sections if name in names)
+    accepted = tuple(e for e in ENCODINGS if request.accept_encodings[e])
+    try:
+        etag, body, encoding = bootstrap_cache.get(include, accepted)
+    except Exception as e:
+        logger.error(f"Error building bootstrap data: {str(e)}", exc_info=True)
+        return jsonify({"error": "Error fetching reference data"}), 500
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag, weak=True)
+    # Cacheable, but revalidated on every use
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@app.route("/search_account_skkos", methods=["GET"])
+def search_account_skkos():
+    """Return one page of the Account SKKOs matching `q` (prefix, then fuzzy)."""
+    query = request.args.get("q", "")
+    try:
+        limit = int(request.args.get("limit", "20"))
+        offset = int(request.args.get("offset", "0"))
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+    limit = max(1, min(limit, ACCOUNT_SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+    try:
+        results, has_more = account_index.search(query, limit, offset)
+    except Exception as e:
+        logger.error(f"Error searching Account SKKOs: {str(e)}", exc_info=True)
+        return jsonify({"error": "Error searching Account SKKOs"}), 500
+    return (
+        jsonify(
+            query=query,
+            results=results,
+            offset=offset,
+            limit=limit,
+            has_more=has_more,
+        ),
+        200,
+    )
+
+
 @app.route("/upload_file", methods=["POST"])
 def upload_file():
     """Handle receipt file upload and extract total_value."""
+    timer = stage_timer()
     try:
         # No longer require 'accountSKKO' here
 
@@ -511,14 +902,6 @@ def upload_file():
         if file.filename == "":
             return jsonify({"error": "No selected file"}), 400
 
-        # Validate file type using imghdr
-        file.seek(0)
-        header = file.read(512)
-        file.seek(0)
-        file_type = imghdr.what(None, header)
-        if not file_type:
-            return jsonify({"error": "Invalid image file."}), 400
-
         # Validate file size (e.g., max 100MB)
         file.seek(0, os.SEEK_END)
         file_length = file.tell()
@@ -526,69 +909,578 @@ def upload_file():
             return jsonify({"error": "File size exceeds 100MB limit."}), 400
         file.seek(0)
 
-        # Read the image file as a NumPy array for OpenCV
-        np_img = np.frombuffer(file.read(), np.uint8)
-        image = cv2.imdecode(np_img, cv2.IMREAD_COLOR)
+        with timer("read"):
+            file_bytes = file.read()
+
+        return process_receipt(file, file_bytes, timer)
+
+    except Exception as e:
+        logger.error(f"Error in upload_file: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred."}), 500
 
-        # Generate a unique temporary filename
-        temp_filename = generate_temp_filename()
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], temp_filename)
-        cv2.imwrite(file_path, image)
 
-        # Load model and set credentials (load once if not already loaded)
-        global model, class_names
-        if "model" not in globals():
-            model = load_model(YOLO_MODEL_PATH)
-            class_names = get_class_names(model)
-            set_google_credentials(GOOGLE_CREDENTIALS_PATH)
+def process_receipt(file, file_bytes: bytes, timer: StageTimer):
+    """Validate, detect and OCR one receipt; shared by the upload routes.
 
-        # Process the image using YOLO and OCR
+    `file` supplies the filename and content type. Runs as a job with
+    UPLOAD_ASYNC or ?async=1, otherwise in this request.
+    """
+    # Validate format and pixel count from the headers, before any decode
+    with timer("validate"):
         try:
-            cropped_img = visualize_and_extract_total_value(
-                image, model, class_names, "total_value"
+            validate_image(file_bytes, MAX_IMAGE_PIXELS)
+        except ImageTooLargeError as e:
+            return jsonify({"error": str(e)}), 400
+        except InvalidImageError:
+            return jsonify({"error": "Invalid image file."}), 400
+    # The original bytes are kept as-is for the Receipt API
+    extension = os.path.splitext(secure_filename(file.filename))[1] or ".jpg"
+
+    if UPLOAD_ASYNC or request.args.get("async") == "1":
+        return submit_upload_job(file, receipt_store.put(file_bytes, extension))
+
+    # Process the image using YOLO and OCR (or reuse a cached result)
+    try:
+        result = inference.extract(file_bytes, timer)
+    except InvalidImageError:
+        return jsonify({"error": "Invalid image file."}), 400
+    except ModelNotReadyError:
+        return jsonify({"error": "Model is still loading, try again."}), 503
+    except InferenceUnavailableError as e:
+        logger.error(f"Inference unavailable: {str(e)}")
+        return jsonify({"error": "Inference is unavailable, try again."}), 503
+    except Exception as e:
+        logger.error(f"Error processing image: {str(e)}", exc_info=True)
+        return jsonify({"error": "Error processing image."}), 500
+
+    if result["box"] is not None:
+        extracted_text = result["extracted_text"]
+        logger.info(f"Extracted Text: {extracted_text}")
+
+        # Keep the receipt server-side; the client only holds the token
+        with timer("store"):
+            token = save_upload_state(
+                file,
+                receipt_store.put(file_bytes, extension),
+                extracted_text=extracted_text,
             )
 
-            if cropped_img is not None:
-                extracted_text = extract_text_from_image(cropped_img)
-                logger.info(f"Extracted Text: {extracted_text}")
+        # Return the extracted_text to the frontend
+        return (
+            jsonify(
+                {
+                    "extracted_text": extracted_text,
+                    "fields": result["fields"],
+                    "upload_token": token,
+                    "message": "Total value extracted successfully.",
+                }
+            ),
+            200,
+        )
+    else:
+        return (
+            jsonify(
+                {
+                    "error": "No total_value detected in the receipt.",
+                }
+            ),
+            404,
+        )
 
-                # Store necessary data in session for later use
-                session["receipt_file_path"] = file_path
-                session["receipt_filename"] = file.filename
-                session["receipt_content_type"] = file.content_type
-                session["extracted_text"] = extracted_text
 
-                # Return the extracted_text to the frontend
-                return (
-                    jsonify(
-                        {
-                            "extracted_text": extracted_text,
-                            "message": "Total value extracted successfully.",
-                        }
-                    ),
-                    200,
-                )
-            else:
-                # Remove the temporary file if no total_value detected
-                os.remove(file_path)
-                return (
-                    jsonify(
-                        {
-                            "error": "No total_value detected in the receipt.",
-                        }
-                    ),
-                    404,
-                )
-        except Exception as e:
-            logger.error(f"Error processing image: {str(e)}", exc_info=True)
-            # Remove the temporary file in case of processing error
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            return jsonify({"error": "Error processing image."}), 500
+# ------------------------ Chunked Uploads ------------------------ #
+
+
+@app.route("/uploads", methods=["POST"])
+def create_chunked_upload():
+    """Start a resumable upload: JSON {filename, content_type, size, sha256}."""
+    body = request.get_json(silent=True) or {}
+    status = chunked_uploads.create(
+        body.get("filename"),
+        body.get("content_type"),
+        body.get("size"),
+        body.get("sha256"),
+    )
+    upload_url = f"/uploads/{status['upload_id']}"
+    return (
+        jsonify(
+            **status,
+            upload_url=upload_url,
+            finalize_url=f"{upload_url}/finalize",
+        ),
+        201,
+    )
+
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def chunked_upload_status(upload_id):
+    """Return the offset to resume from after a dropped connection."""
+    return jsonify(chunked_uploads.status(upload_id)), 200
+
+
+@app.route("/uploads/<upload_id>", methods=["PUT"])
+def put_upload_chunk(upload_id):
+    """Store the raw request body at ?offset= (or the Upload-Offset header)."""
+    offset = request.args.get("offset", request.headers.get("Upload-Offset"))
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        return jsonify({"error": "offset must be an integer"}), 400
+    # Checked before the body is read, so an oversized PUT is never buffered;
+    # without a Content-Length only a chunked body can carry any bytes
+    length = request.content_length
+    chunked = "chunked" in request.headers.get("Transfer-Encoding", "").lower()
+    if (length is None and chunked) or (length or 0) > chunked_uploads.chunk_size:
+        return (
+            jsonify(
+                {
+                    "error": "Chunks need a Content-Length of at most "
+                    f"{chunked_uploads.chunk_size} bytes."
+                }
+            ),
+            413,
+        )
+    offset = chunked_uploads.write_chunk(
+        upload_id,
+        offset,
+        request.get_data(cache=False),
+        request.headers.get("X-Chunk-SHA256"),
+    )
+    return jsonify(upload_id=upload_id, offset=offset), 200
 
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+def delete_chunked_upload(upload_id):
+    """Abandon an upload and delete what was received."""
+    chunked_uploads.delete(upload_id)
+    return "", 204
+
+
+@app.route("/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_chunked_upload(upload_id):
+    """Verify the assembled file and process it like /upload_file.
+
+    The outcome is stored with the upload, so a client that lost the
+    response can finalize again and gets the same answer; on a temporary
+    failure (429 or 5xx) it may retry for real.
+    """
+    timer = stage_timer()
+    with timer("assemble"):
+        meta = chunked_uploads.finalize(upload_id)
+    if meta["state"] == "finalized":
+        stored = meta["response"]
+        return jsonify(stored["body"]), stored["status_code"]
+
+    file = FileStorage(filename=meta["filename"], content_type=meta["content_type"])
+    try:
+        # A memory map of the assembled file stands in for its bytes
+        with chunked_uploads.open(upload_id) as file_bytes:
+            response, status_code = process_receipt(file, file_bytes, timer)
     except Exception as e:
-        logger.error(f"Error in upload_file: {str(e)}", exc_info=True)
+        chunked_uploads.reopen(upload_id)
+        logger.error(f"Error finalizing upload: {str(e)}", exc_info=True)
         return jsonify({"error": "An unexpected error occurred."}), 500
+    if status_code == 429 or status_code >= 500:
+        chunked_uploads.reopen(upload_id)
+    else:
+        chunked_uploads.complete(upload_id, status_code, response.get_json())
+    return response, status_code
+
+
+def save_upload_state(file, blob_id: str, **fields) -> str:
+    """Record a stored receipt server-side and remember its token."""
+    token = upload_states.create(
+        {
+            "blob_id": blob_id,
+            "filename": file.filename,
+            "content_type": file.content_type,
+            **fields,
+        }
+    )
+    session["upload_token"] = token
+    return token
+
+
+@app.route("/batch_upload", methods=["POST"])
+def batch_upload():
+    """Process many receipts (images and/or ZIP archives) and stream NDJSON.
+
+    Each line is one receipt's result as soon as it is ready (in completion
+    order, with its index in the batch); the last line is a summary. Each
+    successful result carries an upload_token for /batch_submit.
+    """
+    files = request.files.getlist("files")
+    if not files:
+        return jsonify({"error": "No files provided"}), 400
+
+    # The request's files are closed once this view returns, before the
+    # response body is generated
+    uploads = detach_uploads(files)
+    # Reject an oversized batch before anything is processed, so no upload
+    # token or stored receipt is created that the client never hears about
+    if count_batch_items(uploads) > BATCH_MAX_FILES:
+        for _, stream in uploads:
+            stream.close()
+        error = f"A batch may hold at most {BATCH_MAX_FILES} images."
+        return jsonify({"error": error}), 400
+    items = iter_batch_items(uploads, BATCH_MAX_FILES, 100 * 1024 * 1024)
+
+    def results():
+        counts = {"ok": 0, "error": 0, "duplicate": 0}
+        try:
+            for result in process_batch(items, process_batch_item, BATCH_CONCURRENCY):
+                counts[result["status"]] += 1
+                yield json.dumps(result) + "\n"
+        except BatchTooLargeError as e:
+            yield json.dumps({"status": "error", "error": str(e)}) + "\n"
+        yield json.dumps({"summary": counts}) + "\n"
+
+    return Response(
+        stream_with_context(results()),
+        mimetype="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/batch_submit", methods=["POST"])
+def batch_submit():
+    """Submit several processed receipts and append all rows in one call.
+
+    JSON body: {"items": [{"upload_token", "amount", "rencana_id",
+    "account_skkos_id", "uraian", "judulLaporan"}, ...]}; any other
+    top-level field is used as the default for every item.
+    """
+    body = request.get_json(silent=True) or {}
+    items = body.get("items") or []
+    if not items:
+        return jsonify({"error": "No items provided"}), 400
+    if len(items) > BATCH_MAX_FILES:
+        error = f"A batch may hold at most {BATCH_MAX_FILES} receipts."
+        return jsonify({"error": error}), 400
+    defaults = {key: value for key, value in body.items() if key != "items"}
+
+    results = []
+    claimed = []  # (result, token, upload, fields, future)
+    for item in items:
+        merged = {**defaults, **item} if isinstance(item, dict) else defaults
+        fields = {key: escape(value or "") for key, value in merged.items()}
+        token = str(fields.get("upload_token", ""))
+        result = {"upload_token": token}
+        results.append(result)
+        if not fields.get("account_skkos_id"):
+            result.update(status="error", error="No account_skkos_id provided")
+            continue
+        upload = upload_states.claim(token) if token else None
+        if upload is None or not receipt_store.exists(upload["blob_id"]):
+            if upload is not None:
+                upload_states.delete(token)
+            result.update(status="error", error="No receipt file found to upload.")
+            continue
+        if upload.get("extracted_text") is None:
+            upload_states.release(token)
+            result.update(status="error", error="Receipt is still being processed.")
+            continue
+        receipt_payload = {
+            "accountSKKO": fields["account_skkos_id"],
+            "extracted_text": upload["extracted_text"],
+        }
+        future = upload_client.submit(
+            upload_stored_receipt,
+            upload["blob_id"],
+            secure_filename(upload["filename"]),
+            upload["content_type"],
+            receipt_payload,
+        )
+        claimed.append((result, token, upload, fields, future))
+
+    # The receipt uploads run concurrently on the upload client's pool
+    rows, done = [], []
+    for result, token, upload, fields, future in claimed:
+        try:
+            receipt_link = future.result()
+        except Exception as e:
+            # Any failure (API error, bad response, missing blob, network)
+            # only fails this item; the others still get their rows
+            logger.error(f"Receipt upload failed for a batch item: {str(e)}")
+            upload_states.release(token)
+            result.update(status="error", error="Failed to upload receipt.")
+            continue
+        rows.append(
+            build_sheet_row(
+                fields.get("amount", ""),
+                fields.get("rencana_id", ""),
+                fields["account_skkos_id"],
+                fields.get("uraian", ""),
+                fields.get("judulLaporan", ""),
+                receipt_link,
+                "",
+            )
+        )
+        done.append((token, upload))
+        result.update(status="ok", receipt_link=receipt_link)
+
+    sheet_status = None
+    if rows:
+        # One append_rows call for the whole batch; if it fails the rows go
+        # to the durable append journal and are retried in the background
+        try:
+            sheets_call("REKAPREALISASI", "append_rows", rows)
+            sheet_status = "appended"
+        except Exception as e:
+            logger.error(f"Batch append failed, journaling rows: {str(e)}")
+            for row in rows:
+                append_queue.enqueue("REKAPREALISASI", row)
+            sheet_status = "queued"
+        for token, upload in done:
+            receipt_store.delete(upload["blob_id"])
+            upload_states.delete(token)
+
+    return jsonify(
+        {
+            "success": bool(rows),
+            "rows": len(rows),
+            "sheet": sheet_status,
+            "results": results,
+        }
+    )
+
+
+def submit_upload_job(file, blob_id: str):
+    """Queue an upload for background processing and answer 202 at once."""
+    # extracted_text is filled in by the job once it is done
+    token = save_upload_state(file, blob_id, extracted_text=None)
+    try:
+        job_id = job_pool.submit({"blob_id": blob_id, "token": token})
+    except QueueFullError:
+        receipt_store.delete(blob_id)
+        upload_states.delete(token)
+        session.pop("upload_token", None)
+        response = jsonify({"error": "Too many uploads in progress, try again."})
+        response.headers["Retry-After"] = "5"
+        return response, 429
+    upload_states.update(token, job_id=job_id)
+
+    return (
+        jsonify(
+            {
+                "job_id": job_id,
+                "upload_token": token,
+                "status_url": f"/jobs/{job_id}",
+                "events_url": f"/jobs/{job_id}/events",
+                "message": "Receipt accepted for processing.",
+            }
+        ),
+        202,
+    )
+
+
+def job_response(job: dict) -> dict:
+    """Public view of a job."""
+    body = {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "timings_ms": job["timings_ms"],
+    }
+    if job["status"] == "done":
+        body["extracted_text"] = job["result"]["extracted_text"]
+    elif job["status"] == "failed":
+        body["error"] = job["error"]
+        body["status_code"] = job["status_code"]
+    return body
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Return the status, per-stage timings and result of an upload job."""
+    job = job_pool.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job_response(job)), 200
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Stream job updates as server-sent events until the job finishes."""
+    if job_pool.store.get(job_id) is None:
+        return jsonify({"error": "Job not found."}), 404
+
+    def events():
+        deadline = time.monotonic() + JOB_EVENTS_TIMEOUT
+        last, last_sent = None, time.monotonic()
+        while time.monotonic() < deadline:
+            job = job_pool.store.get(job_id)
+            if job is None:
+                return
+            state = (job["status"], job["stage"])
+            if state != last:
+                last, last_sent = state, time.monotonic()
+                yield f"data: {json.dumps(job_response(job))}\n\n"
+                if job["status"] in FINISHED_STATUSES:
+                    return
+            elif time.monotonic() - last_sent > 15:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(0.25)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Metrics of this worker process in the Prometheus text format."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    queue_depth.set(job_pool.get_stats()["queued"], queue="jobs")
+    queue_depth.set(append_queue.depth(), queue="sheet_append")
+    text = metrics.render() + inference.render_metrics()
+    return Response(text, mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness probe: healthy only once the YOLO model is loaded and warm."""
+    try:
+        status = inference.status()
+    except InferenceUnavailableError as e:
+        return jsonify({"ready": False, "error": str(e)}), 503
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@app.route("/admin/model/swap", methods=["POST"])
+def swap_model():
+    """Load new weights and switch to them without restarting the worker."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    payload = request.get_json(silent=True) or {}
+    model_path = payload.get("model_path")
+    if model_path is not None and not isinstance(model_path, str):
+        return jsonify({"error": "model_path must be a string."}), 400
+    try:
+        status = inference.swap(model_path)
+    except ModelPathError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Model swap failed: {str(e)}"}), 500
+    return jsonify(status), 200
+
+
+@app.route("/admin/inference_stats", methods=["GET"])
+def inference_stats():
+    """Return micro-batching counters for the YOLO inference scheduler."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(inference.get_stats()["inference"]), 200
+
+
+@app.route("/admin/ocr_stats", methods=["GET"])
+def ocr_stats():
+    """Return Vision batching counters and per-engine OCR latency/agreement."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(inference.get_stats()["ocr"]), 200
+
+
+@app.route("/admin/result_cache", methods=["GET"])
+def result_cache_stats():
+    """Return hit/miss/eviction counters of the receipt result cache."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(inference.get_stats()["result_cache"]), 200
+
+
+@app.route("/admin/cpu_topology", methods=["GET"])
+def cpu_topology_stats():
+    """Return the thread pools and CPUs the inference process actually uses."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(inference.get_stats()["cpu"]), 200
+
+
+@app.route("/admin/sheets_stats", methods=["GET"])
+def sheets_stats():
+    """Return the shared Google Sheets client counters."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(sheets_pool.get_stats()), 200
+
+
+@app.route("/admin/rencana_cache", methods=["GET"])
+def rencana_cache_stats():
+    """Return the RENCANA cache counters."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(rencana_cache.get_stats()), 200
+
+
+@app.route("/admin/rencana_cache/invalidate", methods=["POST"])
+def invalidate_rencana_cache():
+    """Drop the cached RENCANA snapshot after the sheet was edited."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    rencana_cache.invalidate()
+    return jsonify(success=True, message="RENCANA cache invalidated."), 200
+
+
+@app.route("/admin/account_index", methods=["GET"])
+def account_index_stats():
+    """Return the ACCOUNTLIST search index counters."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(account_index.get_stats()), 200
+
+
+@app.route("/admin/account_index/refresh", methods=["POST"])
+def refresh_account_index():
+    """Re-sync the ACCOUNTLIST index with the sheet after it was edited."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    account_index.refresh()
+    return jsonify(success=True, message="ACCOUNTLIST refresh started."), 202
+
+
+@app.route("/admin/bootstrap_cache", methods=["GET"])
+def bootstrap_cache_stats():
+    """Return the /bootstrap payload cache counters."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(bootstrap_cache.get_stats()), 200
+
+
+@app.route("/admin/chunked_uploads", methods=["GET"])
+def chunked_upload_stats():
+    """Return the resumable upload counters."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(chunked_uploads.get_stats()), 200
+
+
+@app.route("/admin/receipt_store", methods=["GET"])
+def receipt_store_stats():
+    """Return tier usage and sweep counters of the receipt blob store."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(receipt_store.get_stats()), 200
+
+
+@app.route("/admin/jobs", methods=["GET"])
+def job_stats():
+    """Return queue depth and counters of the asynchronous upload pool."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(job_pool.get_stats()), 200
+
+
+@app.route("/admin/append_queue", methods=["GET"])
+def append_queue_stats():
+    """Return the REKAPREALISASI write queue depth and flush latency."""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(append_queue.get_stats()), 200
 
 
 # Remove the '/upload_evidence' route as evidence files will be handled during submission
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class SheetAppendQueue:
+    """Write-behind queue that batches rows into one append_rows call.
+
+    Rows are committed to a local SQLite journal before enqueue() returns, so
+    they survive worker restarts. A background flusher sends pending rows once
+    `batch_size` rows are waiting or the oldest row is `max_delay` seconds old.
+    Rows are claimed with a lease before they are sent, which keeps several
+    gunicorn workers sharing one journal from sending the same row twice.
+    """
+
+    def __init__(
+        self,
+        journal_path: str,
+        flush_rows,
+        batch_size: int = 50,
+        max_delay: float = 2.0,
+        lease_seconds: float = 120.0,
+        retry_delay: float = 5.0,
+    ):
+        self.journal_path = journal_path
+        self.flush_rows = flush_rows
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "flushes": 0,
+            "rows_flushed": 0,
+            "flush_errors": 0,
+            "last_flush_rows": 0,
+            "last_flush_seconds": None,
+            "max_flush_seconds": None,
+        }
+
+        # Threads and SQLite handles do not survive fork (gunicorn --preload)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        journal_dir = os.path.dirname(journal_path)
+        if journal_dir and not os.path.exists(journal_dir):
+            os.makedirs(journal_dir)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending_rows ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " sheet TEXT NOT NULL,"
+                " row_json TEXT NOT NULL,"
+                " enqueued_at REAL NOT NULL,"
+                " claim TEXT,"
+                " claimed_at REAL)"
+            )
+
+    def _after_fork(self):
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stats_lock = threading.Lock()
+        was_running = self._thread is not None
+        self._thread = None
+        if was_running:
+            self.start()
+
+    # ------------------------ Journal ------------------------ #
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.journal_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def _claim_batch(self):
+        """Lease up to batch_size rows of one sheet, or return None."""
+        now = time.time()
+        claim = uuid.uuid4().hex
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT sheet, MIN(enqueued_at), COUNT(*) FROM pending_rows"
+                " WHERE claim IS NULL OR claimed_at < ?"
+                " GROUP BY sheet ORDER BY MIN(enqueued_at) LIMIT 1",
+                (now - self.lease_seconds,),
+            ).fetchone()
+            if row is None:
+                return None
+            sheet, oldest, count = row
+            if count < self.batch_size and now - oldest < self.max_delay:
+                return None
+            conn.execute(
+                "UPDATE pending_rows SET claim = ?, claimed_at = ? WHERE id IN ("
+                " SELECT id FROM pending_rows WHERE sheet = ?"
+                " AND (claim IS NULL OR claimed_at < ?)"
+                " ORDER BY id LIMIT ?)",
+                (claim, now, sheet, now - self.lease_seconds, self.batch_size),
+            )
+        rows = conn.execute(
+            "SELECT row_json FROM pending_rows WHERE claim = ? ORDER BY id",
+            (claim,),
+        ).fetchall()
+        return claim, sheet, [json.loads(r[0]) for r in rows]
+
+    def _finish_batch(self, claim: str, sent: bool):
+        conn = self._connect()
+        with conn:
+            if sent:
+                conn.execute("DELETE FROM pending_rows WHERE claim = ?", (claim,))
+            else:
+                conn.execute(
+                    "UPDATE pending_rows SET claim = NULL, claimed_at = NULL"
+                    " WHERE claim = ?",
+                    (claim,),
+                )
+
+    # ------------------------ Flushing ------------------------ #
+
+    def flush_once(self) -> int:
+        """Send one due batch, if any. Returns the number of rows sent."""
+        batch = self._claim_batch()
+        if batch is None:
+            return 0
+        claim, sheet, rows = batch
+        start = time.perf_counter()
+        try:
+            self.flush_rows(sheet, rows)
+        except Exception as e:
+            self._finish_batch(claim, sent=False)
+            with self._stats_lock:
+                self._stats["flush_errors"] += 1
+            logger.error(f"Failed to append {len(rows)} rows to {sheet}: {str(e)}")
+            raise
+        self._finish_batch(claim, sent=True)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self._stats["flushes"] += 1
+            self._stats["rows_flushed"] += len(rows)
+            self._stats["last_flush_rows"] = len(rows)
+            self._stats["last_flush_seconds"] = round(elapsed, 4)
+            self._stats["max_flush_seconds"] = round(
+                max(elapsed, self._stats["max_flush_seconds"] or 0), 4
+            )
+        logger.info(f"Appended {len(rows)} rows to {sheet} in {elapsed:.3f}s.")
+        return len(rows)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                while self.flush_once():
+                    pass
+                # Poll often enough to honour the max_delay trigger
+                delay = max(self.max_delay / 2, 0.05)
+            except Exception:
+                delay = self.retry_delay
+            self._wakeup.wait(timeout=delay)
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the background flusher; pending journal rows go out first."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="sheet-append-queue", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, flush: bool = True):
+        """Stop the flusher, optionally sending everything still pending."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.max_delay + 5)
+        if flush:
+            max_delay, self.max_delay = self.max_delay, 0
+            try:
+                while self.flush_once():
+                    pass
+            except Exception:
+                logger.error("Pending rows remain in the append journal.")
+            finally:
+                self.max_delay = max_delay
+
+    # ------------------------ Public API ------------------------ #
+
+    def enqueue(self, sheet: str, row: list):
+        """Durably journal one row; it is appended to `sheet` asynchronously."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO pending_rows (sheet, row_json, enqueued_at)"
+                " VALUES (?, ?, ?)",
+                (sheet, json.dumps(row), time.time()),
+            )
+        with self._stats_lock:
+            self._stats["enqueued"] += 1
+        if self.depth() >= self.batch_size:
+            self._wakeup.set()
+
+    def depth(self) -> int:
+        """Number of rows journaled but not yet appended to the sheet."""
+        row = self._connect().execute("SELECT COUNT(*) FROM pending_rows").fetchone()
+        return row[0]
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["depth"] = self.depth()
+        stats["batch_size"] = self.batch_size
+        stats["max_delay"] = self.max_delay
+        return stats
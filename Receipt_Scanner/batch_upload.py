@@ -0,0 +1,192 @@
+import io
+import os
+import zipfile
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from result_cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+# One image of a batch; `error` is set instead of `data` when it was rejected
+BatchItem = namedtuple("BatchItem", ["index", "filename", "data", "error"])
+
+ZIP_SIGNATURE = b"PK\x03\x04"
+
+
+class BatchTooLargeError(Exception):
+    """Raised when a batch holds more images than allowed."""
+
+
+def _read_limited(stream, max_bytes: int):
+    """Read at most max_bytes; None if the stream holds more than that."""
+    data = stream.read(max_bytes + 1)
+    return None if len(data) > max_bytes else data
+
+
+def detach_uploads(files: list) -> list:
+    """Return (filename, stream) pairs that outlive the request.
+
+    Flask closes request.files when the view returns, before a streamed
+    response is generated. Spooled uploads get a duplicated descriptor of
+    their (already unlinked) temporary file; small in-memory ones a copy.
+    """
+    detached = []
+    for upload in files:
+        if not upload.filename:
+            continue
+        try:
+            stream = os.fdopen(os.dup(upload.stream.fileno()), "rb")
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            upload.stream.seek(0)
+            stream = io.BytesIO(upload.stream.read())
+        detached.append((upload.filename, stream))
+    return detached
+
+
+def _is_image_member(member: zipfile.ZipInfo) -> bool:
+    """Skip directories and hidden/metadata members such as __MACOSX/."""
+    basename = os.path.basename(member.filename)
+    if member.is_dir() or not basename or basename.startswith("."):
+        return False
+    return not member.filename.startswith("__MACOSX/")
+
+
+def count_batch_items(files: list) -> int:
+    """Number of items iter_batch_items() will yield for `files`.
+
+    ZIP archives are counted from their central directory without
+    extracting anything, so an oversized batch can be rejected before any
+    of it is processed. Streams are rewound, not closed.
+    """
+    count = 0
+    for _, stream in files:
+        stream.seek(0)
+        is_zip = stream.read(4) == ZIP_SIGNATURE
+        stream.seek(0)
+        if not is_zip:
+            count += 1
+            continue
+        try:
+            with zipfile.ZipFile(stream) as archive:
+                count += sum(1 for m in archive.infolist() if _is_image_member(m))
+        except zipfile.BadZipFile:
+            count += 1  # Reported as one invalid item
+        stream.seek(0)
+    return count
+
+
+def iter_batch_items(files: list, max_files: int, max_bytes: int):
+    """Yield a BatchItem per uploaded image, extracting ZIP archives lazily.
+
+    `files` are (filename, stream) pairs from detach_uploads(); each stream
+    is closed when the iteration ends. A file starting with the ZIP
+    signature is treated as an archive and its members are read one at a
+    time, so only the images currently being processed are in memory.
+    Directories and hidden/metadata members (such as __MACOSX/) are
+    skipped.
+    """
+    index = 0
+
+    def item(filename, data=None, error=None):
+        nonlocal index
+        if index >= max_files:
+            raise BatchTooLargeError(
+                f"A batch may hold at most {max_files} images."
+            )
+        index += 1
+        return BatchItem(index - 1, filename, data, error)
+
+    try:
+        for filename, stream in files:
+            yield from _iter_file(filename, stream, item, max_bytes)
+    finally:
+        for _, stream in files:
+            stream.close()
+
+
+def _iter_file(filename: str, stream, item, max_bytes: int):
+    """Yield the image in `stream`, or every image member if it is a ZIP."""
+    stream.seek(0)
+    is_zip = stream.read(4) == ZIP_SIGNATURE
+    stream.seek(0)
+
+    if not is_zip:
+        data = _read_limited(stream, max_bytes)
+        if data is None:
+            yield item(filename, error="File size exceeds the limit.")
+        else:
+            yield item(filename, data)
+        return
+
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        yield item(filename, error="Invalid ZIP archive.")
+        return
+    with archive:
+        for member in archive.infolist():
+            name = member.filename
+            if not _is_image_member(member):
+                continue
+            if member.file_size > max_bytes:
+                yield item(name, error="File size exceeds the limit.")
+                continue
+            try:
+                with archive.open(member) as member_stream:
+                    data = _read_limited(member_stream, max_bytes)
+            except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+                yield item(name, error=f"Could not extract file: {str(e)}")
+                continue
+            if data is None:
+                yield item(name, error="File size exceeds the limit.")
+            else:
+                yield item(name, data)
+
+
+def process_batch(items, process, concurrency: int = 4):
+    """Run process(item) for every BatchItem, yielding results as they finish.
+
+    At most `concurrency` items are processed, and only that many are read
+    ahead, at a time. Items with the same content as an earlier one are not
+    processed again but reported as duplicates. Every yielded result is a
+    dict with at least index, filename and status.
+    """
+    seen = {}
+    pending = {}
+    items = iter(items)
+    exhausted = False
+
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="batch") as pool:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                item = next(items, None)
+                if item is None:
+                    exhausted = True
+                    break
+                base = {"index": item.index, "filename": item.filename}
+                if item.error is not None:
+                    yield {**base, "status": "error", "error": item.error}
+                    continue
+                digest = content_hash(item.data)
+                if digest in seen:
+                    yield {**base, "status": "duplicate", "duplicate_of": seen[digest]}
+                    continue
+                seen[digest] = item.index
+                pending[pool.submit(process, item)] = base
+
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                base = pending.pop(future)
+                try:
+                    yield {**base, **future.result()}
+                except Exception as e:
+                    logger.error(
+                        f"Batch item {base['filename']} failed: {str(e)}",
+                        exc_info=True,
+                    )
+                    error = "Error processing image."
+                    yield {**base, "status": "error", "error": error}
@@ -0,0 +1,292 @@
+"""Sweep worker count x threads per worker and write the best CPU topology.
+
+Each candidate starts --workers processes the way gunicorn.conf.py runs
+them: the topology is applied before NumPy, OpenCV and the detector
+backend are imported, and with affinity each worker is pinned to its own
+cores. Every worker then decodes and detects the sample receipts
+(--images, or synthetic photos) back to back for --seconds, like a web
+worker under sustained load. Reported per candidate: images/s over all
+workers and p50/p95 latency per image. Rows with "threads": null leave the
+thread pools at the library defaults (every worker using every core).
+
+The candidate with the highest throughput whose p95 is within
+--latency-ms is written to --output (CPU_TOPOLOGY_FILE, read by
+cpu_topology.load_topology()), or the lowest-p95 one when none meets the
+target. --fake swaps the model for a CPU-bound stand-in (OpenCV filter and
+BLAS matmuls on the same thread pools) to try the sweep without weights.
+Usage:
+
+    python benchmarks/autotune_cpu_topology.py --model models/best.pt --images samples/
+    python benchmarks/autotune_cpu_topology.py --fake --seconds 3 --output /tmp/t.json
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+import statistics
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Nothing here may import NumPy or OpenCV at module level: spawned workers
+# import this file before applying their topology
+import cpu_topology  # noqa: E402
+from cpu_topology import CPUTopology  # noqa: E402
+
+
+class BusyDetector:
+    """CPU-bound stand-in for the detector (used with --fake).
+
+    A blur through OpenCV's pool and three matmuls through the BLAS pool,
+    about one GFLOP per image, so threads and affinity matter as they do
+    for the real model.
+    """
+
+    names = {0: "total_value"}
+
+    def __init__(self, input_size: int = 640):
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        self.input_size = input_size
+        self.layers = [
+            rng.standard_normal((input_size * 3, 512), dtype=np.float32) * 0.02,
+            rng.standard_normal((512, 512), dtype=np.float32) * 0.05,
+            rng.standard_normal((512, 512), dtype=np.float32) * 0.05,
+        ]
+
+    def __call__(self, images) -> list:
+        import cv2
+        import numpy as np
+
+        outputs = []
+        for image in images:
+            size = (self.input_size, self.input_size)
+            x = cv2.GaussianBlur(cv2.resize(image, size), (0, 0), 3)
+            x = x.reshape(self.input_size, -1).astype(np.float32) / 255.0
+            for layer in self.layers:
+                x = np.tanh(x @ layer)
+            outputs.append(x)
+        return outputs
+
+
+def run_worker(topology: dict, slot: int, options: dict, images: list, barrier, out):
+    """One worker process: apply the topology, load, then run until the end."""
+    topology = CPUTopology.from_dict(topology)
+    cpu_topology.apply(topology, slot if topology.affinity else None)
+
+    import cv2
+    from image_preprocessing import decode_for_detection
+
+    if options["fake"]:
+        model = BusyDetector(options["input_size"])
+    else:
+        from detector_backends import create_backend
+
+        model = create_backend(
+            options["backend"],
+            options["model"],
+            options["input_size"],
+            num_threads=topology.threads or 0,
+        )
+    cpu_topology.apply_thread_limits(topology)
+
+    def detect(data: bytes):
+        image = decode_for_detection(data, options["max_side"])
+        model([cv2.cvtColor(image, cv2.COLOR_BGR2RGB)])
+
+    detect(images[0])  # Warm-up, outside timing
+    barrier.wait()
+    start = time.perf_counter()
+    deadline = start + options["seconds"]
+    latencies = []
+    index = slot
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        detect(images[index % len(images)])
+        latencies.append(time.perf_counter() - began)
+        index += 1
+    out.put((latencies, time.perf_counter() - start, cpu_topology.describe()))
+
+
+def measure(topology: CPUTopology, options: dict, images: list) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(topology.workers + 1)
+    out = context.Queue()
+    processes = [
+        context.Process(
+            target=run_worker,
+            args=(topology.to_dict(), slot, options, images, barrier, out),
+        )
+        for slot in range(topology.workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        barrier.wait(timeout=options["load_timeout"])
+        results = [out.get(timeout=options["seconds"] * 10 + 60) for _ in processes]
+    except (threading.BrokenBarrierError, queue.Empty):
+        for process in processes:
+            process.terminate()
+        return {**topology.to_dict(), "error": "worker failed or timed out"}
+    finally:
+        for process in processes:
+            process.join()
+
+    latencies = sorted(ms * 1000 for result in results for ms in result[0])
+    elapsed = max(result[1] for result in results)
+    return {
+        **topology.to_dict(),
+        "images": len(latencies),
+        "images_per_s": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 1),
+        "cpus": [result[2]["cpus"] for result in results],
+    }
+
+
+def candidates(args, cpus: int) -> list:
+    affinities = {"off": [False], "on": [True], "both": [False, True]}[args.affinity]
+    topologies = []
+    for workers in args.workers:
+        for threads in args.threads:
+            if workers * threads > cpus and not args.oversubscribe:
+                continue
+            for affinity in affinities:
+                topologies.append(
+                    CPUTopology(workers, threads, 1, threads, affinity)
+                )
+        if args.baseline:
+            topologies.append(CPUTopology(workers))
+    return topologies
+
+
+def pick(results: list, latency_ms: float) -> tuple:
+    """(best result, whether it meets the p95 target)."""
+    measured = [r for r in results if "error" not in r]
+    if not measured:
+        raise SystemExit("No candidate finished; see the worker errors above.")
+    within = [r for r in measured if r["p95_ms"] <= latency_ms]
+    if within:
+        return max(within, key=lambda r: r["images_per_s"]), True
+    return min(measured, key=lambda r: r["p95_ms"]), False
+
+
+def sample_images(args) -> list:
+    paths = []
+    if args.images:
+        for pattern in ("*.jpg", "*.jpeg", "*.png"):
+            paths.extend(glob.glob(os.path.join(args.images, pattern)))
+    if paths:
+        images = []
+        for path in sorted(paths)[: args.max_images]:
+            with open(path, "rb") as f:
+                images.append(f.read())
+        return images
+
+    import cv2
+    from bench_chunked_upload import receipt_photo
+
+    photo = receipt_photo(1200, 1600)
+    return [cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()]
+
+
+def powers_of_two(limit: int) -> list:
+    values = [1]
+    while values[-1] * 2 <= limit:
+        values.append(values[-1] * 2)
+    return values + ([limit] if values[-1] != limit else [])
+
+
+def int_list(text: str) -> list:
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def main():
+    cpus = len(cpu_topology.available_cpus())
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=os.getenv("YOLO_MODEL_PATH"))
+    parser.add_argument(
+        "--backend", default=os.getenv("DETECTOR_BACKEND", "ultralytics")
+    )
+    parser.add_argument(
+        "--input-size", type=int, default=int(os.getenv("DETECTOR_INPUT_SIZE", "640"))
+    )
+    parser.add_argument("--fake", action="store_true", help="No model needed.")
+    parser.add_argument("--images", help="Directory of sample receipt photos.")
+    parser.add_argument("--max-images", type=int, default=50)
+    parser.add_argument("--workers", type=int_list, default=powers_of_two(cpus))
+    parser.add_argument("--threads", type=int_list, default=powers_of_two(cpus))
+    parser.add_argument(
+        "--affinity",
+        choices=("off", "on", "both"),
+        default="both" if hasattr(os, "sched_setaffinity") else "off",
+    )
+    parser.add_argument(
+        "--oversubscribe",
+        action="store_true",
+        help="Also try workers x threads above the number of CPUs.",
+    )
+    parser.add_argument(
+        "--no-baseline",
+        dest="baseline",
+        action="store_false",
+        help="Skip the library-default rows.",
+    )
+    parser.add_argument("--latency-ms", type=float, default=1000.0)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--load-timeout", type=float, default=600.0)
+    parser.add_argument(
+        "--output", default=os.getenv("CPU_TOPOLOGY_FILE", "./cpu_topology.json")
+    )
+    args = parser.parse_args()
+    if not args.fake and not args.model:
+        parser.error("--model (or YOLO_MODEL_PATH) is required without --fake")
+
+    images = sample_images(args)
+    options = {
+        "fake": args.fake,
+        "backend": args.backend,
+        "model": args.model,
+        "input_size": args.input_size,
+        "max_side": int(os.getenv("DETECT_MAX_SIDE", str(args.input_size))),
+        "seconds": args.seconds,
+        "load_timeout": args.load_timeout,
+    }
+
+    results = []
+    for topology in candidates(args, cpus):
+        result = measure(topology, options, images)
+        print(json.dumps({k: v for k, v in result.items() if k != "cpus"}))
+        results.append(result)
+    best, met = pick(results, args.latency_ms)
+    report = {
+        "topology": CPUTopology.from_dict(best).to_dict(),
+        "latency_target_ms": args.latency_ms,
+        "latency_target_met": met,
+        "measured": best,
+        "host": {
+            "cpus": cpus,
+            "physical_cores": len(
+                cpu_topology.physical_cores(cpu_topology.available_cpus())
+            ),
+        },
+        "detector": "fake" if args.fake else f"{args.backend}:{args.model}",
+        "sample_images": len(images),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "candidates": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps({k: v for k, v in report.items() if k != "candidates"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""ACCOUNTLIST search index vs sending the whole list to the page.
+
+Builds a synthetic ACCOUNTLIST shaped like the real column A
+('53 / NRT - 6106200200202402 - Biaya Pemeliharaan ...'), indexes it with
+AccountIndex and reports the build time, the time to apply an edit of
+--changed names incrementally (vs a full rebuild), lookup latency per query
+kind (p50/p99 in microseconds), and the JSON bytes of one result page vs
+the full list /fetch_account_skkos returns. "scan" is a linear
+case-insensitive substring scan over all names, for reference. Usage:
+
+    python benchmarks/bench_account_search.py
+    python benchmarks/bench_account_search.py --names 20000 --changed 50
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from account_index import AccountIndex  # noqa: E402
+
+UNITS = ["NRT", "UPT", "ULTG", "UP3", "UIW", "PUSAT", "GI", "APD"]
+WORDS = [
+    "Biaya", "Pemeliharaan", "Gardu", "Induk", "Jaringan", "Distribusi",
+    "Operasional", "Kendaraan", "Perjalanan", "Dinas", "Konsumsi", "Rapat",
+    "Alat", "Kerja", "Listrik", "Material", "Kantor", "Pelatihan", "Sewa",
+    "Gedung", "Jasa", "Konsultan", "Keamanan", "Kebersihan", "Telekomunikasi",
+]
+
+
+def make_names(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    names = []
+    for i in range(count):
+        code = "61" + "".join(rng.choice("0123456789") for _ in range(14))
+        words = " ".join(rng.sample(WORDS, rng.randint(2, 5)))
+        names.append(f"{i % 97 + 1} / {rng.choice(UNITS)} - {code} - {words}")
+    return names
+
+
+def queries(names: list, rng: random.Random) -> dict:
+    sample = rng.choice(names)
+    code = sample.split(" - ")[1]
+    return {
+        "empty": "",
+        "one_char": "b",
+        "word_prefix": "pemel",
+        "two_words": "biaya gard",
+        "unit_and_word": "nrt dinas",
+        "code_prefix": code[:8],
+        "code_middle": code[6:13],
+        "typo": "pemeliharan gardu",
+        "full_name": sample,
+        "no_match": "zzzzqqq",
+    }
+
+
+def percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=5000)
+    parser.add_argument("--changed", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    names = make_names(args.names)
+    index = AccountIndex()
+    start = time.perf_counter()
+    index.update(names)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # An edit: some names renamed, some removed, some appended
+    edited = list(names)
+    for i in rng.sample(range(len(edited)), args.changed):
+        edited[i] = edited[i] + " (revisi)"
+    edited += make_names(args.changed, seed=2)
+    start = time.perf_counter()
+    changes = index.update(edited)
+    incremental_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    AccountIndex().update(edited)
+    rebuild_ms = (time.perf_counter() - start) * 1000
+
+    report = {
+        "names": len(edited),
+        "build_ms": round(build_ms, 1),
+        "incremental_update": {**changes, "ms": round(incremental_ms, 2)},
+        "full_rebuild_ms": round(rebuild_ms, 1),
+        "full_list_json_bytes": len(json.dumps(edited)),
+        "queries": {},
+    }
+    lowered = [name.lower() for name in edited]
+    for kind, query in queries(edited, rng).items():
+        samples = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            results, has_more = index.search(query, args.limit)
+            samples.append((time.perf_counter() - start) * 1e6)
+        start = time.perf_counter()
+        scanned = [n for n in lowered if query.lower() in n][: args.limit]
+        scan_us = (time.perf_counter() - start) * 1e6
+        report["queries"][kind] = {
+            "query": query,
+            "results": len(results),
+            "has_more": has_more,
+            "p50_us": round(percentile(samples, 0.5), 1),
+            "p99_us": round(percentile(samples, 0.99), 1),
+            "scan_us": round(scan_us, 1),
+            "scan_results": len(scanned),
+            "page_json_bytes": len(json.dumps(results)),
+            "first": results[0] if results else None,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Page-load reference data: the two fetch endpoints vs /bootstrap.
+
+"legacy" is what index.html used to send on every load: /fetch_id_rencana
+and /fetch_account_skkos, uncompressed and without validators. "bootstrap"
+is one /bootstrap request with gzip (or brotli when installed), first
+without and then with the ETag of the previous response, which is what a
+browser revalidating its cached copy sends. Sheets are fakes (no network);
+reported are response bytes and median server time per page load. Usage:
+
+    python benchmarks/bench_bootstrap.py
+    python benchmarks/bench_bootstrap.py --rencana 20000 --accounts 5000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from statistics import median
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import FakeSheetsPool  # noqa: E402
+from bench_account_search import make_names  # noqa: E402
+from bench_rencana_cache import FakeRencanaSheet  # noqa: E402
+
+
+def page_load(client, paths: list, headers: dict) -> tuple:
+    """(bytes, ms, last response) of fetching `paths` one after another."""
+    start = time.perf_counter()
+    total = 0
+    for path in paths:
+        response = client.get(path, headers=headers)
+        total += len(response.data)
+    return total, (time.perf_counter() - start) * 1000, response
+
+
+def measure(client, paths: list, headers: dict, loads: int) -> dict:
+    samples = [page_load(client, paths, headers) for _ in range(loads)]
+    response = samples[-1][2]
+    return {
+        "status": response.status_code,
+        "encoding": response.headers.get("Content-Encoding", "identity"),
+        "bytes": samples[-1][0],
+        "ms": round(median(ms for _, ms, _ in samples), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rencana", type=int, default=5000)
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--loads", type=int, default=50)
+    parser.add_argument(
+        "--include",
+        default="id_rencana,account_skkos",
+        help="Sections of /bootstrap, e.g. id_rencana,rencana_details",
+    )
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_bootstrap_")
+    os.chdir(workdir)
+    os.environ.update(
+        {
+            "MODEL_PRELOAD": "off",
+            "RECEIPT_BLOB_MEMORY_DIR": "",
+            "UPLOAD_STATE_URL": f"sqlite:///{workdir}/upload_state.sqlite3",
+        }
+    )
+    import app as app_module  # noqa: E402
+
+    accounts = [{"Account SKKO": name} for name in make_names(args.accounts)]
+    app_module.sheets_pool = FakeSheetsPool(
+        {
+            "RENCANA": FakeRencanaSheet(args.rencana).records,
+            "ACCOUNTLIST": accounts,
+        }
+    )
+    client = app_module.app.test_client()
+    accept = {"Accept-Encoding": "br, gzip"}
+    bootstrap_path = f"/bootstrap?include={args.include}"
+
+    legacy_paths = ["/fetch_id_rencana", "/fetch_account_skkos"]
+    client.get(bootstrap_path)  # Load both sheets once, like a warm worker
+    first = client.get(bootstrap_path, headers=accept)
+    revalidate = dict(accept, **{"If-None-Match": first.headers["ETag"]})
+
+    report = {
+        "rencana": args.rencana,
+        "accounts": args.accounts,
+        "legacy": measure(client, legacy_paths, accept, args.loads),
+        "bootstrap_first_load": measure(client, [bootstrap_path], accept, args.loads),
+        "bootstrap_revalidate": measure(
+            client, [bootstrap_path], revalidate, args.loads
+        ),
+        "bootstrap_uncompressed_bytes": len(client.get(bootstrap_path).data),
+        "cache": app_module.bootstrap_cache.get_stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
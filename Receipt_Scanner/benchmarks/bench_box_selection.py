@@ -0,0 +1,92 @@
+"""Per-detection Python loop vs the vectorized select_best_boxes().
+
+"loop" is the old post-processing: one select_best_box-style Python loop per
+field, converting every element. "vectorized" picks the best box of every
+class in one NumPy pass. Both run on the same random detections and must
+agree. Usage:
+
+    python benchmarks/bench_box_selection.py
+    python benchmarks/bench_box_selection.py --detections 300 --classes 6
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from detector_backends import Detections, select_best_boxes  # noqa: E402
+
+
+def loop_select(results: list, class_names: dict) -> dict:
+    """The old per-element loop, run once per field."""
+    fields = {}
+    for target_label in class_names.values():
+        highest_conf = 0
+        best_box = None
+        for detections in results:
+            for box, score, class_id in zip(
+                detections.boxes, detections.scores, detections.class_ids
+            ):
+                label = class_names.get(int(class_id), None)
+                if label == target_label and score > highest_conf:
+                    highest_conf = score
+                    best_box = box
+        if best_box is not None:
+            fields[target_label] = (best_box, float(highest_conf))
+    return fields
+
+
+def random_detections(count: int, classes: int, rng) -> Detections:
+    return Detections(
+        (rng.random((count, 4)) * 640).astype(np.float32),
+        rng.random(count).astype(np.float32),
+        rng.integers(0, classes, count).astype(np.int64),
+    )
+
+
+def measure(fn, results, class_names, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(results, class_names)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--detections", type=int, default=100)
+    parser.add_argument("--classes", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    class_names = {i: f"field_{i}" for i in range(args.classes)}
+    results = [random_detections(args.detections, args.classes, rng)]
+
+    expected = loop_select(results, class_names)
+    actual = select_best_boxes(results, class_names)
+    assert expected.keys() == actual.keys()
+    for label, (box, confidence) in expected.items():
+        assert np.array_equal(box, actual[label].box)
+        assert abs(confidence - actual[label].confidence) < 1e-6
+
+    report = {
+        "detections": args.detections,
+        "classes": args.classes,
+        "loop_us": measure(loop_select, results, class_names, args.iterations),
+        "vectorized_us": measure(
+            select_best_boxes, results, class_names, args.iterations
+        ),
+    }
+    report["speedup"] = report["loop_us"] / report["vectorized_us"]
+    for key in ("loop_us", "vectorized_us", "speedup"):
+        report[key] = round(report[key], 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Bytes sent over a lossy link: one-shot /upload_file vs resumable chunks.
+
+A phone-sized receipt photo (--width x --height) is encoded as the camera
+would deliver it and as the page sends it after downscaling to
+--max-side (OpenCV stands in for the browser canvas). Each upload then
+runs through the Flask app with connections dropping after a random share
+of the bytes, with probability --drop-rate per MB sent:
+
+  one_shot  the original single POST, which restarts from zero on a drop
+  chunked   /uploads with --chunk-kb chunks, which loses only the chunk
+            in flight and resumes at the server's offset
+
+Reported per variant: median bytes sent, simulated transfer time at
+--mbps and server time per request, over --trials uploads. Detection and
+OCR are faked. Usage:
+
+    python benchmarks/bench_chunked_upload.py
+    python benchmarks/bench_chunked_upload.py --drop-rate 0.5 --mbps 1
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+from statistics import median
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import FakeDetector, FakeVisionClient  # noqa: E402
+
+
+def receipt_photo(width: int, height: int) -> np.ndarray:
+    """A noisy receipt-like photo; noise keeps the JPEG size realistic."""
+    rng = np.random.default_rng(0)
+    image = rng.normal(200, 25, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    for row in range(200, height - 200, max(height // 40, 1)):
+        cv2.putText(image, "ITEM 12.500", (width // 8, row), 0, width / 800, 0, 3)
+    return image
+
+
+def downscale(image: np.ndarray, max_side: int, quality: int) -> np.ndarray:
+    height, width = image.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    resized = cv2.resize(
+        image, (round(width * scale), round(height * scale)), cv2.INTER_AREA
+    )
+    return cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, quality])[1]
+
+
+class LossyLink:
+    """Decides how many bytes of a request get through before a drop."""
+
+    def __init__(self, drop_rate: float, rng: random.Random):
+        self.drop_rate = drop_rate
+        self.rng = rng
+        self.sent = 0
+
+    def send(self, size: int) -> bool:
+        """Account for one request body; False when it was cut off."""
+        probability = 1 - (1 - min(self.drop_rate, 0.99)) ** (size / 2**20)
+        if self.rng.random() < probability:
+            self.sent += int(size * self.rng.random())
+            return False
+        self.sent += size
+        return True
+
+
+def one_shot(client, data: bytes, link: LossyLink, timings: list):
+    while not link.send(len(data)):
+        pass
+    start = time.perf_counter()
+    response = client.post(
+        "/upload_file",
+        data={"file": (io.BytesIO(data), "receipt.jpg", "image/jpeg")},
+        content_type="multipart/form-data",
+    )
+    timings.append(time.perf_counter() - start)
+    assert response.status_code == 200, response.get_json()
+
+
+def chunked(client, data: bytes, link: LossyLink, timings: list):
+    upload = client.post(
+        "/uploads",
+        json={
+            "filename": "receipt.jpg",
+            "content_type": "image/jpeg",
+            "size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        },
+    ).get_json()
+    offset = 0
+    while offset < len(data):
+        chunk = data[offset : offset + upload["chunk_size"]]
+        if not link.send(len(chunk)):
+            # Dropped: the server never saw it; ask where to resume
+            offset = client.get(upload["upload_url"]).get_json()["offset"]
+            continue
+        start = time.perf_counter()
+        response = client.put(f"{upload['upload_url']}?offset={offset}", data=chunk)
+        timings.append(time.perf_counter() - start)
+        offset = response.get_json()["offset"]
+    start = time.perf_counter()
+    response = client.post(upload["finalize_url"])
+    timings.append(time.perf_counter() - start)
+    assert response.status_code == 200, response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--max-side", type=int, default=2048)
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--chunk-kb", type=int, default=512)
+    parser.add_argument("--drop-rate", type=float, default=0.3)
+    parser.add_argument("--mbps", type=float, default=2.0)
+    parser.add_argument("--trials", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_chunked_")
+    os.chdir(workdir)
+    os.environ.update(
+        {
+            "MODEL_PRELOAD": "off",
+            "RECEIPT_BLOB_MEMORY_DIR": "",
+            "UPLOAD_STATE_URL": f"sqlite:///{workdir}/upload_state.sqlite3",
+            "UPLOAD_CHUNK_KB": str(args.chunk_kb),
+        }
+    )
+    import app as app_module  # noqa: E402
+    import inference_pipeline  # noqa: E402
+
+    inference_pipeline.ocr_client._client = FakeVisionClient()
+    inference_pipeline.model_registry.loader = lambda path: FakeDetector()
+    open("fake-model.pt", "w").close()
+    inference_pipeline.model_registry.load(os.path.join(workdir, "fake-model.pt"))
+    client = app_module.app.test_client()
+
+    photo = receipt_photo(args.width, args.height)
+    files = {
+        "original": cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, 95])[1],
+        "downscaled": downscale(photo, args.max_side, args.quality),
+    }
+    report = {"drop_rate_per_mb": args.drop_rate, "mbps": args.mbps, "runs": {}}
+    for name, encoded in files.items():
+        data = encoded.tobytes()
+        for variant, upload in (("one_shot", one_shot), ("chunked", chunked)):
+            sent, timings = [], []
+            for trial in range(args.trials):
+                link = LossyLink(args.drop_rate, random.Random(trial))
+                upload(client, data, link, timings)
+                sent.append(link.sent)
+            report["runs"][f"{name}/{variant}"] = {
+                "file_bytes": len(data),
+                "median_bytes_sent": int(median(sent)),
+                "max_bytes_sent": max(sent),
+                "median_transfer_s": round(median(sent) * 8 / args.mbps / 1e6, 2),
+                "server_ms_per_request": round(median(timings) * 1000, 2),
+            }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
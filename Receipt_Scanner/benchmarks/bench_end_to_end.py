@@ -0,0 +1,305 @@
+"""Offline end-to-end benchmark of /upload_file and /submit.
+
+Every external dependency is replaced by a fake with configurable latency
+and failure rate: Google Sheets (FakeSheetsPool), Google Vision
+(FakeVisionClient), the YOLO model (FakeDetector) and the Receipt and
+Evidence APIs (local StubUploadServers). For each --concurrency level,
+--requests uploads are driven through the Flask app with that many in
+flight, then each successful upload is submitted with --evidence evidence
+files. Reported per phase: p50/p95/p99 latency, requests per second,
+status codes and peak RSS growth; per stage: mean time from the app's
+stage histogram. Results are written as JSON, and --compare prints the
+change against an earlier run. Usage:
+
+    python benchmarks/bench_end_to_end.py --concurrency 1,4,8 --requests 40
+    python benchmarks/bench_end_to_end.py --vision-latency 0.3 \\
+        --api-failure-rate 0.05 --compare bench_end_to_end-old.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import psutil
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import (  # noqa: E402
+    FakeDetector,
+    FakeSheetsPool,
+    FakeVisionClient,
+    StubUploadServer,
+)
+
+
+class PeakSampler(threading.Thread):
+    """Polls this process's RSS every few milliseconds and keeps the maximum."""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def receipt_images(count: int, width: int, height: int) -> list:
+    """Distinct synthetic receipts, so the result cache never hits."""
+    font, scale, black = cv2.FONT_HERSHEY_SIMPLEX, width / 800, (0, 0, 0)
+    images = []
+    for i in range(count):
+        image = np.full((height, width, 3), 255, np.uint8)
+        for line in range(12):
+            origin = (width // 10, int(height * (0.1 + line * 0.05)))
+            cv2.putText(image, f"ITEM {line} {i}", origin, font, scale, black, 2)
+        origin = (int(width * 0.56), int(height * 0.74))
+        cv2.putText(image, f"TOTAL {50000 + i}", origin, font, scale * 1.3, black, 3)
+        images.append(cv2.imencode(".jpg", image)[1].tobytes())
+    return images
+
+
+def run_phase(app_module, concurrency: int, requests: list) -> tuple:
+    """Run `requests` (callables taking a test client) `concurrency` at a time.
+
+    Returns the phase report and the responses, in request order.
+    """
+    local = threading.local()
+
+    def one(send):
+        if not hasattr(local, "client"):
+            local.client = app_module.app.test_client()
+        start = time.perf_counter()
+        response = send(local.client)
+        return time.perf_counter() - start, response
+
+    baseline = psutil.Process().memory_info().rss
+    sampler = PeakSampler()
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(one, requests))
+    elapsed = time.perf_counter() - start
+    peak = sampler.stop()
+
+    latencies = [seconds * 1000 for seconds, _ in outcomes]
+    statuses = {}
+    for _, response in outcomes:
+        status = str(response.status_code)
+        statuses[status] = statuses.get(status, 0) + 1
+    report = {
+        "requests": len(requests),
+        "statuses": statuses,
+        "rps": round(len(requests) / elapsed, 2) if elapsed else None,
+        "peak_rss_growth_mb": round(max(0, peak - baseline) / 2**20, 1),
+    }
+    if latencies:
+        for pct in (50, 95, 99):
+            report[f"p{pct}_ms"] = round(percentile(latencies, pct), 1)
+    return report, [response for _, response in outcomes]
+
+
+def stage_means(app_module, before: dict) -> dict:
+    """Mean ms per stage recorded since the `before` snapshot."""
+    means = {}
+    for (stage,), (count, total) in app_module.stage_seconds.snapshot().items():
+        old_count, old_total = before.get((stage,), (0, 0.0))
+        if count > old_count:
+            means[stage] = round((total - old_total) / (count - old_count) * 1000, 2)
+    return means
+
+
+def upload_request(image: bytes, index: int):
+    def send(client):
+        data = {"file": (io.BytesIO(image), f"receipt-{index}.jpg", "image/jpeg")}
+        return client.post(
+            "/upload_file", data=data, content_type="multipart/form-data"
+        )
+
+    return send
+
+
+def submit_request(token: str, evidence: list):
+    def send(client):
+        data = {
+            "account_skkos_id": "1",
+            "rencana_id": "00001",
+            "amount": "50000",
+            "uraian": "bench",
+            "judulLaporan": "bench",
+            "upload_token": token,
+            "evidence_files": [
+                (io.BytesIO(content), f"evidence-{i}.jpg", "image/jpeg")
+                for i, content in enumerate(evidence)
+            ],
+        }
+        return client.post("/submit", data=data, content_type="multipart/form-data")
+
+    return send
+
+
+def print_comparison(current: dict, previous_path: str):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    old_levels = {level["concurrency"]: level for level in previous["levels"]}
+    for level in current["levels"]:
+        old = old_levels.get(level["concurrency"])
+        if old is None:
+            continue
+        for phase in ("upload", "submit"):
+            for key in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+                new_value = level[phase].get(key)
+                old_value = old[phase].get(key)
+                if not new_value or not old_value:
+                    continue
+                change = (new_value - old_value) / old_value * 100
+                print(
+                    f"c={level['concurrency']:<3} {phase:<6} {key:<6} "
+                    f"{old_value:>9} -> {new_value:>9} ({change:+.1f}%)"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,4,8")
+    parser.add_argument("--requests", type=int, default=24)
+    parser.add_argument("--image-size", default="1500x2000", help="WIDTHxHEIGHT")
+    parser.add_argument("--evidence", type=int, default=1)
+    parser.add_argument("--detect-latency", type=float, default=0.05)
+    parser.add_argument("--detect-per-image", type=float, default=0.015)
+    parser.add_argument("--vision-latency", type=float, default=0.15)
+    parser.add_argument("--vision-failure-rate", type=float, default=0.0)
+    parser.add_argument("--receipt-latency", type=float, default=0.3)
+    parser.add_argument("--evidence-latency", type=float, default=0.4)
+    parser.add_argument("--api-failure-rate", type=float, default=0.0)
+    parser.add_argument("--sheets-latency", type=float, default=0.2)
+    parser.add_argument("--sheets-failure-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="JSON file (default: timestamped)")
+    parser.add_argument("--compare", help="Earlier JSON result to compare with")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    width, height = (int(value) for value in args.image_size.split("x"))
+    output = os.path.abspath(
+        args.output or f"bench_end_to_end-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    compare = os.path.abspath(args.compare) if args.compare else None
+
+    receipt_api = StubUploadServer(
+        latency=args.receipt_latency, failure_rate=args.api_failure_rate
+    )
+    evidence_api = StubUploadServer(
+        latency=args.evidence_latency, failure_rate=args.api_failure_rate, seed=1
+    )
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    os.chdir(workdir)
+    os.environ.update(
+        {
+            "RECEIPT_API_ENDPOINT": receipt_api.url,
+            "EVIDENCE_API_ENDPOINT": evidence_api.url,
+            "MODEL_PRELOAD": "off",
+            "UPLOAD_RETRY_BACKOFF": "0.05",
+            "RECEIPT_BLOB_MEMORY_DIR": "",
+            "UPLOAD_STATE_URL": f"sqlite:///{workdir}/upload_state.sqlite3",
+        }
+    )
+    import app as app_module  # noqa: E402
+    import inference_pipeline  # noqa: E402
+
+    sheets = FakeSheetsPool(
+        latency=args.sheets_latency, failure_rate=args.sheets_failure_rate
+    )
+    vision = FakeVisionClient(
+        latency=args.vision_latency, failure_rate=args.vision_failure_rate
+    )
+    detector = FakeDetector(
+        latency=args.detect_latency, per_item_latency=args.detect_per_image
+    )
+    app_module.sheets_pool = sheets
+    inference_pipeline.ocr_client._client = vision
+    inference_pipeline.model_registry.loader = lambda path: detector
+    open("fake-model.pt", "w").close()
+    inference_pipeline.model_registry.load(os.path.join(workdir, "fake-model.pt"))
+
+    print(f"Rendering {args.requests * len(levels)} receipts ...")
+    images = receipt_images(args.requests * len(levels), width, height)
+    evidence = images[: args.evidence]
+
+    report = {
+        "config": vars(args),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "levels": [],
+    }
+    for level_index, concurrency in enumerate(levels):
+        batch = images[level_index * args.requests : (level_index + 1) * args.requests]
+        before = app_module.stage_seconds.snapshot()
+        upload, responses = run_phase(
+            app_module,
+            concurrency,
+            [upload_request(image, i) for i, image in enumerate(batch)],
+        )
+        tokens = [
+            response.get_json()["upload_token"]
+            for response in responses
+            if response.status_code == 200
+        ]
+        submit, _ = run_phase(
+            app_module, concurrency, [submit_request(t, evidence) for t in tokens]
+        )
+        level = {
+            "concurrency": concurrency,
+            "upload": upload,
+            "submit": submit,
+            "stages_ms": stage_means(app_module, before),
+        }
+        report["levels"].append(level)
+        print(json.dumps(level))
+
+    # Submitted rows reach the (fake) sheet through the append journal
+    deadline = time.monotonic() + 30
+    while app_module.append_queue.depth() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    report["append_queue"] = app_module.append_queue.get_stats()
+    report["fakes"] = {
+        "vision": {"calls": vision.calls, "images": vision.items},
+        "detector": {"calls": detector.calls, "images": detector.items},
+        "receipt_api": {"calls": receipt_api.calls},
+        "evidence_api": {"calls": evidence_api.calls},
+        "sheets": sheets.get_stats(),
+    }
+    receipt_api.stop()
+    evidence_api.stop()
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if compare:
+        print_comparison(report, compare)
+
+
+if __name__ == "__main__":
+    main()
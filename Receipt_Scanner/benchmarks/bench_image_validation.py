@@ -0,0 +1,144 @@
+"""Header-only validation vs the old imghdr check followed by a full decode.
+
+"full_decode" is what /upload_file did before: imghdr.what() on the first
+512 bytes, then cv2.imdecode of the whole frame. "headers" is
+validate_image(), which reads only the container headers and rejects by
+pixel count. Both run on a phone-sized JPEG, a PNG and a 1-bit PNG bomb;
+the bomb is decoded in a child process so its peak RSS can be reported
+without bloating this one. Usage:
+
+    python benchmarks/bench_image_validation.py
+    python benchmarks/bench_image_validation.py --bomb-side 20000 --iterations 50
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import argparse
+import warnings
+import subprocess
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from image_headers import validate_image  # noqa: E402
+from inference_errors import InvalidImageError  # noqa: E402
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import imghdr  # Removed in Python 3.13
+    except ImportError:
+        imghdr = None
+
+# Run in the child: decode stdin fully and report the peak RSS
+DECODE_CHILD = """
+import sys, time, resource
+import cv2, numpy as np
+data = sys.stdin.buffer.read()
+start = time.perf_counter()
+image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+elapsed = time.perf_counter() - start
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed * 1000, peak_kb / 1024, image is not None)
+"""
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(kind + data)
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+
+def png_bomb(side: int) -> bytes:
+    """A valid all-black 1-bit PNG: tiny on disk, side*side*3 bytes decoded."""
+    row = b"\x00" * (1 + (side + 7) // 8)
+    compressor = zlib.compressobj(9)
+    idat = b"".join(compressor.compress(row) for _ in range(side))
+    idat += compressor.flush()
+    header = struct.pack(">IIBBBBB", side, side, 1, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + png_chunk(b"IHDR", header)
+        + png_chunk(b"IDAT", idat)
+        + png_chunk(b"IEND", b"")
+    )
+
+
+def encode(ext: str, width: int, height: int) -> bytes:
+    image = np.full((height, width, 3), 255, np.uint8)
+    cv2.putText(image, "TOTAL", (5, height // 2), 0, 0.5, (0, 0, 0), 1)
+    return cv2.imencode(ext, image)[1].tobytes()
+
+
+def full_decode(data: bytes):
+    if imghdr is not None and not imghdr.what(None, data[:512]):
+        return None
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def headers(data: bytes, max_pixels: int):
+    try:
+        return validate_image(data, max_pixels)
+    except InvalidImageError:
+        return None
+
+
+def measure(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def decode_in_child(data: bytes) -> dict:
+    process = subprocess.run(
+        [sys.executable, "-c", DECODE_CHILD], input=data, capture_output=True
+    )
+    if process.returncode != 0:
+        return {"error": process.stderr.decode()[-300:] or process.returncode}
+    elapsed_ms, peak_mb, decoded = process.stdout.split()
+    return {
+        "decode_ms": round(float(elapsed_ms), 1),
+        "peak_rss_mb": round(float(peak_mb), 1),
+        "decoded": decoded == b"True",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-megapixels", type=float, default=64)
+    parser.add_argument("--bomb-side", type=int, default=16000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    max_pixels = int(args.max_megapixels * 1_000_000)
+
+    samples = {
+        "jpeg_4000x3000": encode(".jpg", 4000, 3000),
+        "png_1500x2000": encode(".png", 1500, 2000),
+        f"png_bomb_{args.bomb_side}": png_bomb(args.bomb_side),
+    }
+    report = {"imghdr": imghdr is not None, "samples": {}}
+    for name, data in samples.items():
+        entry = {"bytes": len(data)}
+        entry["headers_us"] = round(
+            measure(lambda: headers(data, max_pixels), args.iterations * 100), 2
+        )
+        entry["accepted"] = headers(data, max_pixels) is not None
+        if name.startswith("png_bomb"):
+            entry["full_decode"] = decode_in_child(data)
+        else:
+            entry["full_decode_us"] = round(
+                measure(lambda: full_decode(data), args.iterations), 1
+            )
+            entry["speedup"] = round(entry["full_decode_us"] / entry["headers_us"])
+        report["samples"][name] = entry
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
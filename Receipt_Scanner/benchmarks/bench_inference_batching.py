@@ -0,0 +1,117 @@
+"""Throughput/latency of micro-batched YOLO inference across batch sizes.
+
+Fires `--requests` concurrent single-image requests through InferenceBatcher
+for each max batch size and reports images/s and p50/p95 latency. Uses the
+real model from YOLO_MODEL_PATH (CPU), or a synthetic model with a fixed
+per-call overhead when --fake is given. Usage:
+
+    python benchmarks/bench_inference_batching.py --model models/best.pt
+    python benchmarks/bench_inference_batching.py --fake
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from inference_batcher import InferenceBatcher  # noqa: E402
+
+
+class FakeModel:
+    """Mimics a batched model call: fixed overhead plus a per-image cost."""
+
+    def __init__(self, call_overhead: float = 0.040, per_image: float = 0.015):
+        self.call_overhead = call_overhead
+        self.per_image = per_image
+
+    def __call__(self, images):
+        images = images if isinstance(images, list) else [images]
+        time.sleep(self.call_overhead + self.per_image * len(images))
+        return [None] * len(images)
+
+
+def load_images(image_dir: str, count: int) -> list:
+    paths = []
+    if image_dir:
+        for pattern in ("*.jpg", "*.jpeg", "*.png"):
+            paths.extend(glob.glob(os.path.join(image_dir, pattern)))
+    if paths:
+        import cv2
+
+        images = [cv2.cvtColor(cv2.imread(p), cv2.COLOR_BGR2RGB) for p in paths]
+    else:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (1280, 960, 3), dtype=np.uint8)]
+    return [images[i % len(images)] for i in range(count)]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(model, images: list, batch_size: int, max_wait_ms: float) -> dict:
+    batcher = InferenceBatcher(
+        lambda batch: list(model(batch)),
+        max_batch_size=batch_size,
+        max_wait_ms=max_wait_ms,
+    )
+    batcher.predict(images[0])  # Start the scheduler thread outside timing
+
+    def one(image):
+        start = time.perf_counter()
+        batcher.predict(image)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(images)) as pool:
+        latencies = list(pool.map(one, images))
+    elapsed = time.perf_counter() - start
+
+    stats = batcher.get_stats()
+    return {
+        "batch_size": batch_size,
+        "throughput": len(images) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "avg_batch": stats.get("avg_batch", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=os.getenv("YOLO_MODEL_PATH"))
+    parser.add_argument("--images", help="Directory of sample receipt images.")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16")
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--fake", action="store_true", help="Use a synthetic model.")
+    args = parser.parse_args()
+
+    if args.fake:
+        model = FakeModel()
+    else:
+        from ultralytics import YOLO
+
+        model = YOLO(args.model)
+
+    images = load_images(args.images, args.requests)
+    print(f"{'batch':>5} {'img/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'avg batch':>10}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        row = run(model, images, batch_size, args.max_wait_ms)
+        print(
+            f"{row['batch_size']:>5} {row['throughput']:>8.2f} "
+            f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['avg_batch']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Offline OCR client benchmark: crop encoding and Vision request batching.
+
+Sends `--requests` concurrent crops through VisionOCRClient backed by
+FakeVisionClient (fixed per-request latency plus per-image latency) and
+compares one-call-per-crop (from every request thread) with batched
+batch_annotate_images calls, `--max-in-flight` at a time. Also reports
+crop encode time and size per format. Usage:
+
+    python benchmarks/bench_ocr_batching.py --latency 0.3 --requests 32
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import FakeVisionClient  # noqa: E402
+from ocr_client import VisionOCRClient  # noqa: E402
+
+
+def sample_crop():
+    crop = np.full((300, 1200, 3), 255, dtype=np.uint8)
+    cv2.putText(crop, "TOTAL 1.250.000", (20, 200), cv2.FONT_HERSHEY_SIMPLEX, 4, 0, 8)
+    return crop
+
+
+def bench_encoding(crop, repeat: int = 50):
+    print(f"{'encoding':>12} {'ms':>8} {'KB':>8}")
+    for label, kwargs in (
+        ("png level 3", {"image_format": "png", "png_compression": 3}),
+        ("png level 1", {"image_format": "png", "png_compression": 1}),
+        ("jpeg q95", {"image_format": "jpeg", "jpeg_quality": 95}),
+        ("jpeg q85", {"image_format": "jpeg", "jpeg_quality": 85}),
+    ):
+        client = VisionOCRClient(client_factory=FakeVisionClient, **kwargs)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            content = client.encode(crop)
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"{label:>12} {elapsed * 1000:>8.2f} {len(content) / 1024:>8.1f}")
+
+
+def bench_batching(crop, args, max_batch: int) -> dict:
+    fake = FakeVisionClient(latency=args.latency, per_item_latency=args.per_image)
+    client = VisionOCRClient(
+        max_batch=max_batch,
+        max_wait_ms=args.max_wait_ms,
+        max_in_flight=args.max_in_flight,
+        client_factory=lambda: fake,
+    )
+
+    def one(_):
+        start = time.perf_counter()
+        client.text(crop)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.requests) as pool:
+        latencies = sorted(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "max_batch": max_batch,
+        "vision_calls": fake.calls,
+        "throughput": args.requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--per-image", type=float, default=0.01)
+    parser.add_argument("--max-wait-ms", type=float, default=0)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    args = parser.parse_args()
+
+    crop = sample_crop()
+    bench_encoding(crop)
+    print()
+    print(f"{'max batch':>9} {'calls':>6} {'crops/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for max_batch in (1, 4, 16):
+        row = bench_batching(crop, args, max_batch)
+        print(
+            f"{row['max_batch']:>9} {row['vision_calls']:>6} {row['throughput']:>8.1f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
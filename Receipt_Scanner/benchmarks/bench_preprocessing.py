@@ -0,0 +1,187 @@
+"""Peak RSS and latency of the upload preprocessing path, before and after.
+
+"legacy" is the old flow: full imdecode, full-frame BGR->RGB copy, detector
+input built from the full frame, crop from the RGB copy. "reduced" decodes a
+detector-sized copy with IMREAD_REDUCED_*, detects on it and decodes the full
+frame only to crop the mapped box. Detection itself is replaced by a fixed
+box and a sleep of --detect-ms (jittered), so only preprocessing and what
+stays resident while detection runs are measured. --concurrency uploads are
+in flight at once. Each mode runs in its own process so peak RSS is not
+shared. Usage:
+
+    python benchmarks/bench_preprocessing.py --images samples/
+    python benchmarks/bench_preprocessing.py --concurrency 8 --detect-ms 300
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from image_preprocessing import decode_for_detection, crop_regions  # noqa: E402
+
+# Fake detection: the total usually sits in the lower middle of a receipt
+RELATIVE_BOX = (0.55, 0.70, 0.90, 0.76)
+
+
+def fake_box(shape):
+    height, width = shape[:2]
+    x1, y1, x2, y2 = RELATIVE_BOX
+    return np.array([x1 * width, y1 * height, x2 * width, y2 * height])
+
+
+def letterbox_input(img_rgb, size: int = 640):
+    """What the detector builds from its input: a resized, padded copy."""
+    height, width = img_rgb.shape[:2]
+    ratio = size / max(height, width)
+    resized = cv2.resize(img_rgb, (round(width * ratio), round(height * ratio)))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[: resized.shape[0], : resized.shape[1]] = resized
+    return canvas
+
+
+def simulate_detection(detect_ms: float):
+    if detect_ms:
+        time.sleep(random.uniform(0.5, 1.5) * detect_ms / 1000)
+
+
+def legacy(data: bytes, max_side: int, detect_ms: float):
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    letterbox_input(img_rgb, max_side)
+    simulate_detection(detect_ms)
+    x1, y1, x2, y2 = map(int, fake_box(img_rgb.shape))
+    return img_rgb[y1:y2, x1:x2]
+
+
+def reduced(data: bytes, max_side: int, detect_ms: float):
+    image = decode_for_detection(data, max_side)
+    img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    letterbox_input(img_rgb, max_side)
+    simulate_detection(detect_ms)
+    crop = crop_regions(data, [fake_box(image.shape)], image.shape)[0]
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+
+
+def make_synthetic(directory: str, count: int = 4, size=(4000, 3000)):
+    rng = np.random.default_rng(0)
+    width, height = size
+    paths = []
+    for i in range(count):
+        gradient = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+        image = np.broadcast_to(gradient, (height, width, 3)).copy()
+        noise = rng.integers(0, 40, (height // 8, width // 8, 3), dtype=np.uint8)
+        image += cv2.resize(noise, (width, height), interpolation=cv2.INTER_NEAREST)
+        path = os.path.join(directory, f"synthetic_{i}.jpg")
+        cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        paths.append(path)
+    return paths
+
+
+def run_mode(mode: str, paths: list, args) -> dict:
+    """Body of the child process for one mode."""
+    random.seed(0)
+    blobs = [open(p, "rb").read() for p in paths] * args.repeat
+    process = {"legacy": legacy, "reduced": reduced}[mode]
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def one(data):
+        start = time.perf_counter()
+        process(data, args.max_side, args.detect_ms)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(one, blobs))
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    latencies.sort()
+    return {
+        "mode": mode,
+        "images": len(latencies),
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "peak_rss_mb": peak_kb / 1024,
+        "peak_over_baseline_mb": (peak_kb - baseline_kb) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", help="Directory of large sample receipts.")
+    parser.add_argument("--max-side", type=int, default=640)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument(
+        "--detect-ms", type=float, default=0, help="Simulated detection time."
+    )
+    parser.add_argument("--mode", choices=["legacy", "reduced"], help=argparse.SUPPRESS)
+    parser.add_argument("--paths", help=argparse.SUPPRESS)
+    parser.add_argument("--synthesize", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.synthesize:
+        print(json.dumps(make_synthetic(args.synthesize)))
+        return
+
+    if args.mode:
+        paths = json.loads(args.paths)
+        print(json.dumps(run_mode(args.mode, paths, args)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        if args.images:
+            for pattern in ("*.jpg", "*.jpeg", "*.png"):
+                paths.extend(glob.glob(os.path.join(args.images, pattern)))
+        if not paths:
+            # Linux carries peak RSS across fork/exec, so keep this process
+            # small and build the large images in a child of their own
+            paths = json.loads(
+                subprocess.check_output([sys.executable, __file__, "--synthesize", tmp])
+            )
+
+        print(
+            f"{len(paths)} images, max side {args.max_side}, repeat {args.repeat}, "
+            f"concurrency {args.concurrency}, detect {args.detect_ms} ms"
+        )
+        header = ("mode", "mean ms", "p95 ms", "peak MB", "+base MB")
+        print(f"{header[0]:>8}" + "".join(f" {h:>9}" for h in header[1:]))
+        for mode in ("legacy", "reduced"):
+            output = subprocess.check_output(
+                [
+                    sys.executable,
+                    __file__,
+                    "--mode",
+                    mode,
+                    "--paths",
+                    json.dumps(paths),
+                    "--max-side",
+                    str(args.max_side),
+                    "--repeat",
+                    str(args.repeat),
+                    "--concurrency",
+                    str(args.concurrency),
+                    "--detect-ms",
+                    str(args.detect_ms),
+                ]
+            )
+            row = json.loads(output)
+            print(
+                f"{row['mode']:>8} {row['mean_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+                f"{row['peak_rss_mb']:>9.1f} {row['peak_over_baseline_mb']:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Compare RENCANA lookups: full-sheet linear scan vs the indexed cache.
+
+Runs entirely offline against a fake sheet. Usage:
+
+    python benchmarks/bench_rencana_cache.py --rows 50000 --lookups 200
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rencana_cache import RencanaCache  # noqa: E402
+
+
+class FakeRencanaSheet:
+    """Stands in for the RENCANA worksheet, with optional download latency."""
+
+    def __init__(self, rows: int, latency: float = 0.0):
+        self.latency = latency
+        self.records = [
+            {
+                "id rencana": i,
+                "start date A/R": "01.01.2024",
+                "end date A/R": "31.12.2024",
+                "Requestor": f"Requestor {i}",
+                "Unit": f"Unit {i % 40}",
+                "Nominal": i * 1000,
+            }
+            for i in range(1, rows + 1)
+        ]
+
+    def get_all_records(self) -> list:
+        time.sleep(self.latency)
+        # gspread builds fresh dicts on every call
+        return [dict(record) for record in self.records]
+
+
+def legacy_lookup(sheet: FakeRencanaSheet, rencana_id: str) -> dict:
+    """The pre-cache get_rencana_details_from_sheet: download, then scan."""
+    records = sheet.get_all_records()
+    for record in records:
+        id_value = record.get("id rencana", "")
+        if id_value != "":
+            try:
+                record_id = f"{int(id_value):05d}"
+            except ValueError:
+                record_id = str(id_value).strip()
+            if record_id == str(rencana_id).strip():
+                return {
+                    "start_date_ar": record.get("start date A/R", ""),
+                    "end_date_ar": record.get("end date A/R", ""),
+                    "requestor": record.get("Requestor", ""),
+                    "unit": record.get("Unit", ""),
+                    "nominal": record.get("Nominal", ""),
+                    "id_rencana": record_id,
+                }
+    raise Exception("ID Rencana not found")
+
+
+def time_lookups(lookup, ids: list) -> float:
+    start = time.perf_counter()
+    for rencana_id in ids:
+        lookup(rencana_id)
+    return (time.perf_counter() - start) / len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Simulated seconds per get_all_records() download.",
+    )
+    args = parser.parse_args()
+
+    sheet = FakeRencanaSheet(args.rows, args.latency)
+    ids = [f"{random.randint(1, args.rows):05d}" for _ in range(args.lookups)]
+
+    cache = RencanaCache(sheet.get_all_records, ttl=3600)
+    start = time.perf_counter()
+    cache.snapshot()
+    cold_load = time.perf_counter() - start
+
+    for rencana_id in ids:
+        assert cache.get(rencana_id) == legacy_lookup(sheet, rencana_id)
+
+    legacy = time_lookups(lambda i: legacy_lookup(sheet, i), ids)
+    cached = time_lookups(cache.get, ids)
+
+    print(f"rows={args.rows} lookups={args.lookups} latency={args.latency}s")
+    print(f"cache cold load:     {cold_load * 1000:10.3f} ms")
+    print(f"legacy scan/lookup:  {legacy * 1000:10.3f} ms")
+    print(f"cached lookup:       {cached * 1e6:10.3f} us")
+    print(f"speedup:             {legacy / cached:10.0f}x")
+
+
+if __name__ == "__main__":
+    main()
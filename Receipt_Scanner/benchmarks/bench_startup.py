@@ -0,0 +1,150 @@
+"""Import time and memory of each process role, measured in fresh interpreters.
+
+Roles:
+  web               app.py with INFERENCE_SOCKET set (detection and OCR run
+                    in an inference worker; no OpenCV, NumPy or detector)
+  all_in_one        app.py running inference itself, pipeline imported
+  inference_worker  inference_worker.py's imports, pipeline included
+
+Each role is started --runs times in a new Python process; reported are the
+median import time (ms), RSS after startup (MB) and which heavy modules got
+loaded. With --model the all_in_one and inference_worker roles also load
+and warm up those weights, as MODEL_PRELOAD=sync does. --importtime adds
+the slowest top-level imports of each role (python -X importtime).
+Usage:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --model models/best.pt --runs 5
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from statistics import median
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+HEAVY_MODULES = (
+    "cv2",
+    "numpy",
+    "torch",
+    "ultralytics",
+    "onnxruntime",
+    "google.cloud.vision",
+    "gspread",
+    "inference_pipeline",
+)
+
+# Run in the child; prints one JSON line
+CHILD = """
+import sys, time, json
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+import psutil
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "rss_mb": psutil.Process().memory_info().rss / 2**20,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+ROLES = {
+    "web": "import app",
+    "all_in_one": "import app\napp.inference.pipeline()\n{load}",
+    "inference_worker": "import inference_worker\nimport inference_pipeline\n{load}",
+}
+
+LOAD_MODEL = "inference_pipeline.warm_up('sync')"
+LOAD_MODEL_APP = "app.inference.pipeline().warm_up('sync')"
+
+
+def role_code(role: str, model: bool) -> str:
+    load = ""
+    if model:
+        load = LOAD_MODEL_APP if role == "all_in_one" else LOAD_MODEL
+    return ROLES[role].format(load=load)
+
+
+def run_child(code: str, env: dict, workdir: str, importtime: bool) -> tuple:
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    args += ["-c", CHILD.format(imports=code, heavy=HEAVY_MODULES)]
+    process = subprocess.run(
+        args, cwd=workdir, env=env, capture_output=True, text=True, timeout=600
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr[-2000:])
+    return json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+def slowest_imports(stderr: str, count: int = 8) -> list:
+    """Top-level packages with the largest cumulative import time (ms)."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if name.startswith("  "):
+            continue  # Imported by another module
+        imports.append((name.strip(), int(cumulative) / 1000))
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return [[name, round(ms, 1)] for name, ms in imports[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--roles", default=",".join(ROLES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--model", help="YOLO weights to load in inference roles")
+    parser.add_argument("--importtime", action="store_true")
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(
+        os.environ,
+        PYTHONPATH=APP_DIR,
+        MODEL_PRELOAD="off",
+        RECEIPT_BLOB_MEMORY_DIR="",
+        UPLOAD_STATE_URL=f"sqlite:///{workdir}/upload_state.sqlite3",
+        INFERENCE_HANDOFF_DIR=os.path.join(workdir, "handoff"),
+    )
+    if args.model:
+        env["YOLO_MODEL_PATH"] = os.path.abspath(args.model)
+
+    report = {}
+    for role in args.roles.split(","):
+        role_env = dict(env)
+        role_env.pop("INFERENCE_SOCKET", None)
+        if role == "web":
+            # Nothing listens there; the web tier only logs that at startup
+            role_env["INFERENCE_SOCKET"] = os.path.join(workdir, "inference.sock")
+        code = role_code(role, bool(args.model))
+
+        # Warm the bytecode and page cache so runs compare like for like
+        run_child(code, role_env, workdir, False)
+        samples = [
+            run_child(code, role_env, workdir, False)[0] for _ in range(args.runs)
+        ]
+        report[role] = {
+            "import_ms": round(median(s["import_ms"] for s in samples), 1),
+            "rss_mb": round(median(s["rss_mb"] for s in samples), 1),
+            "loaded": samples[0]["loaded"],
+        }
+        if args.importtime:
+            _, stderr = run_child(code, role_env, workdir, True)
+            report[role]["slowest_imports"] = slowest_imports(stderr)
+        print(json.dumps({role: report[role]}))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""End-to-end /submit latency against local stub upload servers.
+
+Starts stub Receipt and Evidence APIs with injected latency, points the app
+at them and posts `--requests` submissions (one receipt plus `--evidence`
+evidence files each) through the Flask test client. With concurrent
+uploads the submit latency should track max(receipt, evidence) latency
+rather than their sum; connections opened show keep-alive reuse.
+Google Sheets is not touched. Usage:
+
+    python benchmarks/bench_submit_uploads.py --receipt-latency 0.5 \\
+        --evidence-latency 0.8 --fail-first 1
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import StubUploadServer  # noqa: E402
+
+
+def png_bytes(size: int) -> bytes:
+    """A PNG signature followed by padding; enough for the imghdr check."""
+    header = b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\x0dIHDR" + b"\x00" * 13
+    return header + b"\x00" * max(0, size - len(header))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--receipt-latency", type=float, default=0.5)
+    parser.add_argument("--evidence-latency", type=float, default=0.8)
+    parser.add_argument("--evidence", type=int, default=2)
+    parser.add_argument("--file-kb", type=int, default=512)
+    parser.add_argument("--fail-first", type=int, default=0)
+    args = parser.parse_args()
+
+    receipt_api = StubUploadServer(
+        latency=args.receipt_latency, fail_first=args.fail_first
+    )
+    evidence_api = StubUploadServer(latency=args.evidence_latency)
+
+    workdir = tempfile.mkdtemp(prefix="bench_submit_")
+    os.chdir(workdir)
+    os.environ.update(
+        {
+            "RECEIPT_API_ENDPOINT": receipt_api.url,
+            "EVIDENCE_API_ENDPOINT": evidence_api.url,
+            "MODEL_PRELOAD": "off",
+            "UPLOAD_RETRY_BACKOFF": "0.1",
+        }
+    )
+    import app as app_module  # noqa: E402
+
+    app_module.append_to_sheet = lambda *args, **kwargs: None
+    client = app_module.app.test_client()
+    payload = png_bytes(args.file_kb * 1024)
+
+    latencies = []
+    for i in range(args.requests):
+        token = app_module.upload_states.create(
+            {
+                "blob_id": app_module.receipt_store.put(payload, ".png"),
+                "filename": "receipt.png",
+                "content_type": "image/png",
+                "extracted_text": "Rp 50.000",
+            }
+        )
+
+        data = {
+            "account_skkos_id": "1",
+            "rencana_id": "00001",
+            "amount": "50000",
+            "upload_token": token,
+            "evidence_files": [
+                (io.BytesIO(payload), f"evidence_{n}.png", "image/png")
+                for n in range(args.evidence)
+            ],
+        }
+        start = time.perf_counter()
+        response = client.post(
+            "/submit", data=data, content_type="multipart/form-data"
+        )
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            print(f"submit {i} failed: {response.status_code} {response.get_json()}")
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(0.95 * (len(latencies) - 1))] * 1000
+    sequential = (args.receipt_latency + args.evidence_latency) * 1000
+    concurrent = max(args.receipt_latency, args.evidence_latency) * 1000
+    print(f"submissions          {args.requests}")
+    print(f"p50 / p95 ms         {p50:.1f} / {p95:.1f}")
+    print(f"sum of uploads ms    {sequential:.1f}")
+    print(f"max of uploads ms    {concurrent:.1f}")
+    for label, api in (("receipt", receipt_api), ("evidence", evidence_api)):
+        connections = len(api.connections)
+        print(f"{label + ' calls':<20} {api.calls} ({connections} connections)")
+    receipt_api.stop()
+    evidence_api.stop()
+
+
+if __name__ == "__main__":
+    main()
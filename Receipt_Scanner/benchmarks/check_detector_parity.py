@@ -0,0 +1,93 @@
+"""Parity check: the ONNX backend must pick the same total_value box as PyTorch.
+
+For every sample image both backends run and the best `total_value` box is
+compared. The check fails (exit code 1) when one backend finds a box and the
+other does not, or when the boxes overlap less than --min-iou or their
+corners differ by more than --max-px pixels. This is an optional
+integration check with real weights; the decode path itself is covered by
+tests/test_detector_backends.py. Usage:
+
+    python benchmarks/check_detector_parity.py --pt models/best.pt \\
+        --onnx models/best.onnx --images samples/
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from detector_backends import create_backend, select_best_box  # noqa: E402
+
+
+def iou(a, b) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pt", default=os.getenv("YOLO_MODEL_PATH"))
+    parser.add_argument("--onnx", required=True)
+    parser.add_argument("--images", required=True)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--label", default="total_value")
+    parser.add_argument("--min-iou", type=float, default=0.9)
+    parser.add_argument("--max-px", type=float, default=8.0)
+    args = parser.parse_args()
+
+    reference = create_backend("ultralytics", args.pt, args.imgsz)
+    candidate = create_backend("onnx", args.onnx, args.imgsz)
+
+    paths = sorted(
+        p
+        for pattern in ("*.jpg", "*.jpeg", "*.png")
+        for p in glob.glob(os.path.join(args.images, pattern))
+    )
+    if not paths:
+        print(f"No images found in {args.images}")
+        return 1
+
+    failures = 0
+    timings = {"ultralytics": 0.0, "onnx": 0.0}
+    for path in paths:
+        image = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+        boxes = {}
+        for name, backend in (("ultralytics", reference), ("onnx", candidate)):
+            start = time.perf_counter()
+            detections = backend(image)
+            timings[name] += time.perf_counter() - start
+            boxes[name] = select_best_box(detections, backend.names, args.label)
+
+        (ref_box, ref_conf), (cand_box, cand_conf) = boxes["ultralytics"], boxes["onnx"]
+        if ref_box is None and cand_box is None:
+            status = "ok (no box)"
+        elif ref_box is None or cand_box is None:
+            status = "FAIL (box missing in one backend)"
+            failures += 1
+        else:
+            overlap = iou(ref_box, cand_box)
+            max_diff = float(abs(ref_box - cand_box).max())
+            ok = overlap >= args.min_iou and max_diff <= args.max_px
+            verdict = "ok" if ok else "FAIL"
+            status = f"{verdict} (iou={overlap:.3f}, max_px={max_diff:.1f})"
+            failures += 0 if ok else 1
+        print(f"{os.path.basename(path)}: {status} conf {ref_conf:.3f}/{cand_conf:.3f}")
+
+    for name, total in timings.items():
+        print(f"{name}: {total / len(paths) * 1000:.1f} ms/image")
+    print(f"{len(paths) - failures}/{len(paths)} images within tolerance")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""Memory regression check for evidence forwarding in /submit.
+
+Runs the app in a child process (Werkzeug server) against local stub
+upload APIs, submits one receipt plus `--files` synthetic evidence files of
+`--file-mb` MB each, and samples the child's RSS throughout. Exits with
+status 1 if peak RSS grows by more than `--max-growth-mb` over the RSS
+after a small warm-up submission. Usage:
+
+    python benchmarks/check_submit_memory.py --files 4 --file-mb 100
+
+tests/test_submit_memory.py runs a scaled-down version with pytest.
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import psutil
+import requests
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import StubUploadServer  # noqa: E402
+from upload_client import StreamingMultipart  # noqa: E402
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\x0dIHDR" + b"\x00" * 13
+
+
+def write_synthetic(path: str, size: int):
+    """Write a file that passes the PNG header check, in 1 MB blocks."""
+    block = os.urandom(1 << 20)
+    with open(path, "wb") as f:
+        f.write(PNG_HEADER)
+        written = len(PNG_HEADER)
+        while written < size:
+            chunk = block[: size - written]
+            f.write(chunk)
+            written += len(chunk)
+
+
+def serve(port: int, workdir: str):
+    """Child mode: run the app with a helper route that stores a receipt."""
+    os.chdir(workdir)
+    os.environ["MODEL_PRELOAD"] = "off"
+    import app as app_module  # noqa: E402
+    from flask import request
+    from werkzeug.serving import make_server
+
+    app_module.append_to_sheet = lambda *args, **kwargs: None
+
+    @app_module.app.route("/_bench/receipt", methods=["POST"])
+    def bench_receipt():
+        with open(request.form["path"], "rb") as receipt:
+            blob_id = app_module.receipt_store.put(receipt.read(), ".png")
+        return app_module.upload_states.create(
+            {
+                "blob_id": blob_id,
+                "filename": "receipt.png",
+                "content_type": "image/png",
+                "extracted_text": "Rp 50.000",
+            }
+        )
+
+    server = make_server("127.0.0.1", port, app_module.app, threaded=True)
+    print("ready", flush=True)
+    server.serve_forever()
+
+
+class PeakSampler(threading.Thread):
+    """Polls a process's RSS every few milliseconds and keeps the maximum."""
+
+    def __init__(self, pid: int, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def submit(http, base_url: str, workdir: str, evidence_paths: list):
+    receipt_path = os.path.join(workdir, f"receipt_{time.monotonic_ns()}.png")
+    write_synthetic(receipt_path, 256 * 1024)
+    token = http.post(f"{base_url}/_bench/receipt", data={"path": receipt_path}).text
+    handles = [open(path, "rb") for path in evidence_paths]
+    try:
+        body = StreamingMultipart(
+            {
+                "account_skkos_id": "1",
+                "rencana_id": "00001",
+                "amount": "50000",
+                "upload_token": token,
+            },
+            [
+                ("evidence_files", (os.path.basename(path), handle, "image/png"))
+                for path, handle in zip(evidence_paths, handles)
+            ],
+        )
+        response = http.post(
+            f"{base_url}/submit",
+            data=body,
+            headers={"Content-Type": body.content_type},
+        )
+    finally:
+        for handle in handles:
+            handle.close()
+    if response.status_code != 200:
+        raise SystemExit(f"/submit failed: {response.status_code} {response.text}")
+
+
+def measure(files: int, file_mb: int, port: int = 0) -> dict:
+    """Submit `files` evidence files of `file_mb` MB to a child app process.
+
+    Returns the child's peak RSS growth over its RSS after a warm-up
+    submission, the evidence bytes the stub API received and the time.
+    """
+    workdir = tempfile.mkdtemp(prefix="check_submit_memory_")
+    receipt_api = StubUploadServer()
+    evidence_api = StubUploadServer()
+    port = port or 18000 + os.getpid() % 1000
+    env = dict(
+        os.environ,
+        RECEIPT_API_ENDPOINT=receipt_api.url,
+        EVIDENCE_API_ENDPOINT=evidence_api.url,
+        MAX_REQUEST_MB=str(files * file_mb + 16),
+    )
+    child = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--serve",
+            "--port",
+            str(port),
+            "--workdir",
+            workdir,
+        ],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    try:
+        if child.stdout.readline().strip() != "ready":
+            raise SystemExit("App process failed to start.")
+        base_url = f"http://127.0.0.1:{port}"
+        http = requests.Session()
+
+        small = os.path.join(workdir, "small.png")
+        write_synthetic(small, 256 * 1024)
+        submit(http, base_url, workdir, [small])  # Warm up imports and pools
+
+        evidence_paths = []
+        for n in range(files):
+            path = os.path.join(workdir, f"evidence_{n}.png")
+            write_synthetic(path, file_mb * 1024 * 1024)
+            evidence_paths.append(path)
+
+        baseline = psutil.Process(child.pid).memory_info().rss
+        sampler = PeakSampler(child.pid)
+        sampler.start()
+        start = time.perf_counter()
+        submit(http, base_url, workdir, evidence_paths)
+        elapsed = time.perf_counter() - start
+        peak = sampler.stop()
+    finally:
+        child.terminate()
+        child.wait()
+        receipt_api.stop()
+        evidence_api.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "baseline_mb": baseline / 2**20,
+        "growth_mb": (peak - baseline) / 2**20,
+        "evidence_bytes": evidence_api.bytes_received,
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--file-mb", type=int, default=100)
+    parser.add_argument("--max-growth-mb", type=float, default=64)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.workdir)
+        return
+
+    result = measure(args.files, args.file_mb, args.port)
+    total_mb = args.files * args.file_mb
+    growth = result["growth_mb"]
+    print(f"evidence uploaded    {args.files} x {args.file_mb} MB ({total_mb} MB)")
+    print(f"evidence API got     {result['evidence_bytes'] / 2**20:.1f} MB")
+    print(f"submit time          {result['seconds']:.2f}s")
+    print(f"baseline RSS         {result['baseline_mb']:.1f} MB")
+    print(f"peak RSS growth      {growth:.1f} MB (limit {args.max_growth_mb} MB)")
+    if growth > args.max_growth_mb:
+        print("FAIL: evidence forwarding is buffering uploads in memory")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""In-process fakes for the external services, for offline benchmarks.
+
+Each fake takes a fixed latency per call plus a per-item latency, and can
+fail a fraction of calls, so batching and error paths can be measured
+without network access or credentials.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from detector_backends import Detections  # noqa: E402
+
+
+class FakeService:
+    """Shared latency/failure injection and call counting."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        per_item_latency: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.items = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate(self, items: int = 1) -> bool:
+        """Sleep like the real call would; return True if it should fail."""
+        with self._lock:
+            self.calls += 1
+            self.items += items
+            failed = self._random.random() < self.failure_rate
+        time.sleep(self.latency + self.per_item_latency * items)
+        return failed
+
+
+class FakeVisionClient(FakeService):
+    """Stands in for google.cloud.vision.ImageAnnotatorClient."""
+
+    def __init__(self, text: str = "TOTAL 50.000", **kwargs):
+        super().__init__(**kwargs)
+        self.text = text
+        self.batch_sizes = []
+
+    def _response(self, failed: bool):
+        annotations = [] if failed else [SimpleNamespace(description=self.text)]
+        error = SimpleNamespace(message="Injected Vision failure" if failed else "")
+        return SimpleNamespace(text_annotations=annotations, error=error)
+
+    def batch_annotate_images(self, requests, timeout=None):
+        with self._lock:
+            self.batch_sizes.append(len(requests))
+        failed = self._simulate(len(requests))
+        return SimpleNamespace(responses=[self._response(failed) for _ in requests])
+
+    def text_detection(self, image, timeout=None):
+        return self._response(self._simulate(1))
+
+
+class FakeSheetsError(Exception):
+    """Injected Google Sheets failure."""
+
+
+class FakeWorksheet(FakeService):
+    """Stands in for a gspread Worksheet: rows are kept in memory."""
+
+    def __init__(self, records: list = None, **kwargs):
+        super().__init__(**kwargs)
+        self.records = records or []
+        self.rows = []
+
+    def _call(self, items: int = 1):
+        if self._simulate(items):
+            raise FakeSheetsError("Injected Sheets failure")
+
+    def get_all_records(self) -> list:
+        self._call(len(self.records))
+        return [dict(record) for record in self.records]
+
+    def col_values(self, column: int) -> list:
+        self._call()
+        values = [list(record.values()) for record in self.records]
+        return [row[column - 1] for row in values if len(row) >= column]
+
+    def append_rows(self, rows: list, **kwargs):
+        self._call(len(rows))
+        with self._lock:
+            self.rows.extend(rows)
+
+
+class FakeSheetsPool:
+    """Drop-in for sheets_client.SheetsClientPool backed by FakeWorksheets.
+
+    `sheets` maps worksheet names to their records; other worksheets are
+    created empty on first use. Latency and failures apply to every call.
+    """
+
+    def __init__(self, sheets: dict = None, **kwargs):
+        self.kwargs = kwargs
+        self.worksheets = {
+            name: FakeWorksheet(records, **kwargs)
+            for name, records in (sheets or {}).items()
+        }
+        self._lock = threading.Lock()
+
+    def worksheet(self, name: str) -> FakeWorksheet:
+        with self._lock:
+            if name not in self.worksheets:
+                self.worksheets[name] = FakeWorksheet(**self.kwargs)
+            return self.worksheets[name]
+
+    def call(self, sheet_name: str, method: str, *args, **kwargs):
+        return getattr(self.worksheet(sheet_name), method)(*args, **kwargs)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            sheets = dict(self.worksheets)
+        return {
+            name: {"calls": sheet.calls, "rows": len(sheet.rows)}
+            for name, sheet in sheets.items()
+        }
+
+
+class FakeDetector(FakeService):
+    """Stands in for the YOLO backend: one total_value box per image.
+
+    The box sits at `relative_box` (fractions of width and height), where
+    the total usually is on a receipt.
+    """
+
+    names = {0: "total_value"}
+
+    def __init__(self, relative_box=(0.55, 0.70, 0.90, 0.76), **kwargs):
+        super().__init__(**kwargs)
+        self.relative_box = np.array(relative_box, dtype=np.float32)
+
+    def __call__(self, images) -> list:
+        images = images if isinstance(images, list) else [images]
+        self._simulate(len(images))
+        detections = []
+        for image in images:
+            height, width = image.shape[:2]
+            box = self.relative_box * np.array([width, height, width, height])
+            detections.append(
+                Detections(
+                    box.reshape(1, 4).astype(np.float32),
+                    np.array([0.9], dtype=np.float32),
+                    np.array([0], dtype=np.int64),
+                )
+            )
+        return detections
+
+
+class StubUploadServer(FakeService):
+    """Local HTTP server that answers like the Receipt/Evidence upload APIs.
+
+    Every POST body is read in full, then the server sleeps for the
+    configured latency before answering with a fileLink. The first
+    `fail_first` requests get a 503 to exercise client retries.
+    """
+
+    def __init__(self, fail_first: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_first = fail_first
+        self.bytes_received = 0
+        self.connections = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Allow keep-alive
+
+            def do_POST(self):
+                # Drain in blocks so large uploads do not inflate this process
+                remaining = int(self.headers.get("Content-Length", 0))
+                while remaining > 0:
+                    block = self.rfile.read(min(remaining, 1 << 20))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                with stub._lock:
+                    stub.bytes_received += int(self.headers.get("Content-Length", 0))
+                    stub.connections.add(self.client_address)
+                    failing = stub.fail_first > 0
+                    stub.fail_first -= int(failing)
+                failed = stub._simulate(1) or failing
+                if failed:
+                    payload, status = {"status": "error", "message": "stub"}, 503
+                else:
+                    link = f"https://drive.example/{stub.calls}"
+                    payload = {"status": "success", "data": {"fileLink": link}}
+                    status = 200
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/upload"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
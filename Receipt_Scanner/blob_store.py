@@ -0,0 +1,193 @@
+import os
+import re
+import mmap
+import time
+import uuid
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BLOB_ID_PATTERN = re.compile(r"^[md]-[0-9a-f]{32}(\.[a-z0-9]{1,5})?$")
+
+
+class BlobNotFoundError(FileNotFoundError):
+    """Raised when a blob id is unknown, malformed or already swept."""
+
+
+class ReceiptBlobStore:
+    """Keeps uploaded receipts as the original bytes until they are submitted.
+
+    Blobs up to `memory_max_bytes` go to `memory_dir` (tmpfs such as
+    /dev/shm, shared by every worker on the host) while that tier holds
+    less than `memory_budget_bytes`; everything else spills to `disk_dir`.
+    Reads are memory-mapped, so forwarding a receipt does not copy it into
+    the Python heap. A background sweeper deletes blobs (and any other
+    leftover files in the store directories) older than `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        disk_dir: str,
+        memory_dir: str = "/dev/shm/receipt_scanner",
+        memory_max_bytes: int = 2 * 1024 * 1024,
+        memory_budget_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 6 * 3600,
+        sweep_interval: float = 300,
+    ):
+        self.disk_dir = disk_dir
+        self.memory_dir = memory_dir
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_budget_bytes = memory_budget_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+
+        os.makedirs(disk_dir, exist_ok=True)
+        if memory_dir:
+            try:
+                os.makedirs(memory_dir, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"No memory tier for receipts ({memory_dir}): {str(e)}")
+                self.memory_dir = None
+
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_puts": 0,
+            "disk_puts": 0,
+            "bytes_stored": 0,
+            "deleted": 0,
+            "swept": 0,
+        }
+
+        # The sweeper thread does not survive fork; it restarts on next put
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ------------------------ Storage ------------------------ #
+
+    def _memory_usage(self) -> int:
+        with os.scandir(self.memory_dir) as entries:
+            return sum(entry.stat().st_size for entry in entries if entry.is_file())
+
+    def _use_memory(self, size: int) -> bool:
+        if not self.memory_dir or size > self.memory_max_bytes:
+            return False
+        if shutil.disk_usage(self.memory_dir).free < size:
+            return False
+        return self._memory_usage() + size <= self.memory_budget_bytes
+
+    def path(self, blob_id: str) -> str:
+        """Return the file backing `blob_id`; rejects malformed ids."""
+        if not blob_id or not BLOB_ID_PATTERN.match(blob_id):
+            raise BlobNotFoundError(f"Invalid receipt blob id '{blob_id}'")
+        if blob_id.startswith("m-"):
+            if not self.memory_dir:
+                raise BlobNotFoundError(f"Receipt blob {blob_id} not found")
+            return os.path.join(self.memory_dir, blob_id)
+        return os.path.join(self.disk_dir, blob_id)
+
+    def put(self, data: bytes, extension: str = "") -> str:
+        """Store the bytes unchanged and return the new blob id."""
+        self.start_sweeper()
+        if not re.match(r"^\.[A-Za-z0-9]{1,5}$", extension):
+            extension = ""
+        tier = "m" if self._use_memory(len(data)) else "d"
+        blob_id = f"{tier}-{uuid.uuid4().hex}{extension.lower()}"
+        path = self.path(blob_id)
+
+        # Write then rename, so a concurrent reader never sees a partial blob
+        partial = f"{path}.partial"
+        with open(partial, "wb") as blob:
+            blob.write(data)
+        os.replace(partial, path)
+
+        with self._lock:
+            self._stats["memory_puts" if tier == "m" else "disk_puts"] += 1
+            self._stats["bytes_stored"] += len(data)
+        return blob_id
+
+    def exists(self, blob_id: str) -> bool:
+        try:
+            return os.path.exists(self.path(blob_id))
+        except BlobNotFoundError:
+            return False
+
+    @contextmanager
+    def open(self, blob_id: str):
+        """Yield a read-only memory map of the blob (seek/read/tell work)."""
+        try:
+            blob = open(self.path(blob_id), "rb")
+        except FileNotFoundError:
+            raise BlobNotFoundError(f"Receipt blob {blob_id} not found")
+        with blob:
+            if os.fstat(blob.fileno()).st_size == 0:
+                yield blob
+                return
+            with mmap.mmap(blob.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def read(self, blob_id: str) -> bytes:
+        with self.open(blob_id) as blob:
+            return blob.read()
+
+    def delete(self, blob_id: str):
+        try:
+            os.remove(self.path(blob_id))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._stats["deleted"] += 1
+
+    # ------------------------ Sweeping ------------------------ #
+
+    def sweep(self) -> int:
+        """Delete files older than the TTL; returns how many were removed."""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for directory in filter(None, (self.disk_dir, self.memory_dir)):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file() and entry.stat().st_mtime < cutoff:
+                            os.remove(entry.path)
+                            removed += 1
+                    except FileNotFoundError:
+                        pass  # Claimed or swept by another worker meanwhile
+        if removed:
+            logger.info(f"Swept {removed} expired receipt files.")
+            with self._lock:
+                self._stats["swept"] += removed
+        return removed
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except OSError as e:
+                logger.warning(f"Receipt sweep failed: {str(e)}")
+            time.sleep(self.sweep_interval)
+
+    def start_sweeper(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="receipt-blob-sweeper", daemon=True
+                    )
+                    self._thread.start()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["memory_dir"] = self.memory_dir
+        stats["memory_bytes"] = self._memory_usage() if self.memory_dir else 0
+        with os.scandir(self.disk_dir) as entries:
+            stats["disk_files"] = sum(1 for entry in entries if entry.is_file())
+        stats["ttl"] = self.ttl
+        return stats
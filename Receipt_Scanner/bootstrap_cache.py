@@ -0,0 +1,95 @@
+import gzip
+import json
+import hashlib
+import threading
+
+try:
+    import brotli  # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Preferred first; brotli is only offered when the module is installed
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=9)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+class BootstrapCache:
+    """Serialized, compressed reference data for /bootstrap.
+
+    `sections` maps a section name to (version, data): `version()` must be
+    cheap and change whenever `data()` would, e.g. a snapshot's load time.
+    A body is serialized once per combination of section versions, its
+    ETag (used as a weak one) is a hash of the JSON, and each encoding is
+    compressed once on first request. Reloads that produce identical data
+    keep the same ETag, so clients still get 304s.
+    """
+
+    def __init__(self, sections: dict, min_compress_bytes: int = 1024):
+        self.sections = sections
+        self.min_compress_bytes = min_compress_bytes
+
+        self._entries = {}  # include tuple -> entry of the latest versions
+        self._lock = threading.Lock()
+        self._stats = {"builds": 0, "hits": 0, "compressions": 0}
+
+    def _build(self, include: tuple, versions: tuple) -> dict:
+        payload = {name: self.sections[name][1]() for name in include}
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        return {
+            "versions": versions,
+            "etag": digest,
+            "bodies": {"identity": body},
+        }
+
+    def get(self, include: tuple, accepted: tuple = ()) -> tuple:
+        """Return (etag, body, encoding) for the sections in `include`.
+
+        `accepted` lists the content codings the client takes; the first of
+        ENCODINGS it accepts is used for bodies of at least
+        min_compress_bytes, otherwise the body is sent as is ("identity").
+        """
+        versions = tuple(self.sections[name][0]() for name in include)
+        with self._lock:
+            entry = self._entries.get(include)
+            if entry is not None and entry["versions"] == versions:
+                self._stats["hits"] += 1
+            else:
+                entry = None
+        if entry is None:
+            entry = self._build(include, versions)
+            with self._lock:
+                self._entries[include] = entry
+                self._stats["builds"] += 1
+
+        body = entry["bodies"]["identity"]
+        encoding = "identity"
+        if len(body) >= self.min_compress_bytes:
+            encoding = next((e for e in ENCODINGS if e in accepted), "identity")
+        compressed = entry["bodies"].get(encoding)
+        if compressed is None:
+            compressed = compress(body, encoding)
+            with self._lock:
+                entry["bodies"][encoding] = compressed
+                self._stats["compressions"] += 1
+        return entry["etag"], compressed, encoding
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = {
+                ",".join(include): {
+                    "etag": entry["etag"],
+                    "bytes": {k: len(v) for k, v in entry["bodies"].items()},
+                }
+                for include, entry in self._entries.items()
+            }
+        stats["encodings"] = list(ENCODINGS)
+        return stats
@@ -0,0 +1,340 @@
+import os
+import re
+import json
+import time
+import fcntl
+import mmap
+import hashlib
+import logging
+import secrets
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{24}$")
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ChunkedUploadError(Exception):
+    """Request the upload protocol rejects, reported with `status_code`.
+
+    `offset` is the number of bytes the server holds, when the client
+    should resume from there.
+    """
+
+    def __init__(self, message: str, status_code: int = 400, offset: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class ChunkedUploadStore:
+    """Resumable uploads assembled from chunks in a directory.
+
+    An upload is created with its size and SHA-256, then filled by chunks
+    written at increasing offsets; a chunk may carry its own SHA-256 so a
+    corrupted one is rejected before it is written. Chunks repeating bytes
+    that are already stored are accepted without rewriting them, so a
+    client that lost a response can resend safely, and the current offset
+    tells it where to resume after a dropped connection. finalize() checks
+    the size and the whole-file hash, and open() then maps the file for
+    processing without reading it into memory.
+
+    Each upload is a data file and a JSON metadata file, locked with
+    flock(), so every worker on the host can serve any chunk. Both files
+    are swept together `ttl` seconds after the last chunk or state change.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        chunk_size: int = 1024 * 1024,
+        max_size: int = 100 * 1024 * 1024,
+        ttl: float = 24 * 3600,
+        finalize_lease: float = 900,
+    ):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self.finalize_lease = finalize_lease
+
+        os.makedirs(directory, exist_ok=True)
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            "created": 0,
+            "chunks": 0,
+            "duplicate_chunks": 0,
+            "bytes_received": 0,
+            "chunk_checksum_errors": 0,
+            "checksum_errors": 0,
+            "finalized": 0,
+            "swept": 0,
+        }
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self._stats[key] += value
+
+    # ------------------------ Files ------------------------ #
+
+    def _paths(self, upload_id: str) -> tuple:
+        if not UPLOAD_ID_PATTERN.match(upload_id or ""):
+            raise ChunkedUploadError("Upload not found.", 404)
+        base = os.path.join(self.directory, upload_id)
+        return base + ".part", base + ".json"
+
+    def _write_meta(self, meta_path: str, meta: dict):
+        temp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, meta_path)
+
+    @contextmanager
+    def _locked(self, upload_id: str):
+        """Yield (data file, metadata) with the upload locked exclusively."""
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            part = open(part_path, "r+b")
+        except FileNotFoundError:
+            raise ChunkedUploadError("Upload not found.", 404)
+        with part:
+            fcntl.flock(part.fileno(), fcntl.LOCK_EX)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            except FileNotFoundError:
+                raise ChunkedUploadError("Upload not found.", 404)
+            yield part, meta
+
+    # ------------------------ Protocol ------------------------ #
+
+    def create(self, filename: str, content_type: str, size, sha256) -> dict:
+        """Start an upload of `size` bytes whose SHA-256 is `sha256`."""
+        if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+            raise ChunkedUploadError("size must be a positive integer.")
+        if size > self.max_size:
+            raise ChunkedUploadError(
+                f"File size exceeds {self.max_size // (1024 * 1024)}MB limit.", 413
+            )
+        sha256 = str(sha256 or "").lower()
+        if not SHA256_PATTERN.match(sha256):
+            raise ChunkedUploadError("sha256 must be 64 hexadecimal characters.")
+
+        self._maybe_sweep()
+        upload_id = secrets.token_urlsafe(18)
+        part_path, meta_path = self._paths(upload_id)
+        meta = {
+            "filename": filename or "receipt.jpg",
+            "content_type": content_type or "application/octet-stream",
+            "size": size,
+            "sha256": sha256,
+            "state": "uploading",
+            "created_at": time.time(),
+        }
+        self._write_meta(meta_path, meta)
+        open(part_path, "xb").close()
+        self._count("created")
+        return self.status(upload_id)
+
+    def status(self, upload_id: str) -> dict:
+        """Where to resume: the number of bytes received so far."""
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            received = os.path.getsize(part_path)
+        except FileNotFoundError:
+            raise ChunkedUploadError("Upload not found.", 404)
+        return {
+            "upload_id": upload_id,
+            "state": meta["state"],
+            "size": meta["size"],
+            "offset": meta["size"] if meta["state"] == "finalized" else received,
+            "chunk_size": self.chunk_size,
+        }
+
+    def write_chunk(
+        self, upload_id: str, offset: int, data: bytes, chunk_sha256: str = None
+    ) -> int:
+        """Store `data` at `offset`; returns the bytes received so far."""
+        if len(data) > self.chunk_size:
+            raise ChunkedUploadError(
+                f"Chunks are limited to {self.chunk_size} bytes.", 413
+            )
+        if chunk_sha256 and hashlib.sha256(data).hexdigest() != chunk_sha256.lower():
+            self._count("chunk_checksum_errors")
+            raise ChunkedUploadError("Chunk checksum mismatch, send it again.", 422)
+
+        with self._locked(upload_id) as (part, meta):
+            if meta["state"] != "uploading":
+                raise ChunkedUploadError("Upload is already finalized.", 409)
+            received = os.fstat(part.fileno()).st_size
+            end = offset + len(data)
+            if offset < 0 or offset > received:
+                raise ChunkedUploadError(
+                    "Chunk does not start at the received offset.", 409, received
+                )
+            if end > meta["size"]:
+                raise ChunkedUploadError("Chunk extends past the upload size.")
+            if end <= received:
+                self._count("duplicate_chunks")
+                return received
+            # Only the part not received yet; resent bytes are not rewritten
+            part.seek(received)
+            part.write(data[received - offset :])
+        self._count("chunks")
+        self._count("bytes_received", end - received)
+        return end
+
+    def finalize(self, upload_id: str) -> dict:
+        """Verify a complete upload and return its metadata.
+
+        The file is hashed block by block. The upload is then marked as
+        finalizing until complete() stores the outcome or reopen() allows
+        another attempt; for an upload that is already finalized the state
+        is "finalized" and metadata["response"] holds the stored outcome,
+        so finalize can be retried safely.
+        """
+        with self._locked(upload_id) as (part, meta):
+            _, meta_path = self._paths(upload_id)
+            if meta["state"] == "finalized":
+                return meta
+            if (
+                meta["state"] == "finalizing"
+                and time.time() - meta["finalizing_at"] < self.finalize_lease
+            ):
+                raise ChunkedUploadError("Upload is being processed.", 409)
+
+            received = os.fstat(part.fileno()).st_size
+            if received != meta["size"]:
+                raise ChunkedUploadError(
+                    f"Upload is incomplete: {received} of {meta['size']} bytes.",
+                    409,
+                    received,
+                )
+            part.seek(0)
+            digest = hashlib.sha256()
+            for block in iter(lambda: part.read(1024 * 1024), b""):
+                digest.update(block)
+            if digest.hexdigest() != meta["sha256"]:
+                # Some stored chunk is wrong; the client starts over
+                part.truncate(0)
+                self._count("checksum_errors")
+                raise ChunkedUploadError(
+                    "Checksum mismatch, upload the file again.", 422, 0
+                )
+            meta["state"] = "finalizing"
+            meta["finalizing_at"] = time.time()
+            self._write_meta(meta_path, meta)
+        return meta
+
+    @contextmanager
+    def open(self, upload_id: str):
+        """Yield a read-only memory map of a finalizing upload's file."""
+        part_path, _ = self._paths(upload_id)
+        try:
+            part = open(part_path, "rb")
+        except FileNotFoundError:
+            raise ChunkedUploadError("Upload not found.", 404)
+        with part, mmap.mmap(part.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+    def complete(self, upload_id: str, status_code: int, body: dict):
+        """Store the outcome of a finalized upload and drop its bytes."""
+        with self._locked(upload_id) as (part, meta):
+            _, meta_path = self._paths(upload_id)
+            meta["state"] = "finalized"
+            meta["response"] = {"status_code": status_code, "body": body}
+            self._write_meta(meta_path, meta)
+            part.truncate(0)
+        self._count("finalized")
+
+    def reopen(self, upload_id: str):
+        """Let finalize run again, e.g. after a temporary processing error."""
+        with self._locked(upload_id) as (_, meta):
+            _, meta_path = self._paths(upload_id)
+            meta["state"] = "uploading"
+            meta.pop("finalizing_at", None)
+            self._write_meta(meta_path, meta)
+
+    def delete(self, upload_id: str):
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # ------------------------ Sweeping ------------------------ #
+
+    def sweep(self) -> int:
+        """Delete uploads idle for longer than the TTL; returns how many.
+
+        An upload is idle from the newest modification of its data file
+        (the last chunk) or metadata file, and both are removed together
+        with any leftover temporary metadata, under the upload's lock.
+        """
+        groups = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                upload_id = entry.name.split(".", 1)[0]
+                groups.setdefault(upload_id, []).append(entry.path)
+
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for upload_id, paths in groups.items():
+            if self._last_activity(paths) >= cutoff:
+                continue
+            part_path = os.path.join(self.directory, upload_id + ".part")
+            try:
+                part = open(part_path, "rb")
+            except FileNotFoundError:
+                part = None  # Metadata or temporary files left alone
+            try:
+                if part is not None:
+                    fcntl.flock(part.fileno(), fcntl.LOCK_EX)
+                    if self._last_activity(paths) >= cutoff:
+                        continue  # Written to while waiting for the lock
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass  # Removed by another worker meanwhile
+            finally:
+                if part is not None:
+                    part.close()
+            removed += 1
+        if removed:
+            logger.info(f"Swept {removed} expired chunked uploads.")
+            self._count("swept", removed)
+        return removed
+
+    @staticmethod
+    def _last_activity(paths: list) -> float:
+        latest = 0.0
+        for path in paths:
+            try:
+                latest = max(latest, os.stat(path).st_mtime)
+            except FileNotFoundError:
+                pass
+        return latest
+
+    def _maybe_sweep(self):
+        if time.time() - self._last_sweep < 60:
+            return
+        self._last_sweep = time.time()
+        try:
+            self.sweep()
+        except OSError as e:
+            logger.warning(f"Failed to sweep chunked uploads: {str(e)}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        with os.scandir(self.directory) as entries:
+            stats["uploads"] = sum(1 for e in entries if e.name.endswith(".json"))
+        stats["chunk_size"] = self.chunk_size
+        stats["ttl"] = self.ttl
+        return stats
@@ -0,0 +1,234 @@
+"""CPU topology of a host: worker count, thread pools and CPU affinity.
+
+Left alone, the torch, ONNX Runtime, OpenMP/BLAS and OpenCV thread pools of
+every gunicorn worker size themselves to all cores, so N workers run N
+times as many busy threads as there are cores and detection latency
+collapses under load. A topology gives each worker `threads` intra-op
+threads, `interop_threads` torch inter-op threads and `cv2_threads` OpenCV
+threads and, with `affinity`, pins worker slot i to its own slice of the
+CPUs, one thread per physical core before any hyper-thread sibling.
+
+The topology is read from CPU_TOPOLOGY_FILE (written by
+benchmarks/autotune_cpu_topology.py), and single values are overridden
+by CPU_* environment variables. gunicorn.conf.py applies it to every
+worker, and inference_worker.py applies it with --cpu-slot.
+"""
+
+import os
+import sys
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Environment variables read by OpenMP, MKL and OpenBLAS when they start
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+FIELDS = ("workers", "threads", "interop_threads", "cv2_threads", "affinity")
+
+
+class CPUTopology:
+    """How many workers to run and how many threads and CPUs each gets.
+
+    None leaves a value to the library (or gunicorn) default, except that
+    OpenCV follows `threads` when `cv2_threads` is None. cv2_threads=0
+    runs OpenCV single-threaded.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        threads: int = None,
+        interop_threads: int = None,
+        cv2_threads: int = None,
+        affinity: bool = False,
+    ):
+        self.workers = workers
+        self.threads = threads
+        self.interop_threads = interop_threads
+        self.cv2_threads = cv2_threads
+        self.affinity = affinity
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "CPUTopology":
+        return cls(**{key: values[key] for key in FIELDS if key in values})
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in FIELDS}
+
+    def cpus_for(self, slot: int, cpus: list = None) -> list:
+        """The CPUs worker `slot` is pinned to, wrapping around the host.
+
+        Each worker gets `threads` CPUs (or an equal share when unset), so
+        with workers x threads <= physical cores no two workers share a
+        core.
+        """
+        ordered = core_ordered_cpus(cpus or available_cpus())
+        width = self.threads or max(1, len(ordered) // (self.workers or 1))
+        width = min(width, len(ordered))
+        start = slot * width
+        return [ordered[(start + i) % len(ordered)] for i in range(width)]
+
+    def __repr__(self):
+        values = ", ".join(f"{key}={getattr(self, key)!r}" for key in FIELDS)
+        return f"CPUTopology({values})"
+
+
+# ------------------------ Host ------------------------ #
+
+
+def available_cpus() -> list:
+    """CPUs this process may run on (its affinity mask, not the host count)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cpu_list(text: str) -> list:
+    """Parse a kernel CPU list such as "0-3,8,10-11"."""
+    cpus = []
+    for part in text.strip().split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+def physical_cores(cpus: list) -> list:
+    """Group `cpus` by physical core: a list of hyper-thread sibling lists.
+
+    Each CPU is its own core when sysfs does not describe the topology.
+    """
+    cores, seen = [], set()
+    for cpu in cpus:
+        if cpu in seen:
+            continue
+        path = f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list"
+        try:
+            with open(path) as f:
+                siblings = [c for c in parse_cpu_list(f.read()) if c in cpus]
+        except (OSError, ValueError):
+            siblings = []
+        siblings = siblings or [cpu]
+        seen.update(siblings)
+        cores.append(siblings)
+    return cores
+
+
+def core_ordered_cpus(cpus: list) -> list:
+    """`cpus` with the first thread of every core before any second thread."""
+    cores = physical_cores(cpus)
+    depth = max(len(core) for core in cores)
+    return [core[i] for i in range(depth) for core in cores if i < len(core)]
+
+
+# ------------------------ Configuration ------------------------ #
+
+
+def _env_int(name: str):
+    value = os.getenv(name, "").strip()
+    return int(value) if value else None
+
+
+def load_topology(path: str = None) -> CPUTopology:
+    """The topology from CPU_TOPOLOGY_FILE with CPU_* overrides applied.
+
+    Without the file or any variable every value stays None, which keeps
+    the library defaults (the behaviour before topologies existed).
+    """
+    path = path or os.getenv("CPU_TOPOLOGY_FILE", "./cpu_topology.json")
+    values = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            values = json.load(f).get("topology", {})
+
+    overrides = {
+        "workers": _env_int("CPU_WORKERS"),
+        "threads": _env_int("CPU_THREADS_PER_WORKER"),
+        "interop_threads": _env_int("CPU_INTEROP_THREADS"),
+        "cv2_threads": _env_int("CPU_CV2_THREADS"),
+    }
+    values.update({k: v for k, v in overrides.items() if v is not None})
+    if os.getenv("CPU_AFFINITY"):
+        values["affinity"] = os.getenv("CPU_AFFINITY") == "1"
+    return CPUTopology.from_dict(values)
+
+
+# ------------------------ Applying ------------------------ #
+
+
+def limit_thread_env(topology: CPUTopology):
+    """Size OpenMP/BLAS pools started later; values already set are kept.
+
+    Only takes effect for libraries imported after this call, so run it
+    before NumPy, torch or ONNX Runtime are imported.
+    """
+    if topology.threads:
+        for name in THREAD_ENV_VARS:
+            os.environ.setdefault(name, str(topology.threads))
+
+
+def apply_thread_limits(topology: CPUTopology) -> dict:
+    """Resize the pools of torch and OpenCV if they are already imported.
+
+    Called again after the detector backend is loaded, since torch is only
+    imported then. torch refuses to change its inter-op pool once it has
+    been used, which is logged and otherwise ignored.
+    """
+    applied = {}
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        if topology.threads:
+            torch.set_num_threads(topology.threads)
+            applied["torch_threads"] = topology.threads
+        if topology.interop_threads:
+            try:
+                torch.set_num_interop_threads(topology.interop_threads)
+                applied["torch_interop_threads"] = topology.interop_threads
+            except RuntimeError as e:
+                logger.debug(f"torch inter-op threads not changed: {str(e)}")
+    cv2 = sys.modules.get("cv2")
+    cv2_threads = topology.cv2_threads
+    if cv2_threads is None:
+        cv2_threads = topology.threads  # Same budget as the detector
+    if cv2 is not None and cv2_threads is not None:
+        cv2.setNumThreads(cv2_threads)
+        applied["cv2_threads"] = cv2_threads
+    return applied
+
+
+def pin_to_slot(topology: CPUTopology, slot: int) -> list:
+    """Restrict this process to the CPUs of worker `slot`."""
+    if not hasattr(os, "sched_setaffinity"):
+        logger.warning("CPU affinity is not supported on this platform.")
+        return []
+    cpus = topology.cpus_for(slot)
+    os.sched_setaffinity(0, cpus)
+    return cpus
+
+
+def apply(topology: CPUTopology, slot: int = None) -> dict:
+    """Apply `topology` to this process; `slot` numbers the worker from 0."""
+    limit_thread_env(topology)
+    applied = apply_thread_limits(topology)
+    if topology.affinity and slot is not None:
+        applied["cpus"] = pin_to_slot(topology, slot)
+    if applied:
+        logger.info(f"CPU topology applied to worker slot {slot}: {applied}")
+    return applied
+
+
+def describe() -> dict:
+    """The thread pools and CPUs this process actually uses right now."""
+    state = {"pid": os.getpid(), "cpus": available_cpus()}
+    state.update({name: os.getenv(name) for name in THREAD_ENV_VARS})
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        state["torch_threads"] = torch.get_num_threads()
+        state["torch_interop_threads"] = torch.get_num_interop_threads()
+    cv2 = sys.modules.get("cv2")
+    if cv2 is not None:
+        state["cv2_threads"] = cv2.getNumThreads()
+    return state
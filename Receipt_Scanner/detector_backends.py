@@ -0,0 +1,265 @@
+"""Detector backends for the receipt field model.
+
+Every backend takes the images the pipeline hands it (cv2.cvtColor'ed to
+RGB) and feeds the network the same tensor: ultralytics treats NumPy input
+as BGR and reverses the channels, so the ONNX backend reverses them too.
+Each returns one `Detections` per image with plain NumPy arrays, so the
+rest of the app does not depend on ultralytics or torch tensors. Run this module to export YOLO weights for the ONNX backend:
+
+    python detector_backends.py --model models/best.pt --imgsz 640 --int8
+"""
+
+import os
+import ast
+import logging
+import argparse
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# boxes: (N, 4) float32 xyxy in input pixels, scores: (N,), class_ids: (N,)
+Detections = namedtuple("Detections", ["boxes", "scores", "class_ids"])
+
+
+def empty_detections() -> Detections:
+    return Detections(
+        np.zeros((0, 4), dtype=np.float32),
+        np.zeros((0,), dtype=np.float32),
+        np.zeros((0,), dtype=np.int64),
+    )
+
+
+# Best detection of one class: box is xyxy in input pixels
+FieldDetection = namedtuple("FieldDetection", ["box", "confidence"])
+
+
+def select_best_boxes(results: list, class_names: dict) -> dict:
+    """Return {label: FieldDetection} with the best box of every detected class.
+
+    One vectorized pass over all detections: sort by descending score (a
+    stable sort, so the first of equal scores wins) and keep the first
+    detection of each class id. Unknown class ids and zero scores are
+    ignored; classes without a detection are absent from the result.
+    """
+    results = [detections for detections in results if len(detections.scores)]
+    if not results:
+        return {}
+    boxes = np.concatenate([detections.boxes for detections in results])
+    scores = np.concatenate([detections.scores for detections in results])
+    class_ids = np.concatenate([detections.class_ids for detections in results])
+
+    order = np.argsort(-scores, kind="stable")
+    order = order[scores[order] > 0]
+    class_ids, first = np.unique(class_ids[order], return_index=True)
+    best = order[first]
+
+    fields = {}
+    for class_id, index in zip(class_ids.tolist(), best.tolist()):
+        label = class_names.get(class_id)
+        if label is not None:
+            fields[label] = FieldDetection(boxes[index], float(scores[index]))
+    return fields
+
+
+def select_best_box(results: list, class_names: dict, target_label: str):
+    """Return (box, confidence) of the best target_label detection, or (None, 0)."""
+    best = select_best_boxes(results, class_names).get(target_label)
+    if best is None:
+        return None, 0.0
+    return best.box, best.confidence
+
+
+class DetectorBackend:
+    """Base class: callable with one image or a list, returns a list."""
+
+    names = {}
+
+    def predict(self, images: list) -> list:
+        raise NotImplementedError
+
+    def __call__(self, images) -> list:
+        if not isinstance(images, list):
+            images = [images]
+        return self.predict(images)
+
+
+class UltralyticsBackend(DetectorBackend):
+    """The original PyTorch path through ultralytics.YOLO."""
+
+    def __init__(self, model_path: str, input_size: int = 640, num_threads: int = 0):
+        from ultralytics import YOLO
+        import torch
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.model = YOLO(model_path)
+        self.input_size = input_size
+        if hasattr(self.model, "names"):
+            self.names = self.model.names
+        else:
+            self.names = self.model.model.names
+
+    def predict(self, images: list) -> list:
+        results = self.model(images, imgsz=self.input_size, verbose=False)
+        detections = []
+        for result in results:
+            boxes = result.boxes
+            detections.append(
+                Detections(
+                    boxes.xyxy.cpu().numpy().astype(np.float32),
+                    boxes.conf.cpu().numpy().astype(np.float32),
+                    boxes.cls.cpu().numpy().astype(np.int64),
+                )
+            )
+        return detections
+
+
+class OnnxBackend(DetectorBackend):
+    """YOLOv8/11 ONNX export run with ONNX Runtime on CPU."""
+
+    def __init__(
+        self,
+        model_path: str,
+        input_size: int = 640,
+        conf_threshold: float = 0.25,
+        iou_threshold: float = 0.7,
+        num_threads: int = 0,
+    ):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        # A static export fixes the input size; a dynamic one uses ours
+        static_size = model_input.shape[2]
+        self.input_size = static_size if isinstance(static_size, int) else input_size
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        names = metadata.get("names")
+        self.names = ast.literal_eval(names) if names else {}
+
+    def _letterbox(self, image):
+        height, width = image.shape[:2]
+        ratio = min(self.input_size / height, self.input_size / width)
+        new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+        pad_x = (self.input_size - new_w) / 2
+        pad_y = (self.input_size - new_h) / 2
+        resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        canvas = np.full((self.input_size, self.input_size, 3), 114, dtype=np.uint8)
+        top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+        canvas[top : top + new_h, left : left + new_w] = resized
+        return canvas, ratio, left, top
+
+    def _decode(self, output, ratio, left, top, shape) -> Detections:
+        # output: (4 + num_classes, num_anchors) with cx, cy, w, h first
+        predictions = output.T
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = scores > self.conf_threshold
+        if not keep.any():
+            return empty_detections()
+        predictions = predictions[keep]
+        scores, class_ids = scores[keep], class_ids[keep]
+
+        cx, cy, w, h = predictions[:, :4].T
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        boxes -= np.array([left, top, left, top], dtype=np.float32)
+        boxes /= ratio
+        height, width = shape[:2]
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+
+        xywh = np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1)
+        kept = cv2.dnn.NMSBoxesBatched(
+            xywh.tolist(),
+            scores.tolist(),
+            class_ids.tolist(),
+            self.conf_threshold,
+            self.iou_threshold,
+        )
+        kept = np.array(kept, dtype=np.int64).reshape(-1)
+        return Detections(
+            boxes[kept].astype(np.float32),
+            scores[kept].astype(np.float32),
+            class_ids[kept].astype(np.int64),
+        )
+
+    def predict(self, images: list) -> list:
+        prepared = [self._letterbox(image) for image in images]
+        # Channels reversed like ultralytics does, for the same network input
+        blob = np.stack([canvas[..., ::-1] for canvas, _, _, _ in prepared])
+        blob = blob.transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+
+        if self.dynamic_batch:
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+        else:
+            outputs = np.concatenate(
+                [
+                    self.session.run(None, {self.input_name: blob[i : i + 1]})[0]
+                    for i in range(len(blob))
+                ]
+            )
+
+        return [
+            self._decode(output, ratio, left, top, image.shape)
+            for output, (_, ratio, left, top), image in zip(outputs, prepared, images)
+        ]
+
+
+BACKENDS = {
+    "ultralytics": UltralyticsBackend,
+    "onnx": OnnxBackend,
+}
+
+
+def create_backend(
+    name: str, model_path: str, input_size: int = 640, num_threads: int = 0
+):
+    """Instantiate the detector backend registered under `name`.
+
+    `num_threads` caps its intra-op threads (0 uses every core).
+    """
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown detector backend '{name}', expected one of {sorted(BACKENDS)}"
+        )
+    logger.info(f"Loading {name} detector backend from {model_path}.")
+    return backend_class(model_path, input_size=input_size, num_threads=num_threads)
+
+
+def export_onnx(model_path: str, imgsz: int = 640, int8: bool = False) -> str:
+    """Export YOLO weights to ONNX (dynamic batch), optionally INT8-quantized."""
+    from ultralytics import YOLO
+
+    onnx_path = YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=True)
+    if not int8:
+        return onnx_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export YOLO weights to ONNX.")
+    parser.add_argument("--model", default=os.getenv("YOLO_MODEL_PATH"))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--int8", action="store_true", help="Quantize to INT8.")
+    args = parser.parse_args()
+    print(export_onnx(args.model, imgsz=args.imgsz, int8=args.int8))
@@ -0,0 +1,34 @@
+"""gunicorn settings: worker count and per-worker CPU topology.
+
+gunicorn reads this file when started from this directory. The number of
+workers comes from the CPU topology (cpu_topology.py) unless -w is given
+on the command line, and every worker gets a slot number from 0 that
+stays stable across restarts, so with CPU_AFFINITY=1 a replacement
+worker is pinned to the cores of the one it replaces.
+"""
+
+import itertools
+
+from dotenv import load_dotenv
+
+import cpu_topology
+
+load_dotenv()
+
+topology = cpu_topology.load_topology()
+if topology.workers:
+    workers = topology.workers
+
+# The master imports the app with --preload, so limit the OpenMP/BLAS pools
+# before NumPy or torch are loaded there
+cpu_topology.limit_thread_env(topology)
+
+
+def pre_fork(server, worker):
+    """Give the new worker the lowest slot no live worker holds."""
+    taken = {getattr(w, "cpu_slot", None) for w in server.WORKERS.values()}
+    worker.cpu_slot = next(i for i in itertools.count() if i not in taken)
+
+
+def post_fork(server, worker):
+    cpu_topology.apply(topology, worker.cpu_slot)
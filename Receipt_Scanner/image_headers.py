@@ -0,0 +1,191 @@
+import struct
+from collections import namedtuple
+
+from inference_errors import InvalidImageError, ImageTooLargeError
+
+# Format and pixel dimensions read from the container headers; width and
+# height are None when the headers seen so far do not include them
+ImageInfo = namedtuple("ImageInfo", ["format", "width", "height"])
+
+# JPEG start-of-frame markers that carry the image dimensions
+JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+}
+
+# JPEG markers without a length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7}
+
+# ISO BMFF (HEIF) brands of still images
+HEIF_BRANDS = {
+    b"heic": "heic",
+    b"heix": "heic",
+    b"heim": "heic",
+    b"heis": "heic",
+    b"mif1": "heic",
+    b"msf1": "heic",
+    b"avif": "avif",
+    b"avis": "avif",
+}
+
+# Formats OpenCV decodes, i.e. those accepted as receipts
+DECODABLE_FORMATS = frozenset({"jpeg", "png", "webp", "bmp", "tiff"})
+
+
+def _jpeg_size(data) -> tuple:
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:  # Fill byte
+            offset += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            offset += 2
+            continue
+        if marker in (0xD9, 0xDA):  # End of image / start of scan
+            return None
+        length = struct.unpack(">H", data[offset + 2 : offset + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[offset + 5 : offset + 9])
+            return width, height
+        offset += 2 + length
+    return None
+
+
+def _webp_size(data) -> tuple:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30 and data[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25 and data[20] == 0x2F:
+        bits = struct.unpack("<I", data[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _iter_boxes(data, start: int, end: int):
+    """Yield (type, payload_start, box_end) of the ISO BMFF boxes in a range."""
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[offset : offset + 8])
+        header = 8
+        if size == 1 and offset + 16 <= end:
+            size = struct.unpack(">Q", data[offset + 8 : offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield kind, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _child_boxes(data, start: int, end: int, kind: bytes) -> list:
+    return [(s, e) for k, s, e in _iter_boxes(data, start, end) if k == kind]
+
+
+def _heif_size(data) -> tuple:
+    """Largest `ispe` (image spatial extents) property under meta/iprp/ipco.
+
+    The primary item may be a grid of tiles; its own extents are the largest,
+    which is what matters for the pixel limit.
+    """
+    largest = None
+    for meta_start, meta_end in _child_boxes(data, 0, len(data), b"meta"):
+        # meta is a full box: version and flags precede its children
+        for iprp in _child_boxes(data, meta_start + 4, meta_end, b"iprp"):
+            for ipco in _child_boxes(data, *iprp, b"ipco"):
+                for start, end in _child_boxes(data, *ipco, b"ispe"):
+                    if start + 12 > end:
+                        continue
+                    size = struct.unpack(">II", data[start + 4 : start + 12])
+                    if largest is None or size[0] * size[1] > largest[0] * largest[1]:
+                        largest = size
+    return largest
+
+
+def _tiff_size(data) -> tuple:
+    order = "<" if data[:2] == b"II" else ">"
+    if len(data) < 8:
+        return None
+    ifd = struct.unpack(f"{order}I", data[4:8])[0]
+    if ifd + 2 > len(data):
+        return None
+    count = struct.unpack(f"{order}H", data[ifd : ifd + 2])[0]
+    values = {}
+    for index in range(count):
+        entry = ifd + 2 + index * 12
+        if entry + 12 > len(data):
+            break
+        tag, kind = struct.unpack(f"{order}HH", data[entry : entry + 4])
+        if tag in (256, 257):  # ImageWidth, ImageLength
+            fmt = f"{order}H" if kind == 3 else f"{order}I"
+            values[tag] = struct.unpack_from(fmt, data, entry + 8)[0]
+    if 256 in values and 257 in values:
+        return values[256], values[257]
+    return None
+
+
+def probe_image(data) -> ImageInfo:
+    """Identify an image from its first bytes without decoding any pixels.
+
+    Returns None for data that is not JPEG, PNG, WebP, HEIC/AVIF, GIF, BMP
+    or TIFF. Width and height are None when they are not within `data`
+    (e.g. a JPEG whose metadata is longer than the bytes given).
+    """
+    size = None
+    if data[:3] == b"\xff\xd8\xff":
+        kind = "jpeg"
+        size = _jpeg_size(data)
+    elif data[:8] == b"\x89PNG\r\n\x1a\n":
+        kind = "png"
+        if data[12:16] == b"IHDR" and len(data) >= 24:
+            size = struct.unpack(">II", data[16:24])
+    elif data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        kind = "webp"
+        size = _webp_size(data)
+    elif data[4:8] == b"ftyp" and data[8:12] in HEIF_BRANDS:
+        kind = HEIF_BRANDS[data[8:12]]
+        size = _heif_size(data)
+    elif data[:6] in (b"GIF87a", b"GIF89a"):
+        kind = "gif"
+        if len(data) >= 10:
+            size = struct.unpack("<HH", data[6:10])
+    elif data[:2] == b"BM" and len(data) >= 26:
+        kind = "bmp"
+        width, height = struct.unpack("<ii", data[18:26])
+        size = abs(width), abs(height)  # Negative height: top-down rows
+    elif data[:4] in (b"II*\x00", b"MM\x00*"):
+        kind = "tiff"
+        size = _tiff_size(data)
+    else:
+        return None
+    width, height = size if size else (None, None)
+    return ImageInfo(kind, width, height)
+
+
+def validate_image(data, max_pixels: int, formats=DECODABLE_FORMATS) -> ImageInfo:
+    """Check format and pixel count from the headers, before any decode.
+
+    Raises InvalidImageError for unknown or disallowed formats, for images
+    without readable dimensions and for zero-sized images, and
+    ImageTooLargeError when width * height exceeds `max_pixels`.
+    """
+    info = probe_image(data)
+    if info is None or info.format not in formats:
+        raise InvalidImageError("Invalid image file.")
+    if not info.width or not info.height:
+        raise InvalidImageError("Invalid image file.")
+    if max_pixels and info.width * info.height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is {info.width}x{info.height} pixels; the limit is "
+            f"{max_pixels / 1e6:g} megapixels."
+        )
+    return info
@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+
+from image_headers import probe_image
+
+
+# Decoder downscale factors; JPEG decodes these directly via DCT scaling
+REDUCED_COLOR_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+
+def decode_for_detection(data: bytes, max_side: int, size: tuple = None):
+    """Decode a copy whose longest side is at most `max_side` pixels (BGR).
+
+    Large JPEGs are decoded at 1/2, 1/4 or 1/8 scale by the decoder itself,
+    so the full-resolution frame is never allocated for detection. `size`
+    is the (width, height) from the headers when already known.
+    """
+    flag = cv2.IMREAD_COLOR
+    if size is None:
+        info = probe_image(data)
+        if info is not None and info.width is not None:
+            size = info.width, info.height
+    if size is not None:
+        longest = max(size)
+        for factor, reduced_flag in REDUCED_COLOR_FLAGS.items():
+            if longest / factor >= max_side:
+                flag = reduced_flag
+                break
+
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if image is None:
+        return None
+
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale < 1:
+        image = cv2.resize(
+            image,
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    return image
+
+
+def crop_regions(data: bytes, boxes: list, detect_shape: tuple, margin: float = 1.0):
+    """Crop boxes (in detection-image pixels) from the full-resolution image.
+
+    The full frame is decoded only here, once for all boxes, and only the
+    crops are kept. `margin` pads each box by that many detection pixels to
+    absorb rounding. Returns one crop per box in the same order, or None if
+    the image cannot be decoded.
+    """
+    full = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if full is None:
+        return None
+
+    full_height, full_width = full.shape[:2]
+    scale_x = full_width / detect_shape[1]
+    scale_y = full_height / detect_shape[0]
+    crops = []
+    for box in boxes:
+        x1, y1, x2, y2 = (float(v) for v in box)
+        x1 = max(0, int((x1 - margin) * scale_x))
+        y1 = max(0, int((y1 - margin) * scale_y))
+        x2 = min(full_width, int(round((x2 + margin) * scale_x)))
+        y2 = min(full_height, int(round((y2 + margin) * scale_y)))
+        # Copy so the full frame can be freed as soon as we return
+        crops.append(full[y1:y2, x1:x2].copy())
+    return crops
@@ -0,0 +1,126 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBatcher:
+    """Collects concurrent inference requests into micro-batches.
+
+    `predict_batch` receives a list of images and must return one result per
+    image, in order. A single scheduler thread waits for the first request,
+    then gathers more until `max_batch_size` images are queued or
+    `max_wait_ms` has passed, and runs one batched call for all of them.
+    Requests already queued are always taken, so with `max_wait_ms=0` only
+    work that piled up during the previous call is batched.
+    With the default single worker every call runs on one thread, which also
+    keeps the model single-threaded; remote services can use more `workers`
+    to keep several batches in flight.
+    """
+
+    def __init__(
+        self,
+        predict_batch,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10,
+        name: str = "inference-batcher",
+        workers: int = 1,
+    ):
+        self.predict_batch = predict_batch
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "batched_images": 0,
+            "errors": 0,
+            "max_batch": 0,
+        }
+
+    def _ensure_started(self):
+        # Started lazily so the threads are created after a gunicorn fork
+        if self._threads and all(t.is_alive() for t in self._threads):
+            return
+        with self._start_lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f"{self.name}-{len(self._threads)}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            images = [image for image, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.predict_batch(images)
+                if len(results) != len(images):
+                    raise RuntimeError(
+                        f"Expected {len(images)} results, got {len(results)}."
+                    )
+            except Exception as e:
+                logger.error(f"Batched inference failed: {str(e)}", exc_info=True)
+                with self._stats_lock:
+                    self._stats["errors"] += 1
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["batched_images"] += len(batch)
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def submit(self, image) -> Future:
+        """Queue one image and return a future for its result."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((image, future))
+        with self._stats_lock:
+            self._stats["requests"] += 1
+        return future
+
+    def predict(self, image, timeout: float = None):
+        """Run inference for one image as part of the next micro-batch."""
+        return self.submit(image).result(timeout=timeout)
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000
+        if stats["batches"]:
+            stats["avg_batch"] = round(stats["batched_images"] / stats["batches"], 2)
+        return stats
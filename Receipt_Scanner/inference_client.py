@@ -0,0 +1,247 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+import itertools
+from multiprocessing.connection import Client
+
+from inference_errors import (
+    InvalidImageError,
+    ImageTooLargeError,
+    ModelNotReadyError,
+    ModelPathError,
+    InferenceUnavailableError,
+    InferenceError,
+)
+
+logger = logging.getLogger(__name__)
+
+# Errors reported by the inference worker, mapped back to exception types
+REMOTE_ERRORS = {
+    "invalid_image": InvalidImageError,
+    "image_too_large": ImageTooLargeError,
+    "model_not_ready": ModelNotReadyError,
+    "invalid_model_path": ModelPathError,
+    "error": InferenceError,
+}
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class LocalInference:
+    """Runs detection and OCR in this process.
+
+    `inference_pipeline` (OpenCV, NumPy, the detector backend and the Vision
+    client) is imported on first use rather than at startup, so with
+    MODEL_PRELOAD=background or off the worker starts serving before any of
+    it is loaded.
+    """
+
+    remote = False
+
+    def __init__(self):
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    def pipeline(self):
+        if self._pipeline is None:
+            with self._lock:
+                if self._pipeline is None:
+                    import inference_pipeline
+
+                    self._pipeline = inference_pipeline
+        return self._pipeline
+
+    def start(self, preload: str):
+        """Import the pipeline and load the model per MODEL_PRELOAD."""
+        if preload == "sync":
+            self.pipeline().warm_up("sync")
+        elif preload == "background":
+            threading.Thread(
+                target=lambda: self.pipeline().warm_up("sync"),
+                name="inference-preload",
+                daemon=True,
+            ).start()
+
+    def extract(self, data: bytes, timer, path: str = None) -> dict:
+        """Detect and OCR an upload given as bytes (or None and a file `path`)."""
+        if data is None:
+            with timer("read"):
+                data = read_file(path)
+        return self.pipeline().extract_total_value(data, timer)
+
+    def status(self) -> dict:
+        return self.pipeline().model_registry.status()
+
+    def swap(self, model_path: str = None) -> dict:
+        return self.pipeline().swap_model(model_path)
+
+    def get_stats(self) -> dict:
+        return self.pipeline().get_stats()
+
+    def render_metrics(self) -> str:
+        if self._pipeline is None:
+            return ""
+        return self._pipeline.render_metrics()
+
+
+class RemoteInference:
+    """Client of one or more `inference_worker.py` processes on this host.
+
+    Requests go over Unix sockets (multiprocessing.connection); the image
+    itself never crosses the socket. Receipts already stored on tmpfs are
+    passed by path, other uploads are written once to `handoff_dir` (a
+    tmpfs directory, i.e. shared memory, by default) and read by the worker
+    from there. Several worker addresses are used round-robin. Connections
+    are pooled per address and dropped after fork.
+    """
+
+    remote = True
+
+    def __init__(
+        self,
+        addresses: list,
+        authkey: bytes = None,
+        timeout: float = 120,
+        handoff_dir: str = None,
+    ):
+        self.addresses = list(addresses)
+        self.authkey = authkey
+        self.timeout = timeout
+        self.handoff_dir = handoff_dir or tempfile.gettempdir()
+        os.makedirs(self.handoff_dir, exist_ok=True)
+
+        self._next = itertools.count()
+        self._idle = {address: [] for address in self.addresses}
+        self._lock = threading.Lock()
+
+        # Sockets must not be shared with a forked child
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._idle = {address: [] for address in self.addresses}
+        self._lock = threading.Lock()
+
+    def _connect(self, address: str):
+        with self._lock:
+            if self._idle[address]:
+                return self._idle[address].pop(), True
+        return Client(address, family="AF_UNIX", authkey=self.authkey), False
+
+    def _call(self, request: dict, address: str = None) -> dict:
+        address = address or self.addresses[next(self._next) % len(self.addresses)]
+        for attempt in range(2):
+            try:
+                conn, pooled = self._connect(address)
+            except OSError as e:
+                raise InferenceUnavailableError(
+                    f"Inference worker at {address} unavailable: {str(e)}"
+                )
+            try:
+                conn.send(request)
+                if not conn.poll(self.timeout):
+                    conn.close()
+                    raise InferenceUnavailableError(
+                        f"Inference worker at {address} timed out"
+                    )
+                response = conn.recv()
+            except (OSError, EOFError) as e:
+                conn.close()
+                # A pooled connection may predate a worker restart
+                if pooled and attempt == 0:
+                    continue
+                raise InferenceUnavailableError(
+                    f"Inference worker at {address} unavailable: {str(e)}"
+                )
+            with self._lock:
+                self._idle[address].append(conn)
+            break
+
+        if not response["ok"]:
+            raise REMOTE_ERRORS.get(response["error"], InferenceError)(
+                response["message"]
+            )
+        return response
+
+    def start(self, preload: str):
+        """The worker loads the model itself; log whether it is reachable."""
+        try:
+            self.status()
+        except InferenceUnavailableError as e:
+            logger.error(str(e))
+
+    def extract(self, data: bytes, timer, path: str = None) -> dict:
+        """Detect and OCR an upload given as bytes or as a stored file `path`.
+
+        Stage timings measured by the worker are added to `timer`, plus an
+        "ipc" stage for the time spent outside of them.
+        """
+        handoff = None
+        if path is None:
+            with timer("handoff"):
+                fd, handoff = tempfile.mkstemp(suffix=".img", dir=self.handoff_dir)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+            path = handoff
+        try:
+            start = time.perf_counter()
+            response = self._call({"op": "extract", "path": os.path.abspath(path)})
+            elapsed = time.perf_counter() - start
+        finally:
+            if handoff is not None:
+                os.remove(handoff)
+        worker_seconds = 0.0
+        for name, ms in response["timings"].items():
+            timer.record(name, ms / 1000)
+            worker_seconds += ms / 1000
+        timer.record("ipc", max(0.0, elapsed - worker_seconds))
+        return response["result"]
+
+    def status(self) -> dict:
+        """Model status of every worker; ready when all of them are."""
+        workers = {
+            address: self._call({"op": "status"}, address)["result"]
+            for address in self.addresses
+        }
+        if len(workers) == 1:
+            return next(iter(workers.values()))
+        return {
+            "ready": all(status["ready"] for status in workers.values()),
+            "workers": workers,
+        }
+
+    def swap(self, model_path: str = None) -> dict:
+        """Swap the model of every worker, one after the other."""
+        workers = {}
+        for address in self.addresses:
+            request = {"op": "swap", "model_path": model_path}
+            workers[address] = self._call(request, address)["result"]
+        if len(workers) == 1:
+            return next(iter(workers.values()))
+        return {"workers": workers}
+
+    def get_stats(self) -> dict:
+        """Worker stats; with several workers each section is keyed by address."""
+        stats = {
+            address: self._call({"op": "stats"}, address)["result"]
+            for address in self.addresses
+        }
+        if len(stats) == 1:
+            return next(iter(stats.values()))
+        sections = next(iter(stats.values())).keys()
+        return {
+            section: {address: worker[section] for address, worker in stats.items()}
+            for section in sections
+        }
+
+    def render_metrics(self) -> str:
+        # Only the first worker's: several would repeat the metric families
+        try:
+            return self._call({"op": "metrics"}, self.addresses[0])["result"]
+        except InferenceUnavailableError as e:
+            logger.error(str(e))
+            return ""
@@ -0,0 +1,27 @@
+# Exceptions shared by the web tier and the inference pipeline. They live in
+# their own module so the web tier can catch them without importing OpenCV,
+# NumPy or the detector backends.
+
+
+class InvalidImageError(Exception):
+    """Raised when an upload cannot be decoded as an image."""
+
+
+class ImageTooLargeError(InvalidImageError):
+    """Raised when the image headers declare more pixels than allowed."""
+
+
+class ModelNotReadyError(RuntimeError):
+    """Raised when inference is requested before a model has been loaded."""
+
+
+class ModelPathError(ValueError):
+    """Raised when a model swap names a file outside MODEL_DIR."""
+
+
+class InferenceUnavailableError(RuntimeError):
+    """Raised when the inference worker cannot be reached or times out."""
+
+
+class InferenceError(RuntimeError):
+    """Raised when the inference worker fails to process an image."""
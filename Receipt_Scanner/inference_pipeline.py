@@ -0,0 +1,411 @@
+"""Receipt detection and OCR: the heavy half of the app.
+
+Importing this module loads OpenCV, NumPy and the detector backend and
+creates the model registry, result cache and OCR clients. The web tier
+imports it on first use, or not at all when INFERENCE_SOCKET points it at
+`inference_worker.py` processes instead.
+"""
+
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+import cv2
+from dotenv import load_dotenv
+
+import cpu_topology
+from model_registry import ModelRegistry
+from inference_batcher import InferenceBatcher
+from inference_errors import InvalidImageError, ModelNotReadyError, ModelPathError
+from image_headers import validate_image
+from detector_backends import create_backend, select_best_boxes
+from image_preprocessing import decode_for_detection, crop_regions
+from result_cache import ReceiptResultCache, content_hash, perceptual_hash
+from ocr_client import VisionOCRClient
+from ocr_engines import OCRRouter, VisionEngine, TesseractEngine
+from job_pool import StageTimer
+from metrics import MetricsRegistry
+
+# ------------------------ Configuration ------------------------ #
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Google Credentials Path (used by Google Vision)
+GOOGLE_CREDENTIALS_PATH = os.getenv("GOOGLE_CREDENTIALS_PATH")
+
+# YOLO Model Path
+YOLO_MODEL_PATH = os.getenv("YOLO_MODEL_PATH")
+
+# /admin/model/swap only loads weights from this directory (default: the
+# directory of YOLO_MODEL_PATH)
+MODEL_DIR = os.getenv("MODEL_DIR") or os.path.dirname(YOLO_MODEL_PATH or "") or "."
+
+# Detector backend ("ultralytics" or "onnx") and its input size; for "onnx"
+# point YOLO_MODEL_PATH at the file written by detector_backends.py
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "ultralytics")
+DETECTOR_INPUT_SIZE = int(os.getenv("DETECTOR_INPUT_SIZE", "640"))
+
+# Threads of torch/ONNX Runtime and OpenCV in this process (CPU_TOPOLOGY_FILE
+# with CPU_* overrides; the defaults use every core)
+CPU_TOPOLOGY = cpu_topology.load_topology()
+
+# Longest side of the reduced-resolution copy that detection runs on
+DETECT_MAX_SIDE = int(os.getenv("DETECT_MAX_SIDE", str(DETECTOR_INPUT_SIZE)))
+
+# Images declaring more pixels than this in their headers are never decoded
+MAX_IMAGE_PIXELS = int(float(os.getenv("MAX_IMAGE_MEGAPIXELS", "64")) * 1_000_000)
+
+# Detection + OCR results cached by upload content (memory LRU + shared disk)
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "./tmp/result_cache.sqlite3")
+RESULT_CACHE_MEMORY_ENTRIES = int(os.getenv("RESULT_CACHE_MEMORY_ENTRIES", "512"))
+RESULT_CACHE_DISK_ENTRIES = int(os.getenv("RESULT_CACHE_DISK_ENTRIES", "20000"))
+
+# Also match re-encoded duplicates by perceptual hash (off by default, since
+# two similar-looking receipts could share a hash)
+RESULT_CACHE_PHASH = os.getenv("RESULT_CACHE_PHASH", "0") == "1"
+RESULT_CACHE_PHASH_DISTANCE = int(os.getenv("RESULT_CACHE_PHASH_DISTANCE", "2"))
+
+# Google Vision OCR: crop encoding and batching of concurrent crops
+OCR_IMAGE_FORMAT = os.getenv("OCR_IMAGE_FORMAT", "jpeg")
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "95"))
+OCR_PNG_COMPRESSION = int(os.getenv("OCR_PNG_COMPRESSION", "1"))
+OCR_MAX_BATCH = int(os.getenv("OCR_MAX_BATCH", "16"))
+OCR_MAX_WAIT_MS = float(os.getenv("OCR_MAX_WAIT_MS", "0"))
+
+# OCR routing: remote_only (Vision), local_only (Tesseract), local_first
+# (Vision below OCR_MIN_CONFIDENCE) or remote_first (Tesseract on timeout)
+OCR_POLICY = os.getenv("OCR_POLICY", "remote_only")
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "0.6"))
+OCR_REMOTE_TIMEOUT = float(os.getenv("OCR_REMOTE_TIMEOUT", "5"))
+# Fraction of crops also read by the other engine to measure agreement
+OCR_COMPARE_RATE = float(os.getenv("OCR_COMPARE_RATE", "0"))
+TESSERACT_LANG = os.getenv("TESSERACT_LANG", "eng")
+TESSERACT_CMD = os.getenv("TESSERACT_CMD")
+# Detected fields to OCR besides total_value (comma separated class names,
+# e.g. "date,merchant"); all crops of an upload go out in one OCR call
+OCR_FIELDS = ["total_value"] + [
+    label.strip()
+    for label in os.getenv("OCR_FIELDS", "").split(",")
+    if label.strip() and label.strip() != "total_value"
+]
+
+# Dummy inference passes run before a model is marked ready
+MODEL_WARMUP_RUNS = int(os.getenv("MODEL_WARMUP_RUNS", "1"))
+MODEL_WARMUP_SIZE = int(os.getenv("MODEL_WARMUP_SIZE", "640"))
+
+# Micro-batching of concurrent /upload_file detections
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+
+logger = logging.getLogger(__name__)
+
+# ------------------------ Metrics ------------------------ #
+
+# Rendered after the web tier's own metrics by /metrics (fetched from the
+# inference worker when there is one)
+metrics = MetricsRegistry()
+inference_call_seconds = metrics.histogram(
+    "receipt_inference_call_duration_seconds",
+    "Duration of detection and OCR calls.",
+    ("call",),
+)
+inference_in_flight = metrics.gauge(
+    "receipt_inference_calls_in_flight",
+    "Detection and OCR calls in progress.",
+    ("call",),
+)
+inference_errors = metrics.counter(
+    "receipt_inference_call_errors_total",
+    "Failed detection and OCR calls, by exception type.",
+    ("call", "error"),
+)
+inference_queue_depth = metrics.gauge(
+    "receipt_inference_queue_depth",
+    "Images waiting for a detection or OCR batch (sampled on scrape).",
+    ("queue",),
+)
+
+
+@contextmanager
+def timed_call(call: str):
+    """Time a detection or OCR call and count its failures."""
+    inference_in_flight.inc(call=call)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        inference_errors.inc(call=call, error=type(e).__name__)
+        raise
+    finally:
+        inference_in_flight.dec(call=call)
+        inference_call_seconds.observe(time.perf_counter() - start, call=call)
+
+
+def render_metrics() -> str:
+    """Inference metrics in the Prometheus text format."""
+    inference_queue_depth.set(inference_batcher.get_stats()["queued"], queue="detect")
+    inference_queue_depth.set(ocr_client.get_stats()["queued"], queue="ocr")
+    return metrics.render()
+
+
+# ------------------------ Helper Functions ------------------------ #
+
+
+def set_google_credentials(json_path: str):
+    """Set the environment variable for Google Cloud credentials."""
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(f"Google credentials file not found at {json_path}")
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = json_path
+
+
+def load_model(model_path: str):
+    """Load the YOLO model with the configured detector backend."""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"YOLO model file not found at {model_path}")
+    model = create_backend(
+        DETECTOR_BACKEND,
+        model_path,
+        DETECTOR_INPUT_SIZE,
+        num_threads=CPU_TOPOLOGY.threads or 0,
+    )
+    # torch is only imported by the backend; size its inter-op pool now
+    cpu_topology.apply_thread_limits(CPU_TOPOLOGY)
+    return model
+
+
+def get_class_names(model) -> dict:
+    """Retrieve class names from the YOLO model."""
+    if hasattr(model, "names"):
+        return model.names
+    elif hasattr(model, "model") and hasattr(model.model, "names"):
+        return model.model.names
+    else:
+        raise AttributeError("Cannot find class names in the YOLO model.")
+
+
+def run_model_batch(images: list) -> list:
+    """Run one batched YOLO call; pair each result with the model's names."""
+    model, class_names = model_registry.get()
+    results = model(images)
+    return [(result, class_names) for result in results]
+
+
+def result_cache_namespace() -> str:
+    """Cached results are only reused for the model file that produced them."""
+    model_path = model_registry.status()["model_path"] or YOLO_MODEL_PATH or ""
+    try:
+        mtime = os.path.getmtime(model_path)
+    except OSError:
+        mtime = 0
+    fields = ",".join(OCR_FIELDS)
+    return f"{DETECTOR_BACKEND}:{os.path.abspath(model_path)}:{mtime}:{fields}"
+
+
+def extract_total_value(file_bytes: bytes, timer: StageTimer = None) -> dict:
+    """Detect the total_value region and OCR it, reusing cached results.
+
+    Returns the detected box (normalized xyxy, or None), its confidence and
+    the extracted text, plus `fields`: the best box and confidence of every
+    detected class, with the text of those listed in OCR_FIELDS. Cache hits
+    skip both inference and OCR. `timer` records the time spent in each
+    stage.
+    """
+    timer = timer or StageTimer()
+    namespace = result_cache_namespace()
+    with timer("cache"):
+        key = content_hash(file_bytes)
+        cached = result_cache.get(namespace, key)
+    if cached is not None:
+        return cached
+
+    # Format and pixel count come from the headers alone, so a
+    # decompression bomb is rejected before the decoder allocates anything
+    with timer("validate"):
+        info = validate_image(file_bytes, MAX_IMAGE_PIXELS)
+
+    # Decode only a detector-sized copy; the full frame is decoded later
+    # just to crop the detected region
+    with timer("decode"):
+        image = decode_for_detection(
+            file_bytes, DETECT_MAX_SIDE, (info.width, info.height)
+        )
+    if image is None:
+        raise InvalidImageError("Invalid image file.")
+
+    phash = perceptual_hash(image) if RESULT_CACHE_PHASH else None
+    if phash is not None:
+        with timer("cache"):
+            cached = result_cache.get_similar(namespace, phash)
+        if cached is not None:
+            return cached
+    result_cache.record_miss()
+
+    # The model is loaded at startup (or replaced by a hot swap)
+    if not model_registry.ready:
+        raise ModelNotReadyError("YOLO model is not loaded yet.")
+
+    with timer("detect"), timed_call("detect"):
+        img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        detections, class_names = inference_batcher.predict(img_rgb)
+        detected = select_best_boxes([detections], class_names)
+
+    height, width = image.shape[:2]
+    total = detected.get("total_value")
+    result = {
+        "box": None,
+        "confidence": total.confidence if total is not None else 0.0,
+        "extracted_text": None,
+        "fields": {
+            label: {
+                "box": [
+                    round(float(value) / size, 5)
+                    for value, size in zip(field.box, (width, height, width, height))
+                ],
+                "confidence": field.confidence,
+                "text": None,
+            }
+            for label, field in detected.items()
+        },
+    }
+
+    # Without a total the upload fails, so the other fields are not read
+    labels = [label for label in OCR_FIELDS if label in detected]
+    if total is not None:
+        with timer("crop"):
+            crops = crop_regions(
+                file_bytes, [detected[label].box for label in labels], image.shape
+            )
+        crops = [
+            (label, cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+            for label, crop in zip(labels, crops or [])
+            if crop.size
+        ]
+        if crops:
+            with timer("ocr"):
+                texts = extract_texts_from_images([crop for _, crop in crops])
+            for (label, _), text in zip(crops, texts):
+                result["fields"][label]["text"] = text
+        if result["fields"]["total_value"]["text"] is not None:
+            result["box"] = result["fields"]["total_value"]["box"]
+            result["extracted_text"] = result["fields"]["total_value"]["text"]
+
+    result_cache.put(namespace, key, result, phash)
+    return result
+
+
+def extract_texts_from_images(cropped_images: list) -> list:
+    """Extract the text of several crops of one receipt in a single OCR pass."""
+    with timed_call("ocr"):
+        results = ocr_router.recognize_many(cropped_images)
+    return [result.text for result in results]
+
+
+def get_stats() -> dict:
+    """Counters of the detection batcher, OCR engines and result cache."""
+    return {
+        "inference": inference_batcher.get_stats(),
+        "ocr": {"vision": ocr_client.get_stats(), "router": ocr_router.get_stats()},
+        "result_cache": result_cache.get_stats(),
+        "cpu": dict(cpu_topology.describe(), topology=CPU_TOPOLOGY.to_dict()),
+    }
+
+
+def resolve_model_path(model_path: str) -> str:
+    """The real path of `model_path`, which must be a file inside MODEL_DIR."""
+    model_dir = os.path.realpath(MODEL_DIR)
+    path = os.path.realpath(model_path)
+    if os.path.commonpath([path, model_dir]) != model_dir:
+        raise ModelPathError(f"Model path must be inside {MODEL_DIR}.")
+    if not os.path.isfile(path):
+        raise ModelPathError(f"Model file not found: {model_path}")
+    return path
+
+
+def swap_model(model_path: str = None) -> dict:
+    """Load new weights (YOLO_MODEL_PATH by default) and switch to them.
+
+    A requested `model_path` is resolved (symlinks included) and rejected
+    unless it is a file inside MODEL_DIR.
+    """
+    if model_path:
+        model_path = resolve_model_path(model_path)
+    model_registry.load(model_path or YOLO_MODEL_PATH)
+    return model_registry.status()
+
+
+def warm_up(preload: str = "sync"):
+    """Load the YOLO model: "sync" (now), "background" or "off"."""
+    if preload == "sync":
+        try:
+            model_registry.load(YOLO_MODEL_PATH)
+        except Exception:
+            pass  # Logged by the registry; /readyz stays unhealthy
+    elif preload == "background":
+        model_registry.load_in_background(YOLO_MODEL_PATH)
+
+
+# ------------------------ Startup ------------------------ #
+
+cpu_topology.apply_thread_limits(CPU_TOPOLOGY)
+
+try:
+    set_google_credentials(GOOGLE_CREDENTIALS_PATH)
+except (FileNotFoundError, TypeError) as e:
+    logger.error(f"Google credentials not set: {str(e)}")
+
+# Active YOLO model, loaded and warmed up before requests need it
+model_registry = ModelRegistry(
+    load_model,
+    get_class_names,
+    warmup_runs=MODEL_WARMUP_RUNS,
+    warmup_size=MODEL_WARMUP_SIZE,
+)
+
+# Results of previous uploads, shared by all workers on this host
+result_cache = ReceiptResultCache(
+    RESULT_CACHE_PATH,
+    max_memory_entries=RESULT_CACHE_MEMORY_ENTRIES,
+    max_disk_entries=RESULT_CACHE_DISK_ENTRIES,
+    phash_distance=RESULT_CACHE_PHASH_DISTANCE,
+)
+
+# One Vision channel per process; pending crops share batch_annotate_images
+ocr_client = VisionOCRClient(
+    image_format=OCR_IMAGE_FORMAT,
+    jpeg_quality=OCR_JPEG_QUALITY,
+    png_compression=OCR_PNG_COMPRESSION,
+    max_batch=OCR_MAX_BATCH,
+    max_wait_ms=OCR_MAX_WAIT_MS,
+)
+
+
+def create_ocr_router() -> OCRRouter:
+    """Build the OCR router, falling back to Vision only without Tesseract."""
+    policy = OCR_POLICY
+    local = None
+    if policy != "remote_only" or OCR_COMPARE_RATE > 0:
+        try:
+            local = TesseractEngine(lang=TESSERACT_LANG, tesseract_cmd=TESSERACT_CMD)
+        except Exception as e:
+            logger.error(f"Local OCR unavailable, using Vision only: {str(e)}")
+            policy = "remote_only"
+    return OCRRouter(
+        policy,
+        VisionEngine(ocr_client),
+        local=local,
+        min_confidence=OCR_MIN_CONFIDENCE,
+        remote_timeout=OCR_REMOTE_TIMEOUT,
+        compare_rate=OCR_COMPARE_RATE,
+    )
+
+
+ocr_router = create_ocr_router()
+
+# Concurrent uploads share one batched YOLO call per micro-batch
+inference_batcher = InferenceBatcher(
+    run_model_batch,
+    max_batch_size=INFERENCE_MAX_BATCH,
+    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+)
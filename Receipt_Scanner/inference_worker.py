@@ -0,0 +1,153 @@
+"""Inference worker: runs detection and OCR for web processes on this host.
+
+The web tier (app.py with INFERENCE_SOCKET set) then never imports OpenCV,
+the detector backend or the Vision client, so its workers start quickly and
+stay small, while the model is loaded once here instead of once per web
+worker. Requests arrive over a Unix socket (multiprocessing.connection);
+images are not sent over it but read from the tmpfs or disk file the web
+tier names. Run one or more workers next to the web server:
+
+    python inference_worker.py --socket /tmp/receipt_inference.sock
+    INFERENCE_SOCKET=/tmp/receipt_inference.sock gunicorn -w 8 app:app
+
+With several workers, give each a --cpu-slot so the CPU topology
+(cpu_topology.py) pins them to different cores.
+"""
+
+import os
+import logging
+import argparse
+import threading
+from multiprocessing.connection import Listener, AuthenticationError
+
+from dotenv import load_dotenv
+
+import cpu_topology
+from inference_client import LocalInference
+from inference_errors import (
+    InvalidImageError,
+    ImageTooLargeError,
+    ModelNotReadyError,
+    ModelPathError,
+)
+from job_pool import StageTimer
+
+logger = logging.getLogger(__name__)
+
+
+def handle(request: dict, inference: LocalInference) -> dict:
+    """Run one request; errors are returned, not raised, to the web tier."""
+    op = request.get("op")
+    try:
+        if op == "extract":
+            timer = StageTimer()
+            result = inference.extract(None, timer, path=request["path"])
+            return {"ok": True, "result": result, "timings": timer.timings}
+        if op == "status":
+            return {"ok": True, "result": inference.status()}
+        if op == "swap":
+            return {"ok": True, "result": inference.swap(request.get("model_path"))}
+        if op == "stats":
+            return {"ok": True, "result": inference.get_stats()}
+        if op == "metrics":
+            return {"ok": True, "result": inference.render_metrics()}
+        return {"ok": False, "error": "error", "message": f"Unknown op '{op}'"}
+    except ImageTooLargeError as e:
+        return {"ok": False, "error": "image_too_large", "message": str(e)}
+    except InvalidImageError as e:
+        return {"ok": False, "error": "invalid_image", "message": str(e)}
+    except ModelNotReadyError as e:
+        return {"ok": False, "error": "model_not_ready", "message": str(e)}
+    except ModelPathError as e:
+        return {"ok": False, "error": "invalid_model_path", "message": str(e)}
+    except Exception as e:
+        logger.error(f"Inference request '{op}' failed: {str(e)}", exc_info=True)
+        return {"ok": False, "error": "error", "message": str(e)}
+
+
+def serve_connection(conn, inference: LocalInference):
+    """Answer the requests of one web-tier connection until it closes."""
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            response = handle(request, inference)
+            try:
+                conn.send(response)
+            except (EOFError, OSError) as e:
+                # The web tier gave up (timeout) and closed its end
+                logger.warning(
+                    f"Inference client left before the '{request.get('op')}'"
+                    f" response was sent: {str(e)}"
+                )
+                return
+
+
+def serve(listener: Listener, inference: LocalInference):
+    """Accept connections forever, one thread per connection.
+
+    Concurrent requests share the detection micro-batcher and the Vision
+    batcher, exactly as concurrent requests of an in-process web worker do.
+    """
+    while True:
+        try:
+            conn = listener.accept()
+        except AuthenticationError as e:
+            logger.warning(f"Rejected inference connection: {str(e)}")
+            continue
+        except OSError:
+            return  # Listener closed
+        threading.Thread(
+            target=serve_connection,
+            args=(conn, inference),
+            name="inference-connection",
+            daemon=True,
+        ).start()
+
+
+def create_listener(address: str, authkey: bytes = None) -> Listener:
+    """Bind a Unix socket readable only by this user, replacing a stale one."""
+    if os.path.exists(address):
+        os.remove(address)
+    old_umask = os.umask(0o077)
+    try:
+        return Listener(address, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(old_umask)
+
+
+def main():
+    load_dotenv()
+    sockets = os.getenv("INFERENCE_SOCKET") or "/tmp/receipt_inference.sock"
+    parser = argparse.ArgumentParser(description="Receipt inference worker.")
+    parser.add_argument("--socket", default=sockets.split(",")[0].strip())
+    parser.add_argument(
+        "--preload",
+        default=os.getenv("MODEL_PRELOAD", "sync"),
+        choices=("sync", "background", "off"),
+    )
+    parser.add_argument(
+        "--cpu-slot",
+        type=int,
+        help="Worker number from 0; pins the worker when CPU_AFFINITY is on.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Before the pipeline imports NumPy, OpenCV and the detector backend
+    cpu_topology.apply(cpu_topology.load_topology(), args.cpu_slot)
+    authkey = os.getenv("INFERENCE_AUTHKEY")
+    listener = create_listener(args.socket, authkey.encode() if authkey else None)
+    inference = LocalInference()
+    inference.start(args.preload)
+    logger.info(f"Inference worker listening on {args.socket}")
+    try:
+        serve(listener, inference)
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("done", "failed")
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is full and the upload should be retried."""
+
+
+class JobError(Exception):
+    """Expected job failure, reported to the client with `status_code`."""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StageTimer:
+    """Records how long each named stage of a job takes, in milliseconds.
+
+    `on_stage` is called with the stage name when a stage starts, so the
+    job status can show where a job currently is; `observe` is called with
+    the stage name and its duration in seconds when it ends.
+    """
+
+    def __init__(self, on_stage=None, observe=None):
+        self.timings = {}
+        self.on_stage = on_stage
+        self.observe = observe
+
+    @contextmanager
+    def __call__(self, name: str):
+        if self.on_stage is not None:
+            self.on_stage(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        """Add a stage measured elsewhere, e.g. by the inference worker."""
+        self.timings[name] = round(self.timings.get(name, 0) + seconds * 1000, 2)
+        if self.observe is not None:
+            self.observe(name, seconds)
+
+
+class JobStore:
+    """Job status table in SQLite, readable from every gunicorn worker.
+
+    A job is processed by the worker that accepted it, but the client may
+    poll any worker, so status, result and timings live in a shared file.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        # SQLite handles do not survive fork (gunicorn --preload)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " stage TEXT,"
+                " result_json TEXT,"
+                " error TEXT,"
+                " status_code INTEGER,"
+                " timings_json TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    def _after_fork(self):
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id: str):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at)"
+                " VALUES (?, 'queued', ?, ?)",
+                (job_id, now, now),
+            )
+
+    def update(self, job_id: str, **fields):
+        """Set columns of one job; `result` and `timings` are stored as JSON."""
+        for name in ("result", "timings"):
+            if name in fields:
+                fields[f"{name}_json"] = json.dumps(fields.pop(name))
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+
+    def get(self, job_id: str):
+        """Return the job as a dict, or None if it is unknown or expired."""
+        row = (
+            self._connect()
+            .execute(
+                "SELECT status, stage, result_json, error, status_code,"
+                " timings_json, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        status, stage, result, error, status_code, timings, created, updated = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "stage": stage,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "status_code": status_code,
+            "timings_ms": json.loads(timings) if timings else {},
+            "created_at": created,
+            "updated_at": updated,
+        }
+
+    def delete(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def purge(self, older_than: float) -> int:
+        """Delete jobs last updated more than `older_than` seconds ago."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE updated_at < ?", (time.time() - older_than,)
+            )
+        return cursor.rowcount
+
+
+class JobPool:
+    """Bounded pool of worker threads processing jobs from a bounded queue.
+
+    `handler(payload, timer)` does the work and returns a JSON-serializable
+    result; it may raise JobError for failures the client should see as-is.
+    submit() raises QueueFullError instead of blocking when `max_queue`
+    jobs are already waiting, so callers can answer 429. `observe_stage` is
+    passed to every job's StageTimer.
+    """
+
+    def __init__(
+        self,
+        handler,
+        store: JobStore,
+        workers: int = 4,
+        max_queue: int = 16,
+        result_ttl: float = 3600,
+        on_discard=None,
+        observe_stage=None,
+    ):
+        self.handler = handler
+        self.store = store
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self.on_discard = on_discard
+        self.observe_stage = observe_stage
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._running = 0
+        self._stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0}
+
+        # Worker threads do not survive fork; they restart on the next submit
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._running = 0
+
+    def _ensure_workers(self):
+        if len(self._threads) == self.workers:
+            return
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f"job-worker-{len(self._threads)}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        try:
+            self.store.purge(self.result_ttl)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to purge expired jobs: {str(e)}")
+
+    def submit(self, payload) -> str:
+        """Queue a job and return its id without waiting for it to run."""
+        self._ensure_workers()
+        self._purge_expired()
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id)
+        try:
+            self._queue.put_nowait((job_id, payload, time.perf_counter()))
+        except queue.Full:
+            self.store.delete(job_id)
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise QueueFullError(f"{self.max_queue} jobs are already waiting.")
+        with self._lock:
+            self._stats["submitted"] += 1
+        return job_id
+
+    def _process(self, job_id: str, payload, enqueued: float):
+        timer = StageTimer(
+            on_stage=lambda name: self.store.update(job_id, stage=name),
+            observe=self.observe_stage,
+        )
+        timer.timings["queued"] = round((time.perf_counter() - enqueued) * 1000, 2)
+        self.store.update(job_id, status="running")
+        try:
+            result = self.handler(payload, timer)
+        except Exception as e:
+            if isinstance(e, JobError):
+                message, status_code = str(e), e.status_code
+            else:
+                logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+                message, status_code = "Error processing image.", 500
+            if self.on_discard is not None:
+                self.on_discard(payload)
+            self.store.update(
+                job_id,
+                status="failed",
+                stage=None,
+                error=message,
+                status_code=status_code,
+                timings=timer.timings,
+            )
+            return "failed"
+        self.store.update(
+            job_id,
+            status="done",
+            stage=None,
+            result=result,
+            status_code=200,
+            timings=timer.timings,
+        )
+        return "done"
+
+    def _run(self):
+        while True:
+            job_id, payload, enqueued = self._queue.get()
+            with self._lock:
+                self._running += 1
+            try:
+                outcome = self._process(job_id, payload, enqueued)
+            except Exception as e:
+                # Only reached if the job store itself fails
+                logger.error(f"Job {job_id} could not be recorded: {str(e)}")
+                outcome = "failed"
+            with self._lock:
+                self._running -= 1
+                self._stats[outcome] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["running"] = self._running
+        stats["queued"] = self._queue.qsize()
+        stats["workers"] = self.workers
+        stats["max_queue"] = self.max_queue
+        return stats
@@ -0,0 +1,183 @@
+import os
+import logging
+import threading
+
+import cv2
+
+from inference_batcher import InferenceBatcher
+
+logger = logging.getLogger(__name__)
+
+# batch_annotate_images accepts at most 16 images per request
+VISION_MAX_BATCH = 16
+
+
+class OCRError(Exception):
+    """Raised when Google Vision reports an error for an image."""
+
+
+def default_client_factory():
+    from google.cloud import vision
+
+    return vision.ImageAnnotatorClient()
+
+
+def default_async_client_factory():
+    from google.cloud import vision
+
+    return vision.ImageAnnotatorAsyncClient()
+
+
+class VisionOCRClient:
+    """Long-lived Google Vision text detection client.
+
+    One ImageAnnotatorClient (one gRPC channel) is created per process and
+    reused for every crop. Crops of concurrent uploads are coalesced into
+    batch_annotate_images calls by a micro-batcher, with up to
+    `max_in_flight` requests outstanding; `max_batch=1` sends each crop on
+    its own from the calling thread instead.
+    """
+
+    def __init__(
+        self,
+        image_format: str = "jpeg",
+        jpeg_quality: int = 95,
+        png_compression: int = 1,
+        max_batch: int = VISION_MAX_BATCH,
+        max_wait_ms: float = 0,
+        max_in_flight: int = 4,
+        timeout: float = None,
+        client_factory=default_client_factory,
+        async_client_factory=default_async_client_factory,
+    ):
+        if image_format not in ("jpeg", "png"):
+            raise ValueError(f"Unsupported OCR image format '{image_format}'")
+        self.image_format = image_format
+        self.jpeg_quality = jpeg_quality
+        self.png_compression = png_compression
+        self.max_batch = max(1, min(max_batch, VISION_MAX_BATCH))
+        self.timeout = timeout
+        self.client_factory = client_factory
+        self.async_client_factory = async_client_factory
+
+        self._client = None
+        self._async_client = None
+        self._client_lock = threading.Lock()
+        self._batcher = InferenceBatcher(
+            self._annotate,
+            max_batch_size=self.max_batch,
+            max_wait_ms=max_wait_ms,
+            name="ocr-batcher",
+            workers=max_in_flight,
+        )
+
+        # gRPC channels must not be reused across fork
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._client = None
+        self._async_client = None
+        self._client_lock = threading.Lock()
+
+    # ------------------------ Encoding ------------------------ #
+
+    def encode(self, image) -> bytes:
+        """Encode a crop with the configured format and quality."""
+        if self.image_format == "jpeg":
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+            ok, encoded = cv2.imencode(".jpg", image, params)
+        else:
+            params = [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+            ok, encoded = cv2.imencode(".png", image, params)
+        if not ok:
+            raise OCRError("Failed to encode the cropped image.")
+        return encoded.tobytes()
+
+    # ------------------------ Vision calls ------------------------ #
+
+    def client(self):
+        """Return this process's shared ImageAnnotatorClient."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.client_factory()
+        return self._client
+
+    @staticmethod
+    def _build_requests(contents: list) -> list:
+        from google.cloud import vision
+
+        feature = vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)
+        return [
+            vision.AnnotateImageRequest(
+                image=vision.Image(content=content), features=[feature]
+            )
+            for content in contents
+        ]
+
+    @staticmethod
+    def _parse(response):
+        """Return the full text of one response, or an OCRError."""
+        if response.error.message:
+            return OCRError(response.error.message)
+        texts = response.text_annotations
+        return texts[0].description if texts else ""
+
+    def _annotate(self, contents: list, timeout: float = None) -> list:
+        timeout = timeout or self.timeout
+        kwargs = {"timeout": timeout} if timeout else {}
+        response = self.client().batch_annotate_images(
+            requests=self._build_requests(contents), **kwargs
+        )
+        return [self._parse(r) for r in response.responses]
+
+    def text(self, image, timeout: float = None) -> str:
+        """OCR one crop; it may share a Vision request with concurrent crops.
+
+        `timeout` bounds the wait for this crop's result; on expiry a
+        concurrent.futures.TimeoutError is raised.
+        """
+        content = self.encode(image)
+        if self.max_batch == 1:
+            timeout = timeout or self.timeout
+            kwargs = {"timeout": timeout} if timeout else {}
+            response = self.client().batch_annotate_images(
+                requests=self._build_requests([content]), **kwargs
+            )
+            result = self._parse(response.responses[0])
+        else:
+            result = self._batcher.predict(content, timeout=timeout)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def texts(self, images: list, timeout: float = None) -> list:
+        """OCR several crops of one upload in as few Vision requests as possible."""
+        contents = [self.encode(image) for image in images]
+        results = []
+        for start in range(0, len(contents), self.max_batch):
+            batch = contents[start : start + self.max_batch]
+            results.extend(self._annotate(batch, timeout))
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    async def text_async(self, image) -> str:
+        """OCR one crop with the asyncio Vision client (for async callers)."""
+        if self._async_client is None:
+            self._async_client = self.async_client_factory()
+        kwargs = {"timeout": self.timeout} if self.timeout else {}
+        response = await self._async_client.batch_annotate_images(
+            requests=self._build_requests([self.encode(image)]), **kwargs
+        )
+        result = self._parse(response.responses[0])
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def get_stats(self) -> dict:
+        stats = self._batcher.get_stats()
+        stats["image_format"] = self.image_format
+        stats["client_ready"] = self._client is not None
+        return stats
@@ -0,0 +1,271 @@
+import re
+import time
+import random
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# confidence is in [0, 1], or None when the engine does not report one
+OCRResult = namedtuple("OCRResult", ["text", "confidence", "engine"])
+
+POLICIES = ("remote_only", "local_only", "local_first", "remote_first")
+
+
+def normalize_amount(text: str) -> str:
+    """Digits only, which is what matters when comparing total values."""
+    return re.sub(r"\D", "", text or "")
+
+
+class OCREngine:
+    """Base class for OCR backends run on the cropped total_value region."""
+
+    name = "base"
+
+    def recognize(self, image, timeout: float = None) -> OCRResult:
+        raise NotImplementedError
+
+    def recognize_many(self, images: list, timeout: float = None) -> list:
+        """Read several crops; engines that can batch them override this."""
+        return [self.recognize(image, timeout=timeout) for image in images]
+
+
+class VisionEngine(OCREngine):
+    """Google Cloud Vision through the shared VisionOCRClient."""
+
+    name = "vision"
+
+    def __init__(self, client):
+        self.client = client
+
+    def recognize(self, image, timeout: float = None) -> OCRResult:
+        return OCRResult(self.client.text(image, timeout=timeout), None, self.name)
+
+    def recognize_many(self, images: list, timeout: float = None) -> list:
+        texts = self.client.texts(images, timeout=timeout)
+        return [OCRResult(text, None, self.name) for text in texts]
+
+
+class TesseractEngine(OCREngine):
+    """Local CPU OCR with Tesseract (requires pytesseract and the binary)."""
+
+    name = "tesseract"
+
+    def __init__(self, lang: str = "eng", psm: int = 6, tesseract_cmd: str = None):
+        import pytesseract
+
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        # Fail at startup, not on the first upload, if the binary is missing
+        pytesseract.get_tesseract_version()
+        self.pytesseract = pytesseract
+        self.config = f"--psm {psm}"
+        self.lang = lang
+
+    def recognize(self, image, timeout: float = None) -> OCRResult:
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        data = self.pytesseract.image_to_data(
+            binary,
+            lang=self.lang,
+            config=self.config,
+            timeout=timeout or 0,
+            output_type=self.pytesseract.Output.DICT,
+        )
+        words, confidences = [], []
+        for word, conf in zip(data["text"], data["conf"]):
+            if word.strip() and float(conf) >= 0:
+                words.append(word.strip())
+                confidences.append(float(conf) / 100)
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return OCRResult(" ".join(words), confidence, self.name)
+
+
+class OCRRouter:
+    """Chooses between a local and a remote OCR engine.
+
+    Policies:
+      remote_only  - Vision only (the original behaviour).
+      local_only   - local engine only.
+      local_first  - local engine; Vision when the local confidence is below
+                     `min_confidence` or the local engine fails.
+      remote_first - Vision with `remote_timeout`; local engine on timeout
+                     or error.
+    Latency and errors are recorded per engine. Whenever both engines read
+    the same crop (a fallback, or a `compare_rate` shadow run in the
+    background) their digits are compared to track agreement.
+    """
+
+    def __init__(
+        self,
+        policy: str,
+        remote: OCREngine,
+        local: OCREngine = None,
+        min_confidence: float = 0.6,
+        remote_timeout: float = 5.0,
+        compare_rate: float = 0.0,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown OCR policy '{policy}', expected {POLICIES}")
+        if policy != "remote_only" and local is None:
+            raise ValueError(f"OCR policy '{policy}' needs a local engine")
+        self.policy = policy
+        self.remote = remote
+        self.local = local
+        self.min_confidence = min_confidence
+        self.remote_timeout = remote_timeout
+        self.compare_rate = compare_rate if local is not None else 0.0
+
+        self._shadow_pool = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ocr-shadow"
+        )
+        self._lock = threading.Lock()
+        self._engine_stats = {}
+        self._stats = {"requests": 0, "fallbacks": 0, "compared": 0, "agreed": 0}
+
+    # ------------------------ Metrics ------------------------ #
+
+    def _record(self, engine: OCREngine, seconds: float, outcome: str):
+        with self._lock:
+            stats = self._engine_stats.setdefault(
+                engine.name,
+                {
+                    "calls": 0,
+                    "errors": 0,
+                    "timeouts": 0,
+                    "seconds": 0.0,
+                    "max_seconds": 0.0,
+                },
+            )
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            if outcome != "ok":
+                stats[outcome] += 1
+
+    def _compare(self, first: OCRResult, second: OCRResult):
+        agreed = normalize_amount(first.text) == normalize_amount(second.text)
+        with self._lock:
+            self._stats["compared"] += 1
+            self._stats["agreed"] += int(agreed)
+        if not agreed:
+            logger.info(
+                f"OCR disagreement: {first.engine}={first.text!r} "
+                f"{second.engine}={second.text!r}"
+            )
+
+    def _run(self, engine: OCREngine, image, timeout: float = None) -> OCRResult:
+        return self._timed(engine, engine.recognize, image, timeout)
+
+    def _run_many(self, engine: OCREngine, images: list, timeout: float = None):
+        return self._timed(engine, engine.recognize_many, images, timeout)
+
+    def _timed(self, engine: OCREngine, method, images, timeout: float = None):
+        start = time.perf_counter()
+        try:
+            result = method(images, timeout=timeout)
+        except Exception as e:
+            # The batcher raises TimeoutError, a direct gRPC call DeadlineExceeded
+            timed_out = isinstance(e, FutureTimeout) or (
+                type(e).__name__ == "DeadlineExceeded"
+            )
+            outcome = "timeouts" if timed_out else "errors"
+            self._record(engine, time.perf_counter() - start, outcome)
+            raise
+        self._record(engine, time.perf_counter() - start, "ok")
+        return result
+
+    def _shadow(self, image, result: OCRResult):
+        other = self.local if result.engine == self.remote.name else self.remote
+        try:
+            self._compare(result, self._run(other, image))
+        except Exception as e:
+            logger.warning(f"Shadow OCR with {other.name} failed: {str(e)}")
+
+    # ------------------------ Routing ------------------------ #
+
+    def _fallback(self, fallback: OCREngine, image, result: OCRResult = None):
+        with self._lock:
+            self._stats["fallbacks"] += 1
+        second = self._run(fallback, image)
+        if result is not None:
+            self._compare(result, second)
+        return second
+
+    def recognize(self, image) -> OCRResult:
+        """Read the crop according to the configured policy."""
+        with self._lock:
+            self._stats["requests"] += 1
+
+        if self.policy == "remote_only":
+            result = self._run(self.remote, image)
+        elif self.policy == "local_only":
+            result = self._run(self.local, image)
+        elif self.policy == "local_first":
+            try:
+                local = self._run(self.local, image)
+            except Exception as e:
+                logger.warning(f"Local OCR failed, using Vision: {str(e)}")
+                return self._fallback(self.remote, image)
+            if (local.confidence or 0) >= self.min_confidence and local.text:
+                result = local
+            else:
+                return self._fallback(self.remote, image, local)
+        else:  # remote_first
+            try:
+                result = self._run(self.remote, image, timeout=self.remote_timeout)
+            except Exception as e:
+                logger.warning(
+                    f"Vision OCR failed, using local: {type(e).__name__} {str(e)}"
+                )
+                return self._fallback(self.local, image)
+
+        if self.compare_rate and random.random() < self.compare_rate:
+            self._shadow_pool.submit(self._shadow, image.copy(), result)
+        return result
+
+    def recognize_many(self, images: list) -> list:
+        """Read several crops of one image, in the same order.
+
+        With a Vision-first policy every crop goes out in a single Vision
+        request; remote_first falls back to reading each crop locally. The
+        local-first policies decide per crop, so they use recognize().
+        """
+        if len(images) <= 1 or self.policy in ("local_only", "local_first"):
+            return [self.recognize(image) for image in images]
+        with self._lock:
+            self._stats["requests"] += len(images)
+
+        if self.policy == "remote_only":
+            results = self._run_many(self.remote, images)
+        else:  # remote_first
+            try:
+                results = self._run_many(self.remote, images, self.remote_timeout)
+            except Exception as e:
+                logger.warning(
+                    f"Vision OCR failed, using local: {type(e).__name__} {str(e)}"
+                )
+                return [self._fallback(self.local, image) for image in images]
+
+        for image, result in zip(images, results):
+            if self.compare_rate and random.random() < self.compare_rate:
+                self._shadow_pool.submit(self._shadow, image.copy(), result)
+        return results
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            engines = {name: dict(v) for name, v in self._engine_stats.items()}
+        for values in engines.values():
+            values["avg_seconds"] = round(values["seconds"] / values["calls"], 4)
+            values["seconds"] = round(values["seconds"], 4)
+            values["max_seconds"] = round(values["max_seconds"], 4)
+        stats["engines"] = engines
+        stats["policy"] = self.policy
+        if stats["compared"]:
+            stats["agreement"] = round(stats["agreed"] / stats["compared"], 4)
+        return stats
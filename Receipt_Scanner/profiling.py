@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import uuid
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """Sampling profiler for one request, written as collapsed stacks.
+
+    A background thread records the Python stack of `thread_ids` (all
+    threads when None) every `interval` seconds, so the request runs at
+    full speed apart from the sampling itself. The output is one
+    "frame;frame;frame count" line per distinct stack, the format read by
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_ids: set = None, interval: float = 0.005):
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            filename = os.path.basename(code.co_filename)
+            names.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._done.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                self.stacks[self._collapse(frame)] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._done.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def dump(self, directory: str, name: str) -> str:
+        """Write the collapsed stacks to `directory` and return the file path."""
+        os.makedirs(directory, exist_ok=True)
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(directory, f"{stamp}-{name}.txt")
+        with open(path, "w") as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+        logger.info(f"Wrote profile with {self.samples} samples to {path}")
+        return path
@@ -0,0 +1,141 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rencana_id(value) -> str:
+    """Format an 'id rencana' value the way the sheet shows it (e.g. 00001)."""
+    try:
+        return f"{int(value):05d}"
+    except (TypeError, ValueError):
+        return str(value).strip()
+
+
+def record_to_details(record: dict, record_id: str) -> dict:
+    """Map a RENCANA record to the payload returned by /get_rencana_details."""
+    return {
+        "start_date_ar": record.get("start date A/R", ""),
+        "end_date_ar": record.get("end date A/R", ""),
+        "requestor": record.get("Requestor", ""),
+        "unit": record.get("Unit", ""),
+        "nominal": record.get("Nominal", ""),
+        "id_rencana": record_id,
+    }
+
+
+class RencanaSnapshot:
+    """Immutable, indexed view of one download of the RENCANA sheet."""
+
+    def __init__(self, records: list):
+        self.ids = []
+        self.by_id = {}
+        for record in records:
+            id_value = record.get("id rencana", "")
+            if id_value == "":
+                continue
+            record_id = normalize_rencana_id(id_value)
+            self.ids.append(record_id)
+            # Keep the first occurrence, like the old linear scan did
+            if record_id not in self.by_id:
+                self.by_id[record_id] = record_to_details(record, record_id)
+        self.record_count = len(records)
+        self.loaded_at = time.monotonic()
+
+
+class RencanaCache:
+    """TTL cache of the RENCANA sheet with single-flight refreshes.
+
+    The first read loads the sheet synchronously. Once the snapshot is older
+    than the TTL, readers keep getting the stale snapshot while exactly one
+    background thread downloads a fresh one.
+    """
+
+    def __init__(self, loader, ttl: float = 300.0):
+        self.loader = loader
+        self.ttl = ttl
+
+        self._snapshot = None
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+        self._state_lock = threading.Lock()
+        self._stats = {"loads": 0, "load_errors": 0, "hits": 0, "misses": 0}
+
+    # ------------------------ Loading ------------------------ #
+
+    def _load(self) -> RencanaSnapshot:
+        try:
+            records = self.loader()
+        except Exception:
+            with self._state_lock:
+                self._stats["load_errors"] += 1
+            raise
+        snapshot = RencanaSnapshot(records)
+        with self._state_lock:
+            self._snapshot = snapshot
+            self._stats["loads"] += 1
+        logger.info(f"RENCANA cache loaded {snapshot.record_count} records.")
+        return snapshot
+
+    def _refresh_in_background(self):
+        try:
+            with self._load_lock:
+                self._load()
+        except Exception as e:
+            logger.error(f"Background RENCANA refresh failed: {str(e)}")
+        finally:
+            with self._state_lock:
+                self._refreshing = False
+
+    def snapshot(self) -> RencanaSnapshot:
+        """Return the current snapshot, loading or refreshing it as needed."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            # Single flight: concurrent cold readers wait for one download
+            with self._load_lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self._load()
+            return snapshot
+
+        if time.monotonic() - snapshot.loaded_at > self.ttl:
+            with self._state_lock:
+                start_refresh = not self._refreshing
+                self._refreshing = True
+            if start_refresh:
+                threading.Thread(
+                    target=self._refresh_in_background,
+                    name="rencana-cache-refresh",
+                    daemon=True,
+                ).start()
+        return snapshot
+
+    def invalidate(self):
+        """Drop the snapshot so the next read downloads the sheet again."""
+        with self._state_lock:
+            self._snapshot = None
+
+    # ------------------------ Views ------------------------ #
+
+    def ids(self) -> list:
+        """Return every zero-padded 'id rencana', in sheet order."""
+        return list(self.snapshot().ids)
+
+    def get(self, rencana_id: str) -> dict:
+        """Return the details for one 'id rencana' or None if it is unknown."""
+        details = self.snapshot().by_id.get(normalize_rencana_id(rencana_id))
+        with self._state_lock:
+            self._stats["hits" if details is not None else "misses"] += 1
+        return details
+
+    def get_stats(self) -> dict:
+        with self._state_lock:
+            stats = dict(self._stats)
+            snapshot = self._snapshot
+            stats["refreshing"] = self._refreshing
+        stats["ttl"] = self.ttl
+        if snapshot is not None:
+            stats["records"] = snapshot.record_count
+            stats["age"] = round(time.monotonic() - snapshot.loaded_at, 3)
+        return stats
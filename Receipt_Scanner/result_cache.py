@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 of the uploaded bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(image) -> int:
+    """64-bit difference hash (dHash) that survives re-encoding and resizing."""
+    # Imported here so content_hash() stays usable by the web tier without
+    # loading OpenCV
+    import cv2
+    import numpy as np
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_signed(value: int) -> int:
+    """An unsigned 64-bit value as the signed integer SQLite can store."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def phash_bands(phash: int, bands: int) -> list:
+    """Split the 64 bits of `phash` into `bands` contiguous bit ranges.
+
+    Two hashes at most `bands - 1` bits apart agree exactly on at least one
+    band (pigeonhole), so candidates can be found by equality lookups.
+    """
+    values, start = [], 0
+    for band in range(bands):
+        end = 64 * (band + 1) // bands
+        values.append((phash >> start) & ((1 << (end - start)) - 1))
+        start = end
+    return values
+
+
+class ReceiptResultCache:
+    """Detection + OCR results keyed by upload content.
+
+    Lookups go to a size-bounded in-memory LRU first and then to a SQLite
+    store on disk that every gunicorn worker on the host shares. Entries are
+    found by exact content hash or, optionally, by a perceptual hash within
+    `phash_distance` bits so re-encoded copies of a receipt also hit; those
+    are looked up through an index of `phash_distance + 1` hash bands, so
+    only entries sharing a band are compared. `namespace` (e.g. the model
+    file) keeps results of different models apart.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_memory_entries: int = 512,
+        max_disk_entries: int = 20000,
+        phash_distance: int = 4,
+    ):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.phash_distance = phash_distance
+        self.phash_bands = min(max(phash_distance, 0) + 1, 64)
+
+        self._memory = OrderedDict()  # (namespace, key) -> entry
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "phash_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        # SQLite handles must not be shared with a forked worker
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " phash INTEGER,"
+                " entry_json TEXT NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS phash_bands ("
+                " namespace TEXT NOT NULL,"
+                " band INTEGER NOT NULL,"
+                " value INTEGER NOT NULL,"
+                " key TEXT NOT NULL,"
+                " PRIMARY KEY (namespace, band, value, key)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS phash_bands_key"
+                " ON phash_bands (namespace, key)"
+            )
+            # The band layout follows phash_distance, recorded as user_version
+            if conn.execute("PRAGMA user_version").fetchone()[0] != self.phash_bands:
+                self._rebuild_bands(conn)
+
+    def _rebuild_bands(self, conn: sqlite3.Connection):
+        """Re-index every stored phash after phash_distance changed."""
+        rows = conn.execute(
+            "SELECT namespace, key, phash FROM results WHERE phash IS NOT NULL"
+        ).fetchall()
+        conn.execute("DELETE FROM phash_bands")
+        for namespace, key, phash in rows:
+            self._insert_bands(conn, namespace, key, phash & 0xFFFFFFFFFFFFFFFF)
+        conn.execute(f"PRAGMA user_version = {self.phash_bands}")
+        logger.info(f"Indexed {len(rows)} cached phashes in {self.phash_bands} bands.")
+
+    def _insert_bands(self, conn, namespace: str, key: str, phash: int):
+        conn.executemany(
+            "INSERT OR REPLACE INTO phash_bands (namespace, band, value, key)"
+            " VALUES (?, ?, ?, ?)",
+            [
+                (namespace, band, to_signed(value), key)
+                for band, value in enumerate(phash_bands(phash, self.phash_bands))
+            ],
+        )
+
+    def _after_fork(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._stats[key] += 1
+
+    def _remember(self, namespace: str, key: str, entry: dict):
+        with self._lock:
+            self._memory[(namespace, key)] = entry
+            self._memory.move_to_end((namespace, key))
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+                self._stats["memory_evictions"] += 1
+
+    # ------------------------ Lookups ------------------------ #
+
+    def get(self, namespace: str, key: str):
+        """Look up an exact content hash."""
+        with self._lock:
+            entry = self._memory.get((namespace, key))
+            if entry is not None:
+                self._memory.move_to_end((namespace, key))
+        if entry is not None:
+            self._count("hits", "memory_hits")
+            return entry
+
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT entry_json FROM results WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute(
+                "UPDATE results SET last_used = ? WHERE namespace = ? AND key = ?",
+                (time.time(), namespace, key),
+            )
+        entry = json.loads(row[0])
+        self._remember(namespace, key, entry)
+        self._count("hits", "disk_hits")
+        return entry
+
+    def get_similar(self, namespace: str, phash: int):
+        """Look up the closest perceptual hash within `phash_distance` bits.
+
+        Only entries sharing at least one hash band are compared, which
+        includes every entry within the distance.
+        """
+        if self.phash_distance < 0:
+            return None
+        best, best_distance = None, self.phash_distance + 1
+        conn = self._connect()
+        for band, value in enumerate(phash_bands(phash, self.phash_bands)):
+            rows = conn.execute(
+                "SELECT r.key, r.phash, r.entry_json FROM phash_bands b"
+                " JOIN results r ON r.namespace = b.namespace AND r.key = b.key"
+                " WHERE b.namespace = ? AND b.band = ? AND b.value = ?",
+                (namespace, band, to_signed(value)),
+            )
+            for key, stored, entry_json in rows:
+                distance = hamming(phash, stored & 0xFFFFFFFFFFFFFFFF)
+                if distance < best_distance:
+                    best, best_distance = (key, entry_json), distance
+            if best_distance == 0:
+                break
+        if best is None:
+            return None
+        entry = json.loads(best[1])
+        self._remember(namespace, best[0], entry)
+        self._count("hits", "phash_hits")
+        return entry
+
+    def record_miss(self):
+        self._count("misses")
+
+    # ------------------------ Stores ------------------------ #
+
+    def put(self, namespace: str, key: str, entry: dict, phash: int = None):
+        """Store a result in memory and in the shared disk store."""
+        self._remember(namespace, key, entry)
+        # SQLite integers are signed 64-bit
+        signed_phash = to_signed(phash) if phash is not None else None
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results"
+                " (namespace, key, phash, entry_json, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, signed_phash, json.dumps(entry), time.time()),
+            )
+            conn.execute(
+                "DELETE FROM phash_bands WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+            if phash is not None:
+                self._insert_bands(conn, namespace, key, phash)
+            overflow = conn.execute(
+                "SELECT COUNT(*) - ? FROM results", (self.max_disk_entries,)
+            ).fetchone()[0]
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM phash_bands WHERE (namespace, key) IN ("
+                    " SELECT namespace, key FROM results ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                conn.execute(
+                    "DELETE FROM results WHERE rowid IN ("
+                    " SELECT rowid FROM results ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+        with self._lock:
+            self._stats["stores"] += 1
+            if overflow > 0:
+                self._stats["disk_evictions"] += overflow
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM results")
+            conn.execute("DELETE FROM phash_bands")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        stats["disk_entries"] = (
+            self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        )
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+        return stats
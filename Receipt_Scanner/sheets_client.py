@@ -0,0 +1,122 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Service account tokens live for one hour; re-authorize a little before that.
+DEFAULT_TOKEN_TTL = 50 * 60
+
+
+class SheetsClientPool:
+    """Process-wide, thread-safe gspread client with cached worksheet handles.
+
+    The client is authorized once and reused by every request. It is
+    re-authorized when the token gets close to expiry or when the API
+    answers 401, and every worksheet is opened only once per authorization.
+    """
+
+    def __init__(
+        self,
+        credentials_path: str,
+        sheet_id: str,
+        scopes: list,
+        token_ttl: float = DEFAULT_TOKEN_TTL,
+    ):
+        self.credentials_path = credentials_path
+        self.sheet_id = sheet_id
+        self.scopes = scopes
+        self.token_ttl = token_ttl
+
+        self._lock = threading.RLock()
+        self._client = None
+        self._spreadsheet = None
+        self._worksheets = {}
+        self._authorized_at = 0.0
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "auth_refreshes": 0,
+            "api_calls": 0,
+            "api_errors": 0,
+            "worksheet_opens": 0,
+        }
+
+    # ------------------------ Internals ------------------------ #
+
+    def _count(self, key: str, value: int = 1):
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def _authorize(self):
+        # gspread and oauth2client are imported on first use, which keeps
+        # them out of the web tier's startup time
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        creds = ServiceAccountCredentials.from_json_keyfile_name(
+            self.credentials_path, self.scopes
+        )
+        self._client = gspread.authorize(creds)
+        self._spreadsheet = self._client.open_by_key(self.sheet_id)
+        self._worksheets = {}
+        self._authorized_at = time.monotonic()
+        self._count("auth_refreshes")
+        logger.info("Google Sheets client authorized.")
+
+    def _ensure_authorized(self):
+        with self._lock:
+            expired = time.monotonic() - self._authorized_at > self.token_ttl
+            if self._client is None or expired:
+                self._authorize()
+
+    def _invalidate(self):
+        with self._lock:
+            self._client = None
+            self._spreadsheet = None
+            self._worksheets = {}
+
+    # ------------------------ Public API ------------------------ #
+
+    def client(self) -> "gspread.Client":
+        """Return the shared, authorized gspread client."""
+        self._ensure_authorized()
+        return self._client
+
+    def worksheet(self, name: str) -> "gspread.Worksheet":
+        """Return a cached handle for the worksheet with the given name."""
+        self._ensure_authorized()
+        with self._lock:
+            handle = self._worksheets.get(name)
+            if handle is None:
+                handle = self._spreadsheet.worksheet(name)
+                self._worksheets[name] = handle
+                self._count("worksheet_opens")
+            return handle
+
+    def call(self, sheet_name: str, method: str, *args, **kwargs):
+        """Call a worksheet method, re-authorizing once on an expired token."""
+        import gspread
+
+        for attempt in range(2):
+            sheet = self.worksheet(sheet_name)
+            self._count("api_calls")
+            try:
+                return getattr(sheet, method)(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                self._count("api_errors")
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status == 401 and attempt == 0:
+                    logger.warning("Google Sheets token rejected, re-authorizing.")
+                    self._invalidate()
+                    continue
+                raise
+
+    def get_stats(self) -> dict:
+        """Return a snapshot of the auth and API call counters."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._lock:
+            stats["cached_worksheets"] = sorted(self._worksheets)
+            stats["authorized"] = self._client is not None
+        return stats
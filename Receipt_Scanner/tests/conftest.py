@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app's modules are flat siblings of this directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,118 @@
+"""SheetAppendQueue journal: batching, claim leases and retries."""
+
+import sqlite3
+
+import pytest
+
+from append_queue import SheetAppendQueue
+
+
+class Recorder:
+    """flush_rows stand-in that records batches and can fail on demand."""
+
+    def __init__(self):
+        self.batches = []
+        self.failures = 0
+
+    def __call__(self, sheet, rows):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Sheets unavailable")
+        self.batches.append((sheet, rows))
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / "journal.sqlite3")
+
+
+def make_queue(journal, sink, **kwargs):
+    kwargs.setdefault("batch_size", 3)
+    kwargs.setdefault("max_delay", 60)
+    return SheetAppendQueue(journal, sink, **kwargs)
+
+
+def test_batch_sent_when_full(journal):
+    sink = Recorder()
+    queue = make_queue(journal, sink)
+    queue.enqueue("LAPORAN", ["a"])
+    queue.enqueue("LAPORAN", ["b"])
+    assert queue.flush_once() == 0  # Neither full nor old enough
+    queue.enqueue("LAPORAN", ["c"])
+    assert queue.flush_once() == 3
+    assert sink.batches == [("LAPORAN", [["a"], ["b"], ["c"]])]
+    assert queue.depth() == 0
+
+
+def test_batch_sent_after_max_delay(journal):
+    sink = Recorder()
+    queue = make_queue(journal, sink, max_delay=0)
+    queue.enqueue("LAPORAN", ["a"])
+    assert queue.flush_once() == 1
+    assert sink.batches == [("LAPORAN", [["a"]])]
+
+
+def test_one_sheet_per_batch_oldest_first(journal):
+    sink = Recorder()
+    queue = make_queue(journal, sink, max_delay=0)
+    queue.enqueue("B", [1])
+    queue.enqueue("A", [2])
+    queue.enqueue("B", [3])
+    while queue.flush_once():
+        pass
+    assert sink.batches == [("B", [[1], [3]]), ("A", [[2]])]
+
+
+def test_failed_batch_is_retried(journal):
+    sink = Recorder()
+    sink.failures = 1
+    queue = make_queue(journal, sink, max_delay=0)
+    queue.enqueue("LAPORAN", ["a"])
+    with pytest.raises(ConnectionError):
+        queue.flush_once()
+    assert queue.depth() == 1
+    assert queue.get_stats()["flush_errors"] == 1
+    # The claim was released, so the next flush sends the row
+    assert queue.flush_once() == 1
+    assert sink.batches == [("LAPORAN", [["a"]])]
+
+
+def test_leased_rows_not_claimed_twice(journal):
+    first = make_queue(journal, Recorder(), max_delay=0)
+    second_sink = Recorder()
+    second = make_queue(journal, second_sink, max_delay=0)
+    first.enqueue("LAPORAN", ["a"])
+
+    # A worker claimed the row and is still sending it
+    claim, _, rows = first._claim_batch()
+    assert rows == [["a"]]
+    assert second.flush_once() == 0
+
+    first._finish_batch(claim, sent=True)
+    assert second.depth() == 0
+    assert second_sink.batches == []
+
+
+def test_expired_lease_is_reclaimed(journal):
+    first = make_queue(journal, Recorder(), max_delay=0)
+    second_sink = Recorder()
+    second = make_queue(journal, second_sink, max_delay=0, lease_seconds=30)
+    first.enqueue("LAPORAN", ["a"])
+    first._claim_batch()  # The worker holding the lease died
+
+    conn = sqlite3.connect(journal)
+    with conn:
+        conn.execute("UPDATE pending_rows SET claimed_at = claimed_at - 60")
+    assert second.flush_once() == 1
+    assert second_sink.batches == [("LAPORAN", [["a"]])]
+
+
+def test_journal_survives_restart(journal):
+    make_queue(journal, Recorder()).enqueue("LAPORAN", ["a"])
+
+    sink = Recorder()
+    queue = make_queue(journal, sink)
+    assert queue.depth() == 1
+    queue.stop(flush=True)  # Sends everything pending, due or not
+    assert sink.batches == [("LAPORAN", [["a"]])]
+    assert queue.depth() == 0
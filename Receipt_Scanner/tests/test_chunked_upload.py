@@ -0,0 +1,137 @@
+"""ChunkedUploadStore: resuming, finalizing and sweeping in a temp dir."""
+
+import os
+import time
+import hashlib
+
+import pytest
+
+from chunked_upload import ChunkedUploadStore, ChunkedUploadError
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkedUploadStore(str(tmp_path), chunk_size=4096, max_size=1 << 20)
+
+
+def create(store, data=DATA) -> str:
+    status = store.create("r.jpg", "image/jpeg", len(data), sha256(data))
+    return status["upload_id"]
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def upload(store, upload_id, data=DATA, offset=0):
+    while offset < len(data):
+        offset = store.write_chunk(upload_id, offset, data[offset : offset + 4096])
+    return offset
+
+
+def age(store, upload_id, seconds):
+    old = time.time() - seconds
+    for name in os.listdir(store.directory):
+        if name.startswith(upload_id):
+            os.utime(os.path.join(store.directory, name), (old, old))
+
+
+def test_resume_after_dropped_chunk(store):
+    upload_id = create(store)
+    assert store.write_chunk(upload_id, 0, DATA[:4096]) == 4096
+    # The response was lost: the client asks where to resume
+    assert store.status(upload_id)["offset"] == 4096
+    # Resent and overlapping chunks store only the new bytes
+    assert store.write_chunk(upload_id, 0, DATA[:4096]) == 4096
+    assert store.write_chunk(upload_id, 2048, DATA[2048:6144]) == 6144
+    assert upload(store, upload_id, offset=6144) == len(DATA)
+    assert store.get_stats()["duplicate_chunks"] == 1
+
+
+def test_chunk_past_received_offset(store):
+    upload_id = create(store)
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        store.write_chunk(upload_id, 4096, DATA[4096:8192])
+    assert (excinfo.value.status_code, excinfo.value.offset) == (409, 0)
+
+
+def test_corrupted_chunk_rejected(store):
+    upload_id = create(store)
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        store.write_chunk(upload_id, 0, DATA[:4096], chunk_sha256="0" * 64)
+    assert excinfo.value.status_code == 422
+    assert store.status(upload_id)["offset"] == 0
+
+
+def test_finalize_maps_the_verified_file(store):
+    upload_id = create(store)
+    upload(store, upload_id)
+    meta = store.finalize(upload_id)
+    assert meta["state"] == "finalizing"
+    with store.open(upload_id) as data:
+        assert data[:] == DATA
+
+    # Processing is under way: a concurrent finalize waits
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        store.finalize(upload_id)
+    assert excinfo.value.status_code == 409
+
+    store.complete(upload_id, 200, {"upload_token": "t"})
+    meta = store.finalize(upload_id)
+    assert meta["state"] == "finalized"
+    assert meta["response"] == {"status_code": 200, "body": {"upload_token": "t"}}
+    assert store.status(upload_id)["offset"] == len(DATA)
+
+
+def test_finalize_incomplete(store):
+    upload_id = create(store)
+    store.write_chunk(upload_id, 0, DATA[:4096])
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        store.finalize(upload_id)
+    assert (excinfo.value.status_code, excinfo.value.offset) == (409, 4096)
+
+
+def test_finalize_checksum_mismatch_restarts(store):
+    data = DATA[:-1] + b"\x00"
+    upload_id = store.create("r.jpg", None, len(DATA), sha256(DATA))["upload_id"]
+    upload(store, upload_id, data)
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        store.finalize(upload_id)
+    assert (excinfo.value.status_code, excinfo.value.offset) == (422, 0)
+    assert store.status(upload_id)["offset"] == 0
+
+
+def test_reopen_allows_another_finalize(store):
+    upload_id = create(store)
+    upload(store, upload_id)
+    store.finalize(upload_id)
+    store.reopen(upload_id)
+    assert store.finalize(upload_id)["state"] == "finalizing"
+
+
+def test_sweep_uses_last_chunk(store):
+    upload_id = create(store)
+    store.write_chunk(upload_id, 0, DATA[:4096])
+    age(store, upload_id, store.ttl + 60)
+    # A chunk arrives: only the data file changes, the upload stays
+    store.write_chunk(upload_id, 4096, DATA[4096:8192])
+    assert store.sweep() == 0
+    assert store.status(upload_id)["offset"] == 8192
+
+
+def test_sweep_removes_both_files(store):
+    idle = create(store)
+    active = create(store)
+    age(store, idle, store.ttl + 60)
+    assert store.sweep() == 1
+    assert sorted(os.listdir(store.directory)) == [active + ".json", active + ".part"]
+    with pytest.raises(ChunkedUploadError):
+        store.status(idle)
+
+
+def test_invalid_upload_id(store):
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        store.status("../../etc/passwd")
+    assert excinfo.value.status_code == 404
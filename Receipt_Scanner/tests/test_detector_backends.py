@@ -0,0 +1,176 @@
+"""OnnxBackend letterbox, decode and NMS against synthetic model outputs.
+
+onnxruntime is replaced by a fake session returning a hand-built output
+tensor, so boxes placed at known positions must come back in original
+image pixels. The comparison with real weights is
+benchmarks/check_detector_parity.py.
+"""
+
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from detector_backends import OnnxBackend, select_best_box
+
+NAMES = {0: "total_value", 1: "date"}
+
+
+class FakeSession:
+    """Stands in for onnxruntime.InferenceSession; returns fixed outputs."""
+
+    def __init__(self, outputs, dynamic_batch=True, input_size=640):
+        self.outputs = outputs
+        self.batch_dim = "batch" if dynamic_batch else 1
+        self.input_size = input_size
+        self.blobs = []
+
+    def get_inputs(self):
+        shape = [self.batch_dim, 3, self.input_size, self.input_size]
+        return [types.SimpleNamespace(name="images", shape=shape)]
+
+    def get_modelmeta(self):
+        return types.SimpleNamespace(custom_metadata_map={"names": repr(NAMES)})
+
+    def run(self, _, feeds):
+        blob = feeds["images"]
+        self.blobs.append(blob)
+        start = sum(len(b) for b in self.blobs[:-1])
+        return [self.outputs[start : start + len(blob)]]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Build an OnnxBackend around a FakeSession given the outputs."""
+
+    def build(outputs, dynamic_batch=True):
+        session = FakeSession(np.asarray(outputs, dtype=np.float32), dynamic_batch)
+        fake_ort = types.SimpleNamespace(
+            SessionOptions=lambda: types.SimpleNamespace(),
+            InferenceSession=lambda *args, **kwargs: session,
+        )
+        monkeypatch.setitem(sys.modules, "onnxruntime", fake_ort)
+        return OnnxBackend("model.onnx", input_size=640), session
+
+    return build
+
+
+def letterbox_params(height, width, size=640):
+    ratio = min(size / height, size / width)
+    pad_x = (size - round(width * ratio)) / 2
+    pad_y = (size - round(height * ratio)) / 2
+    return ratio, int(round(pad_x - 0.1)), int(round(pad_y - 0.1))
+
+
+def model_output(anchors, height, width, num_classes=2):
+    """(4 + num_classes, len(anchors)) output for boxes in image pixels.
+
+    Each anchor is (xyxy box in the original image, class id, score).
+    """
+    ratio, left, top = letterbox_params(height, width)
+    output = np.zeros((4 + num_classes, len(anchors)), dtype=np.float32)
+    for i, ((x1, y1, x2, y2), class_id, score) in enumerate(anchors):
+        x1, x2 = x1 * ratio + left, x2 * ratio + left
+        y1, y2 = y1 * ratio + top, y2 * ratio + top
+        output[:4, i] = [(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1]
+        output[4 + class_id, i] = score
+    return output
+
+
+def test_letterbox_keeps_aspect_ratio_and_pads_with_gray(backend):
+    onnx, session = backend(np.zeros((1, 6, 1)))
+    image = np.full((1000, 500, 3), 200, dtype=np.uint8)
+    onnx([image])
+
+    blob = session.blobs[0]
+    assert blob.shape == (1, 3, 640, 640)
+    assert blob.dtype == np.float32
+    # 500x1000 scales to 320x640, centered with 160 px of padding each side
+    assert np.allclose(blob[0, :, :, :160], 114 / 255)
+    assert np.allclose(blob[0, :, :, 480:], 114 / 255)
+    assert np.allclose(blob[0, :, :, 160:480], 200 / 255)
+
+
+def test_channels_reversed_like_ultralytics(backend):
+    onnx, session = backend(np.zeros((1, 6, 1)))
+    image = np.zeros((640, 640, 3), dtype=np.uint8)
+    image[..., 0], image[..., 1], image[..., 2] = 10, 20, 30
+    onnx([image])
+
+    # ultralytics reverses NumPy input, so channel 0 of the network input
+    # is the last channel of the image the pipeline passed in
+    blob = session.blobs[0]
+    assert np.allclose(blob[0, :, 320, 320] * 255, [30, 20, 10])
+
+
+def test_decode_maps_boxes_back_to_image_pixels(backend):
+    height, width = 1000, 500
+    total = (100.0, 600.0, 400.0, 680.0)
+    date = (50.0, 100.0, 250.0, 140.0)
+    anchors = [
+        (total, 0, 0.9),
+        (date, 1, 0.7),
+        ((300.0, 300.0, 350.0, 320.0), 0, 0.1),  # Below the threshold
+    ]
+    onnx, _ = backend([model_output(anchors, height, width)])
+    (detections,) = onnx([np.zeros((height, width, 3), dtype=np.uint8)])
+
+    order = np.argsort(-detections.scores)
+    assert detections.class_ids[order].tolist() == [0, 1]
+    assert np.allclose(detections.scores[order], [0.9, 0.7])
+    assert np.allclose(detections.boxes[order], [total, date], atol=1.0)
+    assert onnx.names == NAMES
+
+
+def test_nms_suppresses_overlaps_within_a_class_only(backend):
+    height, width = 800, 800
+    box = (200.0, 200.0, 600.0, 300.0)
+    shifted = (205.0, 202.0, 605.0, 302.0)
+    anchors = [
+        (box, 0, 0.9),
+        (shifted, 0, 0.8),  # Same class, overlapping: suppressed
+        (shifted, 1, 0.6),  # Other class at the same place: kept
+    ]
+    onnx, _ = backend([model_output(anchors, height, width)])
+    (detections,) = onnx([np.zeros((height, width, 3), dtype=np.uint8)])
+
+    kept = sorted(zip(detections.class_ids.tolist(), detections.scores.tolist()))
+    assert [(c, round(s, 2)) for c, s in kept] == [(0, 0.9), (1, 0.6)]
+    best, confidence = select_best_box([detections], NAMES, "total_value")
+    assert np.allclose(best, box, atol=1.0)
+    assert confidence == pytest.approx(0.9)
+
+
+def test_boxes_are_clipped_to_the_image(backend):
+    height, width = 640, 640
+    anchors = [((-20.0, 600.0, 100.0, 700.0), 0, 0.9)]
+    onnx, _ = backend([model_output(anchors, height, width)])
+    (detections,) = onnx([np.zeros((height, width, 3), dtype=np.uint8)])
+
+    assert np.allclose(detections.boxes, [[0.0, 600.0, 100.0, 640.0]], atol=1.0)
+
+
+def test_no_detection_above_threshold_is_empty(backend):
+    anchors = [((10.0, 10.0, 50.0, 50.0), 0, 0.2)]
+    onnx, _ = backend([model_output(anchors, 640, 640)])
+    (detections,) = onnx([np.zeros((640, 640, 3), dtype=np.uint8)])
+
+    assert detections.boxes.shape == (0, 4)
+    assert len(detections.scores) == len(detections.class_ids) == 0
+
+
+def test_static_batch_export_runs_one_image_at_a_time(backend):
+    first = model_output([((10.0, 10.0, 110.0, 60.0), 0, 0.9)], 480, 640)
+    second = model_output([((30.0, 40.0, 130.0, 90.0), 1, 0.8)], 640, 480)
+    onnx, session = backend([first, second], dynamic_batch=False)
+    images = [
+        np.zeros((480, 640, 3), dtype=np.uint8),
+        np.zeros((640, 480, 3), dtype=np.uint8),
+    ]
+    results = onnx(images)
+
+    assert [blob.shape[0] for blob in session.blobs] == [1, 1]
+    assert np.allclose(results[0].boxes, [[10.0, 10.0, 110.0, 60.0]], atol=1.0)
+    assert results[1].class_ids.tolist() == [1]
+    assert np.allclose(results[1].boxes, [[30.0, 40.0, 130.0, 90.0]], atol=1.0)
@@ -0,0 +1,186 @@
+"""Header validation of decompression bombs, malformed and regular images.
+
+Every case is built in memory. Bombs and malformed files must be rejected
+from their headers alone, so cv2.imdecode is made to fail the test if it
+is reached; regular images must be accepted with the dimensions OpenCV
+decodes.
+"""
+
+import zlib
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from image_headers import probe_image, validate_image
+from inference_errors import InvalidImageError, ImageTooLargeError
+
+MAX_PIXELS = 64_000_000
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(kind + data)
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+
+def png_bomb(side: int) -> bytes:
+    """A valid all-black 1-bit PNG: tiny on disk, side*side*3 bytes decoded."""
+    row = b"\x00" * (1 + (side + 7) // 8)
+    compressor = zlib.compressobj(9)
+    idat = b"".join(compressor.compress(row) for _ in range(side))
+    idat += compressor.flush()
+    header = struct.pack(">IIBBBBB", side, side, 1, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + png_chunk(b"IHDR", header)
+        + png_chunk(b"IDAT", idat)
+        + png_chunk(b"IEND", b"")
+    )
+
+
+def png_header(width: int, height: int) -> bytes:
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", header)
+
+
+def encode(ext: str, width: int, height: int, params=()) -> bytes:
+    image = np.full((height, width, 3), 255, np.uint8)
+    cv2.putText(image, "TOTAL", (5, height // 2), 0, 0.5, (0, 0, 0), 1)
+    return cv2.imencode(ext, image, list(params))[1].tobytes()
+
+
+def jpeg_with_size(width: int, height: int) -> bytes:
+    """A small real JPEG whose SOF0 claims width x height."""
+    data = bytearray(encode(".jpg", 64, 64))
+    sof = data.index(b"\xff\xc0")
+    data[sof + 5 : sof + 9] = struct.pack(">HH", height, width)
+    return bytes(data)
+
+
+def jpeg_with_exif(size: int) -> bytes:
+    data = encode(".jpg", 320, 240)
+    payload = b"Exif\x00\x00" + b"\x00" * (size - 8)
+    app1 = b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+    return data[:2] + app1 + data[2:]
+
+
+def webp_vp8x(width: int, height: int) -> bytes:
+    payload = b"\x00" * 4 + (width - 1).to_bytes(3, "little")
+    payload += (height - 1).to_bytes(3, "little")
+    chunk = b"VP8X" + struct.pack("<I", len(payload)) + payload
+    return b"RIFF" + struct.pack("<I", 4 + len(chunk)) + b"WEBP" + chunk
+
+
+def box(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+
+def heic(width: int, height: int) -> bytes:
+    """ftyp + meta/iprp/ipco/ispe, which is all the validator reads."""
+    ispe = box(b"ispe", b"\x00" * 4 + struct.pack(">II", width, height))
+    meta = box(b"meta", b"\x00" * 4 + box(b"iprp", box(b"ipco", ispe)))
+    return box(b"ftyp", b"heic" + b"\x00" * 4 + b"mif1heic") + meta
+
+
+def bmp_header(width: int, height: int) -> bytes:
+    info = struct.pack("<IiiHHI", 40, width, height, 1, 24, 0) + b"\x00" * 20
+    return b"BM" + struct.pack("<IHHI", 54, 0, 0, 54) + info
+
+
+TOO_LARGE = {
+    "png_bomb_1bit": lambda: png_bomb(30000),
+    "png_header_65535": lambda: png_header(65535, 65535),
+    "jpeg_sof_30000": lambda: jpeg_with_size(30000, 30000),
+    "webp_vp8x_16384": lambda: webp_vp8x(16384, 16384),
+    "bmp_topdown_40000": lambda: bmp_header(40000, -40000),
+}
+
+INVALID = {
+    "png_truncated_ihdr": lambda: png_header(4000, 3000)[:20],
+    "png_signature_only": lambda: b"\x89PNG\r\n\x1a\n",
+    "jpeg_truncated": lambda: b"\xff\xd8\xff\xe0\x00\x10JFIF\x00",
+    "jpeg_cut_before_sof": lambda: encode(".jpg", 640, 480)[:20],
+    "jpeg_sos_before_sof": lambda: b"\xff\xd8\xff\xda\x00\x08" + b"\x00" * 64,
+    "png_zero_size": lambda: png_header(0, 0),
+    "png_zero_height": lambda: png_header(1000, 0),
+    "bmp_zero_width": lambda: bmp_header(0, 100),
+    "wrong_magic": lambda: b"\x89PNX\r\n\x1a\n" + png_header(100, 100)[8:],
+    "text": lambda: b"total 50000\n" * 10,
+    "empty": lambda: b"",
+    # Identified, but OpenCV cannot decode them
+    "heic_phone": lambda: heic(4032, 3024),
+    "heic_ispe_30000": lambda: heic(30000, 30000),
+    "gif_65535": lambda: b"GIF89a" + struct.pack("<HH", 65535, 65535),
+}
+
+REGULAR = {
+    "jpeg_baseline": lambda: encode(".jpg", 4000, 3000),
+    "jpeg_progressive": lambda: encode(
+        ".jpg", 1200, 1600, (cv2.IMWRITE_JPEG_PROGRESSIVE, 1)
+    ),
+    "jpeg_large_exif": lambda: jpeg_with_exif(60000),
+    "png_rgb": lambda: encode(".png", 1000, 1400),
+    "webp_lossy": lambda: encode(".webp", 800, 600, (cv2.IMWRITE_WEBP_QUALITY, 80)),
+    "webp_lossless": lambda: encode(
+        ".webp", 801, 599, (cv2.IMWRITE_WEBP_QUALITY, 101)
+    ),
+    "bmp": lambda: encode(".bmp", 300, 200),
+    "tiff": lambda: encode(".tiff", 640, 480),
+}
+
+
+@pytest.fixture
+def no_decode(monkeypatch):
+    """Fail the test if anything reaches an OpenCV decoder."""
+
+    def decode(*args, **kwargs):
+        raise AssertionError("image was decoded before it was rejected")
+
+    monkeypatch.setattr(cv2, "imdecode", decode)
+    monkeypatch.setattr(cv2, "imread", decode)
+
+
+@pytest.mark.parametrize("build", TOO_LARGE.values(), ids=TOO_LARGE.keys())
+def test_bombs_rejected_from_headers(build, no_decode):
+    with pytest.raises(ImageTooLargeError):
+        validate_image(build(), MAX_PIXELS)
+
+
+@pytest.mark.parametrize("build", INVALID.values(), ids=INVALID.keys())
+def test_malformed_rejected_from_headers(build, no_decode):
+    with pytest.raises(InvalidImageError) as excinfo:
+        validate_image(build(), MAX_PIXELS)
+    assert not isinstance(excinfo.value, ImageTooLargeError)
+
+
+@pytest.mark.parametrize("build", REGULAR.values(), ids=REGULAR.keys())
+def test_regular_images_match_decoded_size(build):
+    data = build()
+    info = validate_image(data, MAX_PIXELS)
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert (info.width, info.height) == (decoded.shape[1], decoded.shape[0])
+
+
+def test_pixel_limit_is_inclusive():
+    data = png_header(8000, 8000)
+    assert validate_image(data, 64_000_000).width == 8000
+    with pytest.raises(ImageTooLargeError):
+        validate_image(data, 63_999_999)
+
+
+def test_probe_without_dimensions():
+    info = probe_image(b"\xff\xd8\xff\xe0\x00\x10JFIF\x00")
+    assert info.format == "jpeg"
+    assert (info.width, info.height) == (None, None)
+
+
+def test_pipeline_validates_before_decoding(tmp_path, monkeypatch, no_decode):
+    monkeypatch.setenv("RESULT_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    inference_pipeline = pytest.importorskip("inference_pipeline")
+    monkeypatch.setattr(inference_pipeline.result_cache, "get", lambda *a: None)
+
+    with pytest.raises(ImageTooLargeError):
+        inference_pipeline.extract_total_value(png_bomb(30000))
+    with pytest.raises(InvalidImageError):
+        inference_pipeline.extract_total_value(png_header(4000, 3000)[:20])
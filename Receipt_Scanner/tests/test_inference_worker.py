@@ -0,0 +1,55 @@
+"""inference_worker.serve_connection when the web tier goes away."""
+
+import logging
+
+from inference_worker import serve_connection
+
+
+class FakeConnection:
+    """Connection whose peer sends `requests`, then raises on send."""
+
+    def __init__(self, requests, send_error=None):
+        self.requests = list(requests)
+        self.send_error = send_error
+        self.sent = []
+        self.closed = False
+
+    def recv(self):
+        if not self.requests:
+            raise EOFError
+        return self.requests.pop(0)
+
+    def send(self, response):
+        if self.send_error is not None:
+            raise self.send_error
+        self.sent.append(response)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+
+class FakeInference:
+    def status(self):
+        return {"ready": True}
+
+
+def test_answers_until_the_client_closes():
+    conn = FakeConnection([{"op": "status"}, {"op": "nope"}])
+    serve_connection(conn, FakeInference())
+    assert conn.sent[0] == {"ok": True, "result": {"ready": True}}
+    assert conn.sent[1]["ok"] is False
+    assert conn.closed
+
+
+def test_client_gone_before_the_response(caplog):
+    conn = FakeConnection(
+        [{"op": "status"}, {"op": "status"}], send_error=BrokenPipeError(32, "pipe")
+    )
+    with caplog.at_level(logging.WARNING, logger="inference_worker"):
+        serve_connection(conn, FakeInference())  # Returns instead of raising
+    assert conn.closed
+    assert len(conn.requests) == 1  # Stopped reading after the failed send
+    assert "'status' response" in caplog.text
@@ -0,0 +1,94 @@
+"""ReceiptResultCache lookups by content hash and by banded perceptual hash."""
+
+import random
+import sqlite3
+
+import pytest
+
+from result_cache import ReceiptResultCache, hamming, phash_bands
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ReceiptResultCache(str(tmp_path / "cache.sqlite3"), phash_distance=4)
+
+
+def flip(phash: int, *bits) -> int:
+    for bit in bits:
+        phash ^= 1 << bit
+    return phash
+
+
+def test_bands_cover_all_bits():
+    phash = random.Random(1).getrandbits(64)
+    for bands in (1, 3, 5, 64):
+        values = phash_bands(phash, bands)
+        assert len(values) == bands
+        rebuilt, start = 0, 0
+        for band, value in enumerate(values):
+            rebuilt |= value << start
+            start = 64 * (band + 1) // bands
+        assert rebuilt == phash
+
+
+def test_exact_hit(cache):
+    cache.put("m", "k1", {"text": "a"})
+    assert cache.get("m", "k1") == {"text": "a"}
+    assert cache.get("m", "k2") is None
+
+
+@pytest.mark.parametrize("bits", [(), (0,), (63,), (0, 17, 40, 63), (12, 13, 14, 15)])
+def test_similar_within_distance(cache, bits):
+    phash = 0xF0F0_1234_ABCD_8001
+    cache.put("m", "k1", {"text": "a"}, phash)
+    assert cache.get_similar("m", flip(phash, *bits)) == {"text": "a"}
+
+
+def test_similar_beyond_distance(cache):
+    phash = 0xF0F0_1234_ABCD_8001
+    cache.put("m", "k1", {"text": "a"}, phash)
+    assert cache.get_similar("m", flip(phash, 1, 15, 30, 45, 60)) is None
+    assert cache.get_similar("other", phash) is None
+
+
+def test_closest_of_several(cache):
+    phash = 0x0123_4567_89AB_CDEF
+    cache.put("m", "far", {"text": "far"}, flip(phash, 1, 2, 3))
+    cache.put("m", "near", {"text": "near"}, flip(phash, 5))
+    assert cache.get_similar("m", phash) == {"text": "near"}
+
+
+def test_matches_a_full_scan(tmp_path):
+    cache = ReceiptResultCache(str(tmp_path / "c.sqlite3"), phash_distance=3)
+    rng = random.Random(7)
+    stored = [rng.getrandbits(64) for _ in range(300)]
+    for index, phash in enumerate(stored):
+        cache.put("m", f"k{index}", {"index": index}, phash)
+    for phash in stored[:50]:
+        query = flip(phash, *rng.sample(range(64), rng.randint(0, 5)))
+        distances = [hamming(query, s) for s in stored]
+        expected = min(distances) if min(distances) <= 3 else None
+        entry = cache.get_similar("m", query)
+        found = None if entry is None else distances[entry["index"]]
+        assert found == expected
+
+
+def test_replaced_and_evicted_entries_leave_the_index(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    cache = ReceiptResultCache(path, max_disk_entries=2, phash_distance=2)
+    cache.put("m", "k1", {"text": "old"}, 1)
+    cache.put("m", "k1", {"text": "new"}, 1 << 40)
+    cache.put("m", "k2", {"text": "b"}, 2)
+    cache.put("m", "k3", {"text": "c"}, 3)  # Evicts k1
+    conn = sqlite3.connect(path)
+    keys = {row[0] for row in conn.execute("SELECT key FROM phash_bands")}
+    assert keys == {"k2", "k3"}
+
+
+def test_index_rebuilt_when_distance_changes(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    phash = 0xDEAD_BEEF_0000_FFFF
+    ReceiptResultCache(path, phash_distance=1).put("m", "k1", {"text": "a"}, phash)
+
+    cache = ReceiptResultCache(path, phash_distance=5)
+    assert cache.get_similar("m", flip(phash, 0, 10, 20, 30, 40)) == {"text": "a"}
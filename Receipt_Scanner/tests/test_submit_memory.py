@@ -0,0 +1,26 @@
+"""Evidence forwarding in /submit must not buffer the files in memory.
+
+A scaled-down run of benchmarks/check_submit_memory.py: the app runs in a
+child process against stub upload APIs, and its peak RSS growth while
+forwarding three 20 MB evidence files must stay well below one file.
+"""
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("psutil")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from check_submit_memory import measure  # noqa: E402
+
+FILES, FILE_MB = 3, 20
+MAX_GROWTH_MB = 12
+
+
+def test_evidence_is_streamed():
+    result = measure(FILES, FILE_MB)
+    # Every evidence byte reached the API (plus the multipart framing)
+    assert result["evidence_bytes"] >= FILES * FILE_MB * 2**20
+    assert result["growth_mb"] < MAX_GROWTH_MB
@@ -0,0 +1,127 @@
+"""StreamingMultipart against the multipart body requests builds itself.
+
+The same fields and files must give byte-identical bodies (with the
+boundary fixed), while file contents are only read in bounded blocks as
+the body is sent.
+"""
+
+import io
+
+import pytest
+import requests
+import urllib3.filepost
+
+from upload_client import StreamingMultipart, UploadAPIError
+
+FIELDS = {"uuid": "R-0001", "items": 3}
+
+
+class CountingFile(io.BytesIO):
+    """BytesIO that records the size of every read."""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+def requests_body(fields: dict, files: list, boundary: str, monkeypatch) -> bytes:
+    monkeypatch.setattr(urllib3.filepost, "choose_boundary", lambda: boundary)
+    prepared = requests.Request(
+        "POST", "http://upload.invalid/", data=fields, files=files
+    ).prepare()
+    return prepared.body
+
+
+def test_body_matches_requests(monkeypatch):
+    receipt = bytes(range(256)) * 300
+    evidence = b"%PDF-1.4\n" + b"\x00\xff" * 5000
+    body = StreamingMultipart(
+        FIELDS,
+        [
+            ("file", ("receipt.jpg", io.BytesIO(receipt), "image/jpeg")),
+            ("files", ("bukti.pdf", io.BytesIO(evidence), "application/pdf")),
+        ],
+    )
+    expected = requests_body(
+        FIELDS,
+        [
+            ("file", ("receipt.jpg", receipt, "image/jpeg")),
+            ("files", ("bukti.pdf", evidence, "application/pdf")),
+        ],
+        body.boundary,
+        monkeypatch,
+    )
+    assert body.read() == expected
+    assert len(body) == len(expected)
+
+
+def test_none_fields_left_out_like_requests(monkeypatch):
+    fields = {"uuid": "R-0001", "extracted_text": None, "amount": 0}
+    files = [("file", ("r.jpg", b"abc", "image/jpeg"))]
+    body = StreamingMultipart(
+        fields, [("file", ("r.jpg", io.BytesIO(b"abc"), "image/jpeg"))]
+    )
+    expected = requests_body(fields, files, body.boundary, monkeypatch)
+    assert b"extracted_text" not in expected
+    assert body.read() == expected
+
+
+def test_file_read_from_current_position(monkeypatch):
+    fileobj = io.BytesIO(b"HEADER" + b"payload")
+    fileobj.seek(6)
+    body = StreamingMultipart({}, [("file", ("a.bin", fileobj, None))])
+    expected = requests_body(
+        {}, [("file", ("a.bin", b"payload", None))], body.boundary, monkeypatch
+    )
+    assert body.read() == expected
+
+
+def test_files_are_streamed_in_blocks():
+    files = [CountingFile(b"x" * 1_000_000), CountingFile(b"y" * 300_000)]
+    body = StreamingMultipart(
+        FIELDS, [("files", (f"{i}.jpg", f, "image/jpeg")) for i, f in enumerate(files)]
+    )
+    assert all(not f.reads for f in files)  # Nothing read up front
+
+    block = 1 << 16
+    sent = 0
+    for chunk in body:
+        assert len(chunk) <= block
+        sent += len(chunk)
+    assert sent == len(body)
+    for f in files:
+        assert f.reads and all(0 < size <= block for size in f.reads)
+
+
+def test_requests_sends_it_as_a_stream():
+    body = StreamingMultipart(FIELDS, [("file", ("r.jpg", io.BytesIO(b"abc"), None))])
+    prepared = requests.Request(
+        "POST",
+        "http://upload.invalid/",
+        data=body,
+        headers={"Content-Type": body.content_type},
+    ).prepare()
+    assert prepared.body is body
+    assert prepared.headers["Content-Length"] == str(len(body))
+
+
+def test_rewind_for_retries():
+    fileobj = io.BytesIO(b"abc" * 50)
+    body = StreamingMultipart(FIELDS, [("file", ("r.jpg", fileobj, None))])
+    first = body.read(100) + body.read()
+    assert body.seek(0) == 0
+    assert body.read() == first
+    with pytest.raises(io.UnsupportedOperation):
+        body.seek(10)
+
+
+def test_truncated_file_raises():
+    fileobj = io.BytesIO(b"z" * 1000)
+    body = StreamingMultipart({}, [("file", ("r.jpg", fileobj, None))])
+    fileobj.truncate(500)
+    with pytest.raises(UploadAPIError):
+        body.read()
@@ -0,0 +1,88 @@
+"""SQLiteUploadStateStore: claim, release and expiry with a fake clock."""
+
+import types
+
+import pytest
+
+import upload_state
+from upload_state import SQLiteUploadStateStore, create_upload_state_store
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(upload_state, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    path = str(tmp_path / "state" / "uploads.sqlite3")
+    return SQLiteUploadStateStore(path, ttl=3600, claim_lease=60)
+
+
+def test_create_get_update(store):
+    token = store.create({"blob_id": "d-1", "extracted_text": None})
+    assert len(token) >= 32
+    assert store.update(token, extracted_text="Rp 50.000", job_id="j1")
+    assert store.get(token) == {
+        "blob_id": "d-1",
+        "extracted_text": "Rp 50.000",
+        "job_id": "j1",
+    }
+    assert not store.update("unknown", extracted_text="x")
+    assert store.get("unknown") is None
+
+
+def test_claim_is_exclusive_until_released(store):
+    token = store.create({"blob_id": "d-1"})
+    assert store.claim(token) == {"blob_id": "d-1"}
+    assert store.claim(token) is None  # A concurrent submit
+    store.release(token)  # The first submit failed
+    assert store.claim(token) == {"blob_id": "d-1"}
+
+
+def test_claim_lease_expires(store, clock):
+    token = store.create({"blob_id": "d-1"})
+    assert store.claim(token) is not None
+    clock.now += 59
+    assert store.claim(token) is None
+    clock.now += 2  # The claiming worker died
+    assert store.claim(token) is not None
+
+
+def test_delete_after_submit(store):
+    token = store.create({"blob_id": "d-1"})
+    store.claim(token)
+    store.delete(token)
+    assert store.get(token) is None
+    assert store.claim(token) is None
+
+
+def test_entries_expire_after_last_write(store, clock):
+    token = store.create({"blob_id": "d-1"})
+    clock.now += 3000
+    store.update(token, extracted_text="Rp 50.000")  # Refreshes the entry
+    clock.now += 3000
+    assert store.get(token) is not None
+
+    clock.now += 601
+    assert store.get(token) is None
+    assert store.claim(token) is None
+    assert store.purge() == 1
+
+
+def test_store_from_url(tmp_path):
+    store = create_upload_state_store(f"sqlite:///{tmp_path}/u.sqlite3", ttl=60)
+    assert isinstance(store, SQLiteUploadStateStore)
+    assert store.claim_lease == 900
+    with pytest.raises(ValueError):
+        create_upload_state_store("postgres://db/uploads", ttl=60)
@@ -0,0 +1,264 @@
+import io
+import os
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class UploadAPIError(Exception):
+    """Raised when an upload API rejects a file or answers with an error.
+
+    `status_code` is set when the API answered with a non-200 status.
+    """
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadTimeoutError(UploadAPIError):
+    """Raised when an upload API does not answer within its timeout."""
+
+
+def file_links(data) -> list:
+    """Collect fileLink values from an API `data` field (a dict or a list)."""
+    items = data if isinstance(data, list) else [data]
+    return [
+        item["fileLink"]
+        for item in items
+        if isinstance(item, dict) and item.get("fileLink")
+    ]
+
+
+class StreamingMultipart:
+    """multipart/form-data body that reads file contents on demand.
+
+    requests' `files=` builds the whole body in memory; this object is sent
+    with `data=` instead, so only one block per connection is held at a
+    time regardless of file count or size. It reports its length (for
+    Content-Length) and can be rewound with seek(0) so urllib3 can retry.
+    `files` items are (field, (filename, fileobj, content_type)); each file
+    is read from its current position to the end.
+    """
+
+    def __init__(self, fields: dict, files: list):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self._parts = []
+        for name, value in (fields or {}).items():
+            if value is None:  # Left out, as requests does
+                continue
+            self._parts.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"'
+                f"\r\n\r\n{value}\r\n".encode()
+            )
+        for name, (filename, fileobj, content_type) in files:
+            start = fileobj.tell()
+            fileobj.seek(0, os.SEEK_END)  # mmap.seek returns None, so tell()
+            size = fileobj.tell() - start
+            fileobj.seek(start)
+            header = (
+                f"--{self.boundary}\r\nContent-Disposition: form-data; "
+                f'name="{name}"; filename="{filename}"\r\n'
+            )
+            if content_type:  # Left out without one, as requests does
+                header += f"Content-Type: {content_type}\r\n"
+            self._parts.append(f"{header}\r\n".encode())
+            self._parts.append((fileobj, start, size))
+            self._parts.append(b"\r\n")
+        self._parts.append(f"--{self.boundary}--\r\n".encode())
+        self._length = sum(
+            part[2] if isinstance(part, tuple) else len(part) for part in self._parts
+        )
+        self._index, self._offset, self._position = 0, 0, 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(1 << 16)
+            if not chunk:
+                return
+            yield chunk
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence != io.SEEK_SET or offset not in (0, self._position):
+            raise io.UnsupportedOperation("Only rewinding to the start is supported")
+        if offset == 0:
+            self._index, self._offset, self._position = 0, 0, 0
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length - self._position
+        chunks = []
+        while size > 0 and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, tuple):
+                fileobj, start, length = part
+                fileobj.seek(start + self._offset)
+                chunk = fileobj.read(min(size, length - self._offset))
+                remaining = length - self._offset - len(chunk)
+            else:
+                chunk = part[self._offset : self._offset + size]
+                remaining = len(part) - self._offset - len(chunk)
+            if not chunk and remaining:
+                raise UploadAPIError("Upload file was truncated while sending")
+            chunks.append(chunk)
+            size -= len(chunk)
+            self._position += len(chunk)
+            if remaining:
+                self._offset += len(chunk)
+            else:
+                self._index, self._offset = self._index + 1, 0
+        return b"".join(chunks)
+
+
+class UploadClient:
+    """Pooled HTTP client for the Receipt and Evidence upload APIs.
+
+    One requests.Session per process keeps connections alive between
+    submissions. Connection errors and gateway errors (`retry_statuses`) are
+    retried with exponential backoff; each upload stage has its own read
+    timeout on top of a shared connect timeout. Files are streamed from
+    disk. With `evidence_chunk_files` set, evidence files are split into
+    groups of that many files that are uploaded in parallel.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = 10,
+        receipt_timeout: float = 500,
+        evidence_timeout: float = 500,
+        retries: int = 3,
+        backoff: float = 0.5,
+        retry_statuses: tuple = (502, 503, 504),
+        pool_size: int = 10,
+        evidence_chunk_files: int = 0,
+    ):
+        self.connect_timeout = connect_timeout
+        self.receipt_timeout = receipt_timeout
+        self.evidence_timeout = evidence_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_statuses = retry_statuses
+        self.pool_size = pool_size
+        self.evidence_chunk_files = evidence_chunk_files
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="api-upload"
+        )
+
+        # Pooled sockets must not be shared with forked workers
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.pool_size, thread_name_prefix="api-upload"
+        )
+
+    def submit(self, fn, *args, **kwargs):
+        """Run an upload on the client's thread pool and return its Future."""
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def session(self) -> requests.Session:
+        """Return this process's shared session, creating it on first use."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    retry = Retry(
+                        total=self.retries,
+                        connect=self.retries,
+                        read=0,  # The server may already have stored the file
+                        status=self.retries,
+                        backoff_factor=self.backoff,
+                        status_forcelist=self.retry_statuses,
+                        allowed_methods=frozenset({"POST"}),
+                        raise_on_status=False,
+                    )
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size,
+                        pool_maxsize=self.pool_size,
+                        max_retries=retry,
+                    )
+                    session = requests.Session()
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def _post(self, endpoint: str, read_timeout: float, data, files) -> dict:
+        """Stream a multipart POST; return the JSON body when it reports success."""
+        body = StreamingMultipart(data, files)
+        try:
+            response = self.session().post(
+                endpoint,
+                data=body,
+                headers={"Content-Type": body.content_type},
+                timeout=(self.connect_timeout, read_timeout),
+            )
+        except requests.Timeout as e:
+            raise UploadTimeoutError(f"{endpoint} timed out: {str(e)}")
+        except requests.RequestException as e:
+            raise UploadAPIError(f"Request to {endpoint} failed: {str(e)}")
+
+        if response.status_code != 200:
+            raise UploadAPIError(
+                f"{endpoint} responded with status code {response.status_code}",
+                response.status_code,
+            )
+        body = response.json()
+        if body.get("status") != "success":
+            raise UploadAPIError(f"{endpoint} failed: {body.get('message')}")
+        return body
+
+    def upload_receipt(
+        self, endpoint: str, receipt, filename: str, content_type: str, data
+    ) -> str:
+        """Upload the receipt (a readable file-like object) and return its fileLink."""
+        files = [("file", (filename, receipt, content_type))]
+        body = self._post(endpoint, self.receipt_timeout, data, files)
+        return body["data"]["fileLink"]
+
+    def _upload_evidence_group(self, endpoint: str, files: list, data) -> list:
+        body = self._post(endpoint, self.evidence_timeout, data, files)
+        return file_links(body.get("data", {}))
+
+    def upload_evidence(self, endpoint: str, files: list, data) -> list:
+        """Upload evidence files and return their fileLinks in file order.
+
+        In chunked mode a failed group is logged and skipped, so the links
+        of the groups that succeeded are still returned.
+        """
+        size = self.evidence_chunk_files
+        if size <= 0 or len(files) <= size:
+            return self._upload_evidence_group(endpoint, files, data)
+
+        groups = [files[start : start + size] for start in range(0, len(files), size)]
+        futures = [
+            self.submit(self._upload_evidence_group, endpoint, group, data)
+            for group in groups
+        ]
+        links = []
+        for group, future in zip(groups, futures):
+            try:
+                links.extend(future.result())
+            except UploadAPIError as e:
+                names = ", ".join(item[1][0] for item in group)
+                logger.error(f"Evidence upload failed for {names}: {str(e)}")
+        return links
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import secrets
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def new_upload_token() -> str:
+    """Opaque, unguessable token identifying one uploaded receipt."""
+    return secrets.token_urlsafe(24)
+
+
+class UploadStateStore:
+    """Server-side state of uploaded receipts, keyed by an upload token.
+
+    The state is a small JSON dict (blob id, filename, content type,
+    extracted text, job id). /submit claim()s it atomically so two
+    concurrent submits of one upload cannot both forward the receipt; a
+    failed submit release()s it, a successful one delete()s it. Entries
+    expire `ttl` seconds after they were last written, and claims expire
+    after `claim_lease` seconds in case the claiming worker died.
+    """
+
+    def __init__(self, ttl: float = 6 * 3600, claim_lease: float = 900):
+        self.ttl = ttl
+        self.claim_lease = claim_lease
+
+    def create(self, state: dict) -> str:
+        raise NotImplementedError
+
+    def get(self, token: str):
+        raise NotImplementedError
+
+    def update(self, token: str, **fields) -> bool:
+        raise NotImplementedError
+
+    def claim(self, token: str):
+        raise NotImplementedError
+
+    def release(self, token: str):
+        raise NotImplementedError
+
+    def delete(self, token: str):
+        raise NotImplementedError
+
+    def purge(self) -> int:
+        """Remove expired entries (a no-op where the backend expires keys)."""
+        return 0
+
+
+class SQLiteUploadStateStore(UploadStateStore):
+    """Upload state in a SQLite file shared by every worker on the host.
+
+    Put the file on a shared volume to serve several nodes from one store
+    (SQLite over network filesystems needs working POSIX locks).
+    """
+
+    def __init__(self, db_path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+        # SQLite handles do not survive fork (gunicorn --preload)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                " token TEXT PRIMARY KEY,"
+                " state_json TEXT NOT NULL,"
+                " claimed_at REAL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    def _after_fork(self):
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, state: dict) -> str:
+        token = new_upload_token()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO uploads (token, state_json, updated_at) VALUES (?, ?, ?)",
+                (token, json.dumps(state), time.time()),
+            )
+        self._maybe_purge()
+        return token
+
+    def get(self, token: str):
+        row = (
+            self._connect()
+            .execute(
+                "SELECT state_json FROM uploads WHERE token = ? AND updated_at >= ?",
+                (token, time.time() - self.ttl),
+            )
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def update(self, token: str, **fields) -> bool:
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT state_json FROM uploads WHERE token = ?", (token,)
+            ).fetchone()
+            if row is None:
+                return False
+            state = json.loads(row[0])
+            state.update(fields)
+            conn.execute(
+                "UPDATE uploads SET state_json = ?, updated_at = ? WHERE token = ?",
+                (json.dumps(state), time.time(), token),
+            )
+        return True
+
+    def claim(self, token: str):
+        """Atomically take the upload for submission; None if taken or gone."""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE uploads SET claimed_at = ? WHERE token = ?"
+                " AND updated_at >= ? AND (claimed_at IS NULL OR claimed_at < ?)",
+                (now, token, now - self.ttl, now - self.claim_lease),
+            )
+        if cursor.rowcount == 0:
+            return None
+        return self.get(token)
+
+    def release(self, token: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE uploads SET claimed_at = NULL WHERE token = ?", (token,)
+            )
+
+    def delete(self, token: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM uploads WHERE token = ?", (token,))
+
+    def purge(self) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM uploads WHERE updated_at < ?", (time.time() - self.ttl,)
+            )
+        return cursor.rowcount
+
+    def _maybe_purge(self):
+        if time.time() - self._last_purge < 60:
+            return
+        self._last_purge = time.time()
+        try:
+            self.purge()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to purge expired uploads: {str(e)}")
+
+
+class RedisUploadStateStore(UploadStateStore):
+    """Upload state in Redis (or any server speaking its protocol).
+
+    `client` is a redis.Redis-compatible client. Expiry uses key TTLs and
+    the claim is a separate SET NX key with the lease as its TTL.
+    """
+
+    def __init__(self, client, prefix: str = "receipt_upload:", **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, token: str) -> str:
+        return f"{self.prefix}{token}"
+
+    def create(self, state: dict) -> str:
+        token = new_upload_token()
+        self.client.set(self._key(token), json.dumps(state), ex=int(self.ttl))
+        return token
+
+    def get(self, token: str):
+        value = self.client.get(self._key(token))
+        return json.loads(value) if value else None
+
+    def update(self, token: str, **fields) -> bool:
+        # Read-modify-write under WATCH so concurrent updates are not lost
+        key = self._key(token)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    value = pipe.get(key)
+                    if value is None:
+                        pipe.unwatch()
+                        return False
+                    state = json.loads(value)
+                    state.update(fields)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(state), ex=int(self.ttl))
+                    pipe.execute()
+                    return True
+                except Exception as e:
+                    if type(e).__name__ != "WatchError":
+                        raise
+
+    def claim(self, token: str):
+        claimed = self.client.set(
+            f"{self._key(token)}:claim", "1", nx=True, ex=int(self.claim_lease)
+        )
+        if not claimed:
+            return None
+        state = self.get(token)
+        if state is None:
+            self.release(token)
+        return state
+
+    def release(self, token: str):
+        self.client.delete(f"{self._key(token)}:claim")
+
+    def delete(self, token: str):
+        self.client.delete(self._key(token), f"{self._key(token)}:claim")
+
+
+def create_upload_state_store(url: str, ttl: float, claim_lease: float = 900):
+    """Build a store from a URL: sqlite:///path/to/file or redis://host:port/db."""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis
+
+        return RedisUploadStateStore(
+            redis.Redis.from_url(url), ttl=ttl, claim_lease=claim_lease
+        )
+    if url.startswith("sqlite:///"):
+        return SQLiteUploadStateStore(
+            url[len("sqlite:///") :], ttl=ttl, claim_lease=claim_lease
+        )
+    raise ValueError(f"Unsupported upload state store URL '{url}'")